@@ -5,20 +5,27 @@ import re
 import json
 import datetime
 
+from Finance_Center.ledger_store import LedgerStore
+from blackbox_recorder import BlackboxRecorder
+
+# 列表首个订单号：翻页后它变了，说明 Vue 已经换上了新一页的数据
+FIRST_ORDER_JS = """(prev) => {
+    const el = document.querySelector('.self-order-item .msg-box.order-id span');
+    return el && el.textContent.trim() !== prev;
+}"""
+
 class FinanceService:
     def __init__(self, context):
         self.context = context
-        self.live_shot = "blackbox/finance_live.png"
-        self.live_html = "blackbox/finance_debug.html"
-        self.save_dir = "blackbox/finance_service"
+        self.blackbox = BlackboxRecorder("finance_service")
         self.ledger_file = "data/purchase_ledger.json"
         self.blacklist_file = "data/finance_blacklist.json"
         
-        os.makedirs(self.save_dir, exist_ok=True)
         os.makedirs("data", exist_ok=True)
         
-        self.step_idx = 0
         self.blacklist = self._load_blacklist()
+        # 只追加账本：捆绑包一单多件，主键用 (订单号, 商品名)
+        self.ledger = LedgerStore("data/purchase_ledger.jsonl", ("order_id", "name"), snapshot_path=self.ledger_file)
 
     def _load_blacklist(self):
         if os.path.exists(self.blacklist_file):
@@ -32,19 +39,11 @@ class FinanceService:
         with open(self.blacklist_file, 'w', encoding='utf-8') as f:
             json.dump(list(self.blacklist), f, ensure_ascii=False, indent=4)
 
-    async def _log_and_shot(self, page, action_name):
-        """📸 视觉存档：截图 + 源码落地"""
-        self.step_idx += 1
-        try:
-            await page.screenshot(path=self.live_shot)
-            content = await page.content()
-            with open(self.live_html, "w", encoding="utf-8") as f:
-                f.write(content)
-            # 物理存档
-            archive_prefix = f"{self.save_dir}/step_{self.step_idx}_{action_name}"
-            await page.screenshot(path=f"{archive_prefix}.png")
-            print(f"📺 [LIVE] {action_name} 已同步至 blackbox")
-        except: pass
+    async def _log_and_shot(self, page, action_name, flush=False):
+        """📸 视觉存档：进黑匣子环形缓冲；flush=True 时连同前面几帧一起落盘"""
+        await self.blackbox.capture(page, action_name)
+        if flush:
+            await self.blackbox.flush(action_name)
 
     async def action_verify_and_goto_orders(self, page):
         """🚀 探测登录态并跳转 (修复了选择器报错问题)"""
@@ -85,28 +84,43 @@ class FinanceService:
 
         except Exception as e:
             print(f"❌ [ERROR] 导航失败: {str(e)}")
+            await self._log_and_shot(page, "GOTO_FAIL", flush=True)
             return False
 
-    async def action_fetch_ledger(self, page):
-        """🚀 [杉果全量审计] 自动跨页抓取所有历史订单"""
+    async def action_fetch_ledger(self, page, incremental=True):
+        """
+        🚀 [杉果账本同步] 自动跨页抓取历史订单
+        增量模式下，翻到上次同步过的最新订单后，只要该订单及其后的行都没有变化就立即停止；incremental=False 走全量核对。
+        """
         try:
+            mode = "增量" if incremental else "全量"
+            known_newest = self.ledger.get_state("newest_order_id") if incremental else None
             print("\n" + "📊 " * 15)
             print(f"{'订单号':<10} | {'下单时间':<18} | {'商品名称':<25} | {'状态':<10} | {'均摊成本'}")
             print("-" * 105)
 
-            all_entries = []
             page_num = 1
+            newest_seen = None
+            counts = {"NEW": 0, "UPDATED": 0}
+            # 一旦翻到上次的最新订单就一直为真；之后的行都是旧订单，只看它们有没有变化
+            reached_known = False
 
             while True:
-                print(f"📄 正在扫描杉果第 {page_num} 页...")
+                print(f"📄 正在扫描杉果第 {page_num} 页 ({mode})...")
                 # 等待订单块加载
                 await page.wait_for_selector(".self-order-item", timeout=10000)
                 order_blocks = await page.query_selector_all(".self-order-item")
+                known_changes = 0   # 本页里“已知订单及其之后”的行发生的变化数
+                first_oid = None
                 
                 for block in order_blocks:
                     # 1. 提取订单号
                     id_el = await block.query_selector(".msg-box.order-id span")
                     oid = (await id_el.text_content()).strip() if id_el else "0"
+                    first_oid = first_oid or oid
+                    newest_seen = newest_seen or oid
+                    if known_newest and oid == known_newest:
+                        reached_known = True
                     
                     # 🚫 黑名单拦截
                     if oid in self.blacklist:
@@ -132,17 +146,28 @@ class FinanceService:
                             gname = (await name_el.text_content()).strip()
                             gstatus = (await tag_el.text_content()).strip() if tag_el else "已完成"
                             avg_cost = round(total_paid / count, 2)
-                            
-                            status_ico = "✅" if "发货" in gstatus else "⚠️ "
-                            print(f"{oid:<10} | {otime:<18} | {gname:<27} | {status_ico + gstatus:<10} | ¥{avg_cost}")
 
-                            all_entries.append({
+                            change = self.ledger.upsert({
                                 "order_id": oid, "order_time": otime, "name": gname,
                                 "cost": avg_cost, "total_paid": total_paid, "status": gstatus,
                                 "is_bundle": count > 1, "source": "Sonkwo", "sync_at": datetime.datetime.now().strftime("%H:%M:%S")
                             })
+                            if change:
+                                counts[change] += 1
+                                if reached_known:
+                                    known_changes += 1
+                                status_ico = "✅" if "发货" in gstatus else "⚠️ "
+                                print(f"{oid:<10} | {otime:<18} | {gname:<27} | {status_ico + gstatus:<10} | ¥{avg_cost} ({'新增' if change == 'NEW' else '更新'})")
+
+                # 每页提交一次，中途崩溃也不丢已抓到的部分
+                self.ledger.commit(export=False)
+
+                # 4. 增量早停：已经翻到上次的最新订单，且它之后的行都没有变化 (之前的新订单不影响)
+                if reached_known and known_changes == 0:
+                    print(f"⏹️ 第 {page_num} 页已追上已知订单，增量同步提前结束。")
+                    break
 
-                # 4. 翻页逻辑：寻找下一页按钮
+                # 5. 翻页逻辑：寻找下一页按钮
                 next_btn = await page.query_selector(".ivu-page-next")
                 if not next_btn:
                     print("🏁 未发现分页器，单页扫描结束。")
@@ -154,30 +179,32 @@ class FinanceService:
                     print(f"🏁 已到达杉果末页 (共 {page_num} 页)")
                     break
                 
-                # 执行翻页
+                # 执行翻页：等到列表首单变化即可，不再固定睡 3 秒
                 await next_btn.click()
                 page_num += 1
-                await asyncio.sleep(3) # 等待 Vue 重新渲染列表
+                await page.wait_for_function(FIRST_ORDER_JS, arg=first_oid, timeout=10000)
                 await self._log_and_shot(page, f"SONKWO_PAGE_{page_num}")
 
-            # 5. 落盘保存
-            with open(self.ledger_file, "w", encoding="utf-8") as f:
-                json.dump(all_entries, f, ensure_ascii=False, indent=4)
+            # 6. 游标与快照
+            if newest_seen:
+                self.ledger.set_state("newest_order_id", newest_seen)
+            self.ledger.commit()
             
             print("-" * 105)
-            print(f"📈 杉果全量同步完成：共存入 {len(all_entries)} 条原始记录")
-            return all_entries
+            print(f"📈 杉果{mode}同步完成：扫描 {page_num} 页，新增 {counts['NEW']} 条 / 更新 {counts['UPDATED']} 条，账本共 {len(self.ledger)} 条")
+            return self.ledger.all_rows()
 
         except Exception as e:
             print(f"❌ 杉果抓取崩溃: {e}")
-            return []
+            await self._log_and_shot(page, "LEDGER_FAIL", flush=True)
+            return None
 
 
     async def enter_interactive_mode(self):
         """交互主循环"""
         print("\n" + "💰 " * 12)
         print("【财务审计分机】v2.0 完整版就绪")
-        print("指令: [goto] 探测/瞬移 | [list] 抓取账本 | [ignore 订单号] 拉黑 | [shot] 强行快照 | [exit] 退出")
+        print("指令: [goto] 探测/瞬移 | [list] 增量同步账本 | [list all] 全量核对 | [ignore 订单号] 拉黑 | [shot] 强行快照 | [exit] 退出")
         print("💰 " * 12 + "\n")
 
         debug_page = await self.context.new_page()
@@ -191,10 +218,11 @@ class FinanceService:
                 if not cmd or cmd == "exit": break
                 elif cmd == "goto": await self.action_verify_and_goto_orders(debug_page)
                 elif cmd == "list": await self.action_fetch_ledger(debug_page)
+                elif cmd == "list all": await self.action_fetch_ledger(debug_page, incremental=False)
                 elif cmd == "shot":
                     # 💡 增加当前 URL 标识，方便区分是列表页还是详情页
                     page_type = "detail" if "orders/" in debug_page.url else "list"
-                    await self._log_and_shot(debug_page, f"manual_{page_type}")
+                    await self._log_and_shot(debug_page, f"manual_{page_type}", flush=True)
                     print(f"📸 {page_type} 页面快照与源码已同步。")
                 elif cmd.startswith("ignore "):
                     oid = cmd.split(" ")[-1]
@@ -210,7 +238,7 @@ class FinanceService:
                         try:
                             await debug_page.goto(target_url, wait_until="networkidle", timeout=30000)
                             print(f"🎯 已到达详情页，请查看直播并输入 [shot] 落地 HTML")
-                            await self._log_and_shot(debug_page, f"detail_{order_id}")
+                            await self._log_and_shot(debug_page, f"detail_{order_id}", flush=True)
                         except Exception as e:
                             print(f"❌ 穿透失败: {e}")
             await debug_page.close()
@@ -0,0 +1,134 @@
+import json
+import os
+
+# 每次同步都会刷新的字段，不参与“是否有变化”的判断 (各账本可以在此基础上追加自己的)
+VOLATILE_FIELDS = ("sync_at",)
+
+
+def append_jsonl(path, rows):
+    """追加若干行并刷盘，供账本和变更流水共用"""
+    if not rows:
+        return
+    with open(path, 'a', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+class LedgerStore:
+    """
+    [只追加账本] JSONL 格式，一行一条记录，同一主键后写覆盖前写。
+    - upsert 幂等：内容没变就不落盘，重复同步不会让文件膨胀
+    - 旁路一个小状态文件记录同步游标（如最新订单号），供增量同步提前停止
+    - 每次提交后导出一份完整 JSON 快照，老的读取方（预热、对账）无需改动
+    """
+    def __init__(self, path, key_fields, snapshot_path=None, volatile_fields=VOLATILE_FIELDS):
+        self.path = path
+        self.key_fields = tuple(key_fields)
+        self.volatile_fields = tuple(volatile_fields)
+        self.snapshot_path = snapshot_path
+        self.state_path = f"{os.path.splitext(path)[0]}.state.json"
+        self.rows = {}
+        self.state = {}
+        self._pending = []
+        self._log_lines = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._load()
+
+    def key_of(self, row):
+        return tuple(str(row.get(k, "")) for k in self.key_fields)
+
+    def _load(self):
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        row = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 断电时最后一行可能只写了一半，跳过即可
+                        continue
+                    self.rows[self.key_of(row)] = row
+                    self._log_lines += 1
+        elif self.snapshot_path and os.path.exists(self.snapshot_path):
+            # 首次启用：把旧版整表 JSON 迁移进来
+            try:
+                with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                    for row in json.load(f):
+                        self.upsert(row)
+                self.commit(export=False)
+                print(f"📦 [账本] 已从 {os.path.basename(self.snapshot_path)} 迁移 {len(self.rows)} 条记录")
+            except Exception as e:
+                print(f"⚠️ [账本] 旧账本迁移失败，将从空账本开始: {e}")
+
+        if os.path.exists(self.state_path):
+            try:
+                with open(self.state_path, 'r', encoding='utf-8') as f:
+                    self.state = json.load(f)
+            except Exception:
+                self.state = {}
+
+    def _stable(self, row):
+        return {k: v for k, v in row.items() if k not in self.volatile_fields}
+
+    def upsert(self, row):
+        """返回 "NEW" / "UPDATED" / None(无变化)；变化只进缓冲区，commit 时统一追加"""
+        key = self.key_of(row)
+        old = self.rows.get(key)
+        if old is not None and self._stable(old) == self._stable(row):
+            # 只有易变字段变了：内存 (及导出的快照) 用最新值，但不追加账本行
+            self.rows[key] = row
+            return None
+        self.rows[key] = row
+        self._pending.append(row)
+        return "NEW" if old is None else "UPDATED"
+
+    def get(self, row):
+        return self.rows.get(self.key_of(row))
+
+    def __contains__(self, key):
+        return tuple(str(k) for k in key) in self.rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def get_state(self, name, default=None):
+        return self.state.get(name, default)
+
+    def set_state(self, name, value):
+        self.state[name] = value
+        tmp_path = f"{self.state_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.state_path)
+
+    def commit(self, export=True):
+        """把缓冲区追加进 JSONL；日志里的过期行超过一半时顺手压实"""
+        if self._pending:
+            append_jsonl(self.path, self._pending)
+            self._log_lines += len(self._pending)
+            self._pending = []
+            if self._log_lines > 2 * max(1, len(self.rows)):
+                self.compact()
+        if export and self.snapshot_path:
+            self.export_snapshot()
+
+    def compact(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for row in self.rows.values():
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+        os.replace(tmp_path, self.path)
+        self._log_lines = len(self.rows)
+
+    def all_rows(self):
+        return list(self.rows.values())
+
+    def export_snapshot(self):
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.all_rows(), f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, self.snapshot_path)
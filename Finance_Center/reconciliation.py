@@ -0,0 +1,336 @@
+import datetime
+import difflib
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+# 路径修复：确保能找到根目录的 config / game_rating
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+import config
+from game_rating.name_utils import normalize_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS purchases (
+    order_id TEXT, name TEXT, norm TEXT, order_time TEXT, cost REAL, status TEXT,
+    PRIMARY KEY (order_id, name)
+);
+CREATE INDEX IF NOT EXISTS idx_purchases_norm ON purchases(norm);
+CREATE INDEX IF NOT EXISTS idx_purchases_time ON purchases(order_time);
+
+CREATE TABLE IF NOT EXISTS listings (
+    name TEXT, order_time TEXT, norm TEXT, stock REAL, my_price REAL, market_price REAL, status TEXT,
+    PRIMARY KEY (name, order_time)
+);
+CREATE INDEX IF NOT EXISTS idx_listings_norm ON listings(norm);
+CREATE INDEX IF NOT EXISTS idx_listings_time ON listings(order_time);
+
+CREATE TABLE IF NOT EXISTS sale_events (
+    ts TEXT, kind TEXT, name TEXT, order_time TEXT, norm TEXT, qty REAL, price REAL,
+    PRIMARY KEY (ts, kind, name, order_time)
+);
+CREATE INDEX IF NOT EXISTS idx_sale_events_norm ON sale_events(norm);
+
+-- 模糊匹配结果缓存：purchase_norm 为空表示“对照 rowid <= checked_against 的采购记录时没找到”
+CREATE TABLE IF NOT EXISTS aliases (
+    listing_norm TEXT PRIMARY KEY, purchase_norm TEXT, score REAL, checked_against INTEGER
+);
+
+-- 各数据源的增量游标
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY, ino INTEGER, offset INTEGER, fingerprint TEXT
+);
+"""
+
+TIME_FORMATS = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d", "%Y/%m/%d %H:%M:%S", "%Y/%m/%d")
+
+
+def _to_number(text):
+    m = re.search(r'-?\d+(?:\.\d+)?', str(text))
+    return float(m.group()) if m else 0.0
+
+
+def _parse_time(text):
+    text = str(text or "").strip()
+    try:
+        return datetime.datetime.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in TIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+    return None
+
+
+class ReconciliationEngine:
+    """
+    [对账引擎] 杉果采购 × SteamPy 货架
+    - 两本账 + 变更流水增量灌入 SQLite（JSONL 按字节偏移续读，文件被压实/替换时自动全量重灌）
+    - 按归一化游戏名做哈希连接，对不上的再走 difflib 模糊匹配，结果持久化
+    - 输出每个游戏的已实现利润、在架库存货值与上架天数
+    """
+    def __init__(self, db_path="data/reconciliation.db", data_dir="data"):
+        self.data_dir = data_dir
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.executescript(SCHEMA)
+        # Dashboard 会在线程池里调用，同一连接上串行执行
+        self._lock = threading.Lock()
+
+    # ---------- 增量灌库 ----------
+
+    def _cursor_of(self, source):
+        row = self.conn.execute("SELECT ino, offset, fingerprint FROM sources WHERE source = ?", (source,)).fetchone()
+        return row or (None, 0, None)
+
+    def _clear_table(self, table):
+        """整表重灌：rowid 会从头再来，aliases 里基于 rowid 水位线的“未匹配”缓存随之失效，一并清掉"""
+        self.conn.execute(f"DELETE FROM {table}")
+        self.conn.execute("DELETE FROM aliases")
+
+    def _save_cursor(self, source, ino, offset, fingerprint=None):
+        self.conn.execute("INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?)", (source, ino, offset, fingerprint))
+
+    def _tail_jsonl(self, source, path, table):
+        """
+        续读 JSONL 新增的完整行；inode 变了或文件变短（被压实）就清表重灌。
+        返回新读到的记录列表。
+        """
+        st = os.stat(path)
+        ino, offset, _ = self._cursor_of(source)
+        if ino != st.st_ino or st.st_size < offset:
+            if table:
+                self._clear_table(table)
+            offset = 0
+        if st.st_size == offset:
+            return []
+
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+        # 最后一行可能还没写完，留到下次再读
+        end = chunk.rfind(b"\n") + 1
+        rows = []
+        for line in chunk[:end].splitlines():
+            try:
+                rows.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+        self._save_cursor(source, st.st_ino, offset + end)
+        return rows
+
+    def _reload_snapshot(self, source, path, table):
+        """没有 JSONL 时退回整表快照，按 大小-mtime 指纹判断是否需要重灌"""
+        st = os.stat(path)
+        fingerprint = f"{st.st_size}-{int(st.st_mtime)}"
+        if self._cursor_of(source)[2] == fingerprint:
+            return []
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+        self._clear_table(table)
+        self._save_cursor(source, None, 0, fingerprint)
+        return rows
+
+    def _load_rows(self, source, table, keep_table=False):
+        jsonl = os.path.join(self.data_dir, f"{source}.jsonl")
+        snapshot = os.path.join(self.data_dir, f"{source}.json")
+        if os.path.exists(jsonl):
+            return self._tail_jsonl(source, jsonl, None if keep_table else table)
+        if os.path.exists(snapshot):
+            return self._reload_snapshot(source, snapshot, table)
+        return []
+
+    def refresh(self):
+        """把三份数据源的新增部分灌进库，返回本次新增的行数"""
+        with self.conn:
+            purchases = self._load_rows("purchase_ledger", "purchases")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO purchases VALUES (?, ?, ?, ?, ?, ?)",
+                [(str(r.get("order_id")), r.get("name", ""), normalize_name(r.get("name")), r.get("order_time", ""),
+                  float(r.get("cost") or 0), r.get("status", "")) for r in purchases if r.get("name")]
+            )
+
+            listings = self._load_rows("steampy_sales", "listings")
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO listings VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(r.get("name", ""), r.get("order_time", ""), normalize_name(r.get("name")), _to_number(r.get("stock")),
+                  _to_number(r.get("my_price")), _to_number(r.get("market_price")), r.get("status", "")) for r in listings if r.get("name")]
+            )
+
+            # 流水只会追加，主键去重即可，不需要清表
+            events = self._load_rows("steampy_deltas", "sale_events", keep_table=True)
+            sale_rows = []
+            for e in events:
+                before, after = e.get("before") or {}, e.get("after") or {}
+                if e.get("kind") == "SOLD":
+                    qty = _to_number(before.get("stock")) - _to_number(after.get("stock"))
+                    price = _to_number(after.get("my_price"))
+                elif e.get("kind") == "REMOVED":
+                    qty, price = _to_number(before.get("stock")), _to_number(before.get("my_price"))
+                else:
+                    continue
+                sale_rows.append((e.get("ts"), e["kind"], e.get("name", ""), e.get("order_time", ""),
+                                  normalize_name(e.get("name")), qty, price))
+            self.conn.executemany("INSERT OR IGNORE INTO sale_events VALUES (?, ?, ?, ?, ?, ?, ?)", sale_rows)
+        return len(purchases) + len(listings) + len(sale_rows)
+
+    # ---------- 连接与核算 ----------
+
+    def _resolve_aliases(self, listing_norms, purchase_norms):
+        """
+        精确对不上的货架名做模糊匹配，结果（包括没匹配上）都缓存。
+        之前没匹配上的名字，只需要和之后新插入的采购记录再比一次。
+        """
+        cfg = config.FINANCE_CONFIG
+        cached = {r[0]: (r[1], r[3]) for r in self.conn.execute("SELECT * FROM aliases")}
+        max_rowid = self.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM purchases").fetchone()[0]
+        full_pool = list(purchase_norms)
+        new_pools = {}
+        mapping, updates = {}, []
+        for norm in listing_norms:
+            if norm in purchase_norms:
+                continue
+            hit = cached.get(norm)
+            if hit and hit[0] in purchase_norms:
+                mapping[norm] = hit[0]
+                continue
+            if hit and hit[0] is None:
+                if hit[1] >= max_rowid:
+                    continue
+                if hit[1] not in new_pools:
+                    new_pools[hit[1]] = [r[0] for r in self.conn.execute(
+                        "SELECT DISTINCT norm FROM purchases WHERE rowid > ?", (hit[1],))]
+                pool = new_pools[hit[1]]
+            else:
+                pool = full_pool
+            match = difflib.get_close_matches(norm, pool, n=1, cutoff=cfg["FUZZY_CUTOFF"])
+            target = match[0] if match else None
+            score = difflib.SequenceMatcher(None, norm, target).ratio() if target else None
+            updates.append((norm, target, score, max_rowid))
+            if target:
+                mapping[norm] = target
+        if updates:
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?, ?, ?)", updates)
+        return mapping
+
+    def report(self):
+        """刷新并生成汇总对账报告"""
+        with self._lock:
+            return self._report()
+
+    def _report(self):
+        started = time.perf_counter()
+        self.refresh()
+        fee_rate = config.FINANCE_CONFIG["STEAMPY_FEE_RATE"]
+        now = datetime.datetime.now()
+
+        # 采购侧：按归一名聚合 (哈希表)
+        buys = {}
+        for norm, name, qty, cost in self.conn.execute(
+                "SELECT norm, MIN(name), COUNT(*), SUM(cost) FROM purchases GROUP BY norm"):
+            buys[norm] = {"name": name, "bought": qty, "cost": round(cost or 0, 2)}
+
+        # 货架侧：在架库存与最早上架时间 (每个游戏只解析一次时间)
+        shelf = {}
+        for norm, name, stock, value, oldest in self.conn.execute(
+                "SELECT norm, MIN(name), SUM(stock), SUM(stock * my_price), MIN(order_time) FROM listings "
+                "WHERE status != '已下架' AND stock > 0 GROUP BY norm"):
+            t = _parse_time(oldest)
+            shelf[norm] = {"name": name, "stock": stock, "listed_value": value,
+                           "oldest_days": (now - t).total_seconds() / 86400 if t else None}
+
+        # 成交侧：来自变更流水
+        sold = {}
+        for norm, kind, qty, revenue in self.conn.execute(
+                "SELECT norm, kind, SUM(qty), SUM(qty * price) FROM sale_events GROUP BY norm, kind"):
+            s = sold.setdefault(norm, {"sold": 0.0, "revenue": 0.0, "removed": 0.0})
+            if kind == "SOLD":
+                s["sold"] += qty or 0
+                s["revenue"] += (revenue or 0) * (1 - fee_rate)
+            else:
+                s["removed"] += qty or 0
+
+        # 哈希连接：货架/成交的归一名 -> 采购归一名 (精确优先，模糊兜底)
+        aliases = self._resolve_aliases(set(shelf) | set(sold), set(buys))
+        items = {}
+        for norm, b in buys.items():
+            items[norm] = {"name": b["name"], "match": "exact", "bought": b["bought"], "cost": b["cost"],
+                           "sold": 0.0, "revenue": 0.0, "removed": 0.0, "stock": 0.0, "listed_value": 0.0, "oldest_days": None}
+        for side in (shelf, sold):
+            for norm, data in side.items():
+                key = norm if norm in buys else aliases.get(norm, norm)
+                item = items.setdefault(key, {"name": data.get("name", norm), "match": "unmatched", "bought": 0, "cost": 0.0,
+                                              "sold": 0.0, "revenue": 0.0, "removed": 0.0, "stock": 0.0, "listed_value": 0.0, "oldest_days": None})
+                if key != norm and item["match"] == "exact":
+                    item["match"] = "fuzzy"
+                for field in ("sold", "revenue", "removed", "stock", "listed_value"):
+                    item[field] += data.get(field, 0.0)
+                if data.get("oldest_days") is not None:
+                    item["oldest_days"] = max(item["oldest_days"] or 0, data["oldest_days"])
+
+        # 核算：已实现利润按平均进价计成本
+        rows = []
+        for norm, it in items.items():
+            avg_cost = it["cost"] / it["bought"] if it["bought"] else None
+            it["avg_cost"] = round(avg_cost, 2) if avg_cost is not None else None
+            it["realized_profit"] = round(it["revenue"] - it["sold"] * avg_cost, 2) if avg_cost is not None else None
+            it["unsold_cost"] = round(it["stock"] * avg_cost, 2) if avg_cost is not None else None
+            it["revenue"] = round(it["revenue"], 2)
+            it["listed_value"] = round(it["listed_value"], 2)
+            days = it.pop("oldest_days")
+            it["days_on_shelf"] = round(days, 1) if days is not None else None
+            it["norm"] = norm
+            rows.append(it)
+        rows.sort(key=lambda x: (x["realized_profit"] is None, -(x["realized_profit"] or 0)))
+
+        totals = {
+            "items": len(rows),
+            "matched": sum(1 for r in rows if r["match"] != "unmatched"),
+            "fuzzy": sum(1 for r in rows if r["match"] == "fuzzy"),
+            "total_cost": round(sum(r["cost"] for r in rows), 2),
+            "realized_profit": round(sum(r["realized_profit"] or 0 for r in rows), 2),
+            "unsold_stock": sum(r["stock"] for r in rows),
+            "unsold_value": round(sum(r["listed_value"] for r in rows), 2),
+            "unsold_cost": round(sum(r["unsold_cost"] or 0 for r in rows), 2),
+        }
+        return {
+            "generated_at": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+            "totals": totals,
+            "items": rows,
+        }
+
+
+_shared_engine = None
+_shared_lock = threading.Lock()
+
+
+def shared_engine():
+    """进程内共用一份对账引擎 (一条 SQLite 连接)，Dashboard 与同步管理器都从这里取"""
+    global _shared_engine
+    with _shared_lock:
+        if _shared_engine is None:
+            _shared_engine = ReconciliationEngine()
+        return _shared_engine
+
+
+# ==========================================
+# 🚀 命令行对账：python Finance_Center/reconciliation.py
+# ==========================================
+if __name__ == "__main__":
+    result = ReconciliationEngine().report()
+    t = result["totals"]
+    print(f"📒 对账完成 ({result['elapsed_ms']} ms)：{t['items']} 个游戏，匹配 {t['matched']} (模糊 {t['fuzzy']})")
+    print(f"💰 已实现利润 ¥{t['realized_profit']} | 在架 {t['unsold_stock']:.0f} 件，挂牌货值 ¥{t['unsold_value']}，成本 ¥{t['unsold_cost']}")
+    for r in result["items"][:20]:
+        print(f"  {r['name'][:24]:<24} | {r['match']:<9} | 进 {r['bought']} 售 {r['sold']:.0f} 架 {r['stock']:.0f} | "
+              f"利润 {r['realized_profit']} | 上架 {r['days_on_shelf']} 天")
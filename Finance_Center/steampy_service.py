@@ -5,72 +5,132 @@ import re
 import json
 import datetime
 
+from Finance_Center.ledger_store import LedgerStore, VOLATILE_FIELDS, append_jsonl
+from blackbox_recorder import BlackboxRecorder
+
+# 列表首条挂单的 (上架时间, 名称)：翻页后它变了，说明新一页已渲染
+FIRST_LISTING_JS = """(prev) => {
+    const item = document.querySelector('.list-item');
+    if (!item) return false;
+    const t = item.querySelector('.createTime'), n = item.querySelector('.steamGameName');
+    return ((t ? t.textContent.trim() : '') + '|' + (n ? n.textContent.trim() : '')) !== prev;
+}"""
+
+
+def _to_number(text):
+    """'¥12.50' / '3 个' -> 数值，解析不了返回 None"""
+    m = re.search(r'-?\d+(?:\.\d+)?', str(text))
+    return float(m.group()) if m else None
+
+
+def diff_listing(old, new):
+    """
+    比较同一挂单前后两次快照，产出变更事件类型列表
+    NEW 新上架 / SOLD 库存减少 / STOCK 补货 / PRICE 改价 / STATUS 状态变化
+    市场参考价每次都会浮动，不算作我的挂单变化。
+    """
+    if old is None:
+        return ["NEW"]
+    kinds = []
+    old_stock, new_stock = _to_number(old.get("stock")), _to_number(new.get("stock"))
+    if old_stock is not None and new_stock is not None and new_stock != old_stock:
+        kinds.append("SOLD" if new_stock < old_stock else "STOCK")
+    if old.get("my_price") != new.get("my_price"):
+        kinds.append("PRICE")
+    if old.get("status") != new.get("status"):
+        kinds.append("STATUS")
+    return kinds
+
 class SteamPyService:
     def __init__(self, context):
         self.context = context
-        self.live_shot = "blackbox/steampy_live.png"
-        self.live_html = "blackbox/steampy_debug.html"
-        self.save_dir = "blackbox/steampy_service"
+        self.blackbox = BlackboxRecorder("steampy_service")
         self.sales_file = "data/steampy_sales.json"
+        self.delta_file = "data/steampy_deltas.jsonl"
         
-        os.makedirs(self.save_dir, exist_ok=True)
         os.makedirs("data", exist_ok=True)
-        self.step_idx = 0
+        # 挂单现状：同名游戏可以多次上架，主键用 (名称, 上架时间)；市场参考价每次都浮动，和 diff_listing 一样不算变化
+        self.listings = LedgerStore("data/steampy_sales.jsonl", ("name", "order_time"), snapshot_path=self.sales_file,
+                                    volatile_fields=VOLATILE_FIELDS + ("market_price",))
 
-    async def _log_and_shot(self, page, action_name):
-        self.step_idx += 1
-        try:
-            await page.screenshot(path=self.live_shot)
-            content = await page.content()
-            with open(self.live_html, "w", encoding="utf-8") as f:
-                f.write(content)
-            archive_path = f"{self.save_dir}/step_{self.step_idx}_{action_name}"
-            await page.screenshot(path=f"{archive_path}.png")
-        except: pass
-
-    async def action_fetch_seller_ledger(self, page):
-        """🚀 [全量翻页审计] 自动遍历所有页面并抓取挂单"""
+    async def _log_and_shot(self, page, action_name, flush=False):
+        """📸 视觉存档：进黑匣子环形缓冲；flush=True 时连同前面几帧一起落盘"""
+        await self.blackbox.capture(page, action_name)
+        if flush:
+            await self.blackbox.flush(action_name)
+
+    async def action_fetch_seller_ledger(self, page, incremental=True):
+        """
+        🚀 [卖家货架同步] 只记录变化：新上架 / 卖出 / 补货 / 改价 / 状态
+        增量模式下遇到一整页无变化即停止；incremental=False 会扫完全部分页并标记已消失的挂单。
+        """
+        mode = "增量" if incremental else "全量"
         try:
-            # 1. 前置导航逻辑 (保持不变)
+            # 1. 前置导航：每一步都等待目标元素出现，而不是固定睡眠
             print("[SteamPy] 🕵️ 正在同步首页状态...")
             await page.goto("https://steampy.com/home", wait_until="networkidle")
-            await asyncio.sleep(2)
             
             print("🖱️ 正在展开卖家中心菜单...")
             seller_menu = page.get_by_text("卖家中心").first
             await seller_menu.click()
-            await asyncio.sleep(1)
 
             print("🚀 正在突入卖家中心-CDK...")
             cdk_link = page.get_by_text("卖家中心-CDK").first
+            await cdk_link.wait_for(state="visible", timeout=10000)
             await cdk_link.click()
-            await asyncio.sleep(4) 
 
-            # 2. 循环翻页抓取
-            all_entries = []
+            # 2. 循环翻页，逐条与上次快照比较
+            now = datetime.datetime.now()
+            sync_at = now.strftime("%H:%M:%S")
+            counts = {"NEW": 0, "SOLD": 0, "STOCK": 0, "PRICE": 0, "STATUS": 0, "REMOVED": 0}
+            seen = set()
             page_num = 1
             
             while True:
-                print(f"📄 正在扫描第 {page_num} 页...")
+                print(f"📄 正在扫描第 {page_num} 页 ({mode})...")
                 await page.wait_for_selector(".list-item", timeout=10000)
                 items = await page.query_selector_all(".list-item")
+                deltas = []
+                first_sig = None
                 
                 for item in items:
-                    # ... (这里是之前的提取 logic) ...
                     time_el = await item.query_selector(".createTime")
                     name_el = await item.query_selector(".steamGameName")
                     price_els = await item.query_selector_all(".gameTotal") 
                     status_el = await item.query_selector(".tc.w7 .gameTotal")
 
                     if time_el and name_el and len(price_els) >= 3:
-                        all_entries.append({
+                        row = {
                             "order_time": (await time_el.text_content()).strip(),
                             "name": (await name_el.text_content()).strip(),
                             "stock": (await price_els[0].text_content()).strip(),
                             "market_price": (await price_els[1].text_content()).strip(),
                             "my_price": (await price_els[2].text_content()).strip(),
-                            "status": (await status_el.text_content()).strip() if status_el else "出售"
-                        })
+                            "status": (await status_el.text_content()).strip() if status_el else "出售",
+                            "sync_at": sync_at
+                        }
+                        first_sig = first_sig or f"{row['order_time']}|{row['name']}"
+                        seen.add(self.listings.key_of(row))
+
+                        old = self.listings.get(row)
+                        kinds = diff_listing(old, row)
+                        self.listings.upsert(row)
+                        for kind in kinds:
+                            counts[kind] += 1
+                            deltas.append({
+                                "ts": now.isoformat(timespec="seconds"), "kind": kind,
+                                "name": row["name"], "order_time": row["order_time"],
+                                "before": {k: old.get(k) for k in ("stock", "my_price", "status")} if old else None,
+                                "after": {k: row[k] for k in ("stock", "my_price", "status")},
+                            })
+
+                # 每页提交一次：现状进账本，变化进流水
+                self.listings.commit(export=False)
+                append_jsonl(self.delta_file, deltas)
+
+                if incremental and not deltas:
+                    print(f"⏹️ 第 {page_num} 页无任何变化，增量同步提前结束。")
+                    break
 
                 # 3. 寻找“下一页”按钮并判断是否结束
                 next_btn = await page.query_selector(".ivu-page-next")
@@ -84,23 +144,38 @@ class SteamPyService:
                     print(f"🏁 已到达最后一页 (共 {page_num} 页)，侦察完毕。")
                     break
                 
-                # 点击下一页并等待
+                # 点击下一页，等首条挂单变化即可
                 await next_btn.click()
                 page_num += 1
-                await asyncio.sleep(3) # 给渲染留出缓冲时间
+                await page.wait_for_function(FIRST_LISTING_JS, arg=first_sig, timeout=10000)
                 await self._log_and_shot(page, f"SYNC_PAGE_{page_num}")
 
-            # 4. 落地存储
-            with open(self.sales_file, "w", encoding="utf-8") as f:
-                json.dump(all_entries, f, ensure_ascii=False, indent=4)
+            # 4. 全量模式：上次还在、这次没扫到的挂单视为已下架
+            if not incremental:
+                gone = []
+                for key, row in self.listings.rows.items():
+                    if key not in seen and row.get("status") != "已下架":
+                        gone.append({
+                            "ts": now.isoformat(timespec="seconds"), "kind": "REMOVED",
+                            "name": row["name"], "order_time": row["order_time"],
+                            "before": {k: row.get(k) for k in ("stock", "my_price", "status")}, "after": None,
+                        })
+                for event in gone:
+                    row = self.listings.get(event)
+                    self.listings.upsert({**row, "status": "已下架", "sync_at": sync_at})
+                counts["REMOVED"] = len(gone)
+                append_jsonl(self.delta_file, gone)
+            self.listings.commit()
             
             print("-" * 100)
-            print(f"✅ 全量审计完成：共发现 {len(all_entries)} 条跨页挂单记录")
-            return True
+            summary = " / ".join(f"{k} {v}" for k, v in counts.items() if v) or "无变化"
+            print(f"✅ {mode}同步完成：扫描 {page_num} 页，变更 {summary}，货架共 {len(self.listings)} 条")
+            return counts
 
         except Exception as e:
             print(f"❌ 翻页审计失败: {e}")
-            return False
+            await self._log_and_shot(page, "SYNC_FAIL", flush=True)
+            return None
 
 
     async def enter_interactive_mode(self):
@@ -118,10 +193,12 @@ class SteamPyService:
                 if cmd == "exit": break
                 elif cmd == "sync": # 🚀 指挥官，只需输入 sync 即可完成全自动流程
                     await self.action_fetch_seller_ledger(page)
+                elif cmd == "sync all": # 全量核对，顺带标记已下架的挂单
+                    await self.action_fetch_seller_ledger(page, incremental=False)
                 elif cmd == "shot":
-                    await self._log_and_shot(page, "MANUAL_SHOT")
+                    await self._log_and_shot(page, "MANUAL_SHOT", flush=True)
                 else:
-                    print(f"❓ 未知指令: {cmd} (可用指令: sync, shot, exit)")
+                    print(f"❓ 未知指令: {cmd} (可用指令: sync, sync all, shot, exit)")
         finally:
             if not page.is_closed(): await page.close()
             print("🔙 已返回主控制台。")
\ No newline at end of file
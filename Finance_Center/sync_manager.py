@@ -2,44 +2,96 @@ import asyncio
 import json
 import os
 import datetime
+import time
+
+from Finance_Center.reconciliation import shared_engine
 
 class SyncManager:
     def __init__(self, commander):
+        # 财务服务在引擎启动 (init_all) 后才挂上，且每次重启都会换上下文，用的时候再取
         self.commander = commander
-        self.sonkwo = commander.finance
-        self.steampy = commander.steampy_center
+        # 分平台进度：PENDING / RUNNING / SUCCESS / FAILED
+        self.progress = {}
+
+    def _report_progress(self, platform, state, msg=""):
+        entry = self.progress.setdefault(platform, {"started_at": None, "elapsed": None})
+        entry["state"] = state
+        entry["msg"] = msg
+        if state == "RUNNING":
+            entry["started_at"] = datetime.datetime.now().strftime('%H:%M:%S')
+            entry["_t0"] = time.perf_counter()
+        elif state in ("SUCCESS", "FAILED") and "_t0" in entry:
+            entry["elapsed"] = round(time.perf_counter() - entry.pop("_t0"), 1)
+        print(f"📍 [{platform}] {state} {msg}")
+        # 挂到 Web 状态上，Dashboard 可以随时查询
+        agent_state = getattr(self.commander, "agent_state", None)
+        if agent_state is not None:
+            agent_state["sync_progress"] = {
+                k: {f: v for f, v in e.items() if not f.startswith("_")} for k, e in self.progress.items()
+            }
+
+    async def _run_platform(self, platform, resolve):
+        """
+        单个平台的同步：独立页面、独立失败，不影响另一个平台
+        resolve() 返回 (浏览器上下文, 抓取动作)，在 try 里调用，服务还没挂上也只算这个平台失败
+        """
+        self._report_progress(platform, "RUNNING")
+        page = None
+        try:
+            context, action = resolve()
+            if context is None or action is None:
+                raise RuntimeError("财务服务尚未就绪")
+            page = await context.new_page()
+            result = await action(page)
+            if result is None:
+                raise RuntimeError("抓取流程异常结束，详见日志")
+            summary = f"账本 {len(result)} 条" if isinstance(result, list) else \
+                " / ".join(f"{k} {v}" for k, v in result.items() if v) or "无变化"
+            self._report_progress(platform, "SUCCESS", summary)
+            return True
+        except Exception as e:
+            self._report_progress(platform, "FAILED", str(e))
+            return False
+        finally:
+            if page and not page.is_closed():
+                try:
+                    await page.close()
+                except Exception:
+                    pass
 
     async def run_full_sync(self):
-        """🚀 执行全量同步任务"""
+        """
+        🚀 两个平台并发同步
+        各自在自己平台的浏览器上下文里开专用页面；只“借用”上下文，不占用巡航锁。
+        """
         print(f"\n[{datetime.datetime.now().strftime('%H:%M:%S')}] 🔄 启动跨平台一键同步...")
-        
-        # 建立一个专用的工作页面，不干扰主页面的逻辑
-        # 我们使用 commander 的 context，因为它持有所有登录 Cookie
-        sync_page = await self.commander.sonkwo.context.new_page()
-        
-        try:
-            # --- 阶段 A: 杉果订单同步 ---
-            print("📍 [1/2] 正在提取杉果采购成本...")
-            await self.sonkwo.action_fetch_ledger(sync_page)
-            
-            await asyncio.sleep(3) # 缓冲间隔
+        for platform in ("Sonkwo", "SteamPY"):
+            self._report_progress(platform, "PENDING")
 
-            # --- 阶段 B: SteamPY 挂单同步 ---
-            print("📍 [2/2] 正在扫描 SteamPY 货架状态...")
-            await self.steampy.action_fetch_seller_ledger(sync_page)
+        try:
+            async with self.commander.pin_contexts(timeout=120):
+                c = self.commander
+                results = await asyncio.gather(
+                    self._run_platform("Sonkwo", lambda: (
+                        c.sonkwo.context, c.finance and c.finance.action_fetch_ledger)),
+                    self._run_platform("SteamPY", lambda: (
+                        c.steampy.context, c.steampy_center and c.steampy_center.action_fetch_seller_ledger)),
+                )
+        except asyncio.TimeoutError:
+            for platform in ("Sonkwo", "SteamPY"):
+                self._report_progress(platform, "FAILED", "浏览器引擎未就绪")
+            return {"status": "error", "msg": "浏览器引擎未就绪，同步取消", "progress": self.progress}
 
+        details = "；".join(f"{k}: {v['state']} {v['msg']}" for k, v in self.progress.items())
+        if all(results):
             print("✨ 同步任务圆满完成！数据已更新。")
-            return {"status": "success", "msg": "同步完成"}
-        
-        except Exception as e:
-            print(f"❌ 同步失败: {e}")
-            return {"status": "error", "msg": str(e)}
-        finally:
-            if not sync_page.is_closed():
-                await sync_page.close()
+            return {"status": "success", "msg": f"同步完成 ({details})", "progress": self.progress}
+        if any(results):
+            print(f"⚠️ 部分平台同步失败: {details}")
+            return {"status": "partial", "msg": f"部分完成 ({details})", "progress": self.progress}
+        print(f"❌ 同步失败: {details}")
+        return {"status": "error", "msg": f"同步失败 ({details})", "progress": self.progress}
 
     def get_summary_report(self):
-        """📊 生成汇总对账数据 (用于前端展示)"""
-        # 读取两份 JSON 并根据游戏名匹配计算利润
-        # 这一部分可以在后续专门写对账逻辑时细化
-        pass
\ No newline at end of file
+        """📊 生成汇总对账数据 (用于前端展示)：增量灌库 + 按归一名连接两本账"""
+        return shared_engine().report()
\ No newline at end of file
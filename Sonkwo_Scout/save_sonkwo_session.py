@@ -4,6 +4,10 @@ import sys
 import datetime
 from playwright.async_api import async_playwright
 
+# 从项目根目录导入 config / browser_runtime (脚本可能在子目录里直接运行)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from browser_runtime import export_state, session_status, load_state
+
 # 💡 截图存放目录
 SHOT_DIR = "blackbox/session_debug"
 LIVE_PATH = "blackbox/session_live.png"
@@ -85,8 +89,11 @@ async def save_sonkwo_session_universal():
             print("\n⏳ 执行跨平台同步保护...")
             await page.goto("https://www.sonkwo.cn/categories", wait_until="networkidle")
             await take_shot(page, "07_final_sync_page")
-            
-            print(f"🎉 状态锁定完成。")
+
+            # 导出 storage_state 快照：共用浏览器运行时按它克隆出任意多个已登录上下文
+            path = await export_state(context, "sonkwo")
+            print(f"🎉 状态锁定完成，快照: {path}")
+            print(f"🔍 快照自检: {session_status('sonkwo', load_state('sonkwo'))}")
 
         except Exception as e:
             print(f"\n🚨 流程发生错误: {e}")
@@ -4,7 +4,7 @@ import os
 from playwright.async_api import async_playwright
 
 class SonkwoScout:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, runtime=None):
         # 1. 核心：锁定你在 save_sonkwo_session.py 中保存数据的文件夹
         # current_dir = os.path.dirname(os.path.abspath(__file__))
         self.user_data_dir = os.path.join(
@@ -16,17 +16,23 @@ class SonkwoScout:
         self.context = None
         self.page = None
         self.playwright = None
+        # 共用的浏览器运行时 (browser_runtime.BrowserRuntime)；不传则退回独占一个持久化浏览器
+        self.runtime = runtime
 
     async def start(self, url="https://www.sonkwo.cn/"):
         """初始化并进入已登录状态的首页"""
-        self.playwright = await async_playwright().start()
-        
-        # 2. 启动持久化上下文，加载杉果登录信息
-        self.context = await self.playwright.chromium.launch_persistent_context(
-            self.user_data_dir,
-            headless=self.headless,
-            args=["--disable-blink-features=AutomationControlled"]
-        )
+        if self.runtime:
+            # 2. 从共用浏览器里开一个独立上下文，登录态来自 storage_state 快照
+            self.context = await self.runtime.new_context("sonkwo")
+        else:
+            self.playwright = await async_playwright().start()
+
+            # 2. 启动持久化上下文，加载杉果登录信息
+            self.context = await self.playwright.chromium.launch_persistent_context(
+                self.user_data_dir,
+                headless=self.headless,
+                args=["--disable-blink-features=AutomationControlled"]
+            )
         
         # 3. 获取或创建页面
         self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
@@ -51,6 +57,8 @@ class SonkwoScout:
         """安全关闭"""
         if self.context:
             await self.context.close()
+        # 共用运行时的浏览器进程归运行时管，这里只关自己的上下文
         if self.playwright:
             await self.playwright.stop()
+            self.playwright = None
         print("\n🔒 杉果侦察机已安全返航。")
\ No newline at end of file
@@ -3,6 +3,10 @@ import os
 import sys
 from playwright.async_api import async_playwright
 
+# 从项目根目录导入 config / browser_runtime (脚本可能在子目录里直接运行)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from browser_runtime import export_state, session_status, load_state
+
 async def save_steampy_headless_optimized():
     async with async_playwright() as p:
         # 确保路径指向 SteamPY-Scout 内部
@@ -87,9 +91,11 @@ async def save_steampy_headless_optimized():
                 print("\n✅ 验证通过。正在强制刷新并锁定磁盘...")
                 # 诱导刷新以触发持久化存储
                 await page.goto("https://steampy.com/home", wait_until="networkidle")
-                await context.storage_state(path=os.path.join(user_data_dir, "state.json")) # 备份状态
+                # 导出 storage_state 快照：共用浏览器运行时按它克隆出任意多个已登录上下文
+                path = await export_state(context, "steampy")
                 await asyncio.sleep(3)
-                print(f"🎉 Session 已在无头模式下安全固化。")
+                print(f"🎉 Session 已在无头模式下安全固化，快照: {path}")
+                print(f"🔍 快照自检: {session_status('steampy', load_state('steampy'))}")
             else:
                 print("\n❌ 登录超时或被拦截。请检查生成的 debug_*.png 截图。")
 
@@ -3,6 +3,7 @@ import re
 import datetime
 from SteamPY_Scout.steampy_scout_core import SteamPyScout
 from tabulate import tabulate
+from blackbox_recorder import BlackboxRecorder
 import sys
 import os
 class SteamPyMonitor(SteamPyScout):
@@ -11,29 +12,16 @@ class SteamPyMonitor(SteamPyScout):
         super().__init__(**kwargs)
         # 💡 显式声明这个成员变量，初始为空
         self.notifier = None 
-        self._shot_counter = 0 # 顺便初始化你的截图计数器
+        # 最近 N 步只留在内存里，上架失败时才整段落盘
+        self.blackbox = BlackboxRecorder("steampy_hunter")
     # --- 📸 侦察机黑匣子系统 ---
-    async def take_screenshot(self, step_name):
+    async def take_screenshot(self, step_name, flush=False):
         """
-        保存最近 10 张截图，文件名循环覆盖
+        记录一帧到黑匣子环形缓冲；flush=True 时把整段缓冲写到 blackbox/steampy_hunter/
         """
-        if not hasattr(self, '_shot_counter'):
-            self._shot_counter = 0
-            # 确保截图目录存在
-            if not os.path.exists("blackbox"):
-                os.makedirs("blackbox")
-
-        # 计数器 0-9 循环
-        idx = self._shot_counter % 10
-        timestamp = datetime.datetime.now().strftime("%H%M%S")
-        filename = f"blackbox/step_{idx}_{step_name}_{timestamp}.png"
-        
-        try:
-            await self.page.screenshot(path=filename)
-            print(f"📸 [黑匣子] 记录点 {idx}: {step_name}")
-            self._shot_counter += 1
-        except Exception as e:
-            print(f"🚨 截图失败: {e}")
+        await self.blackbox.capture(self.page, step_name)
+        if flush:
+            await self.blackbox.flush(step_name)
     async def get_current_state(self):
         # --- 原有的页面判断逻辑 ---
         url = self.page.url
@@ -566,7 +554,7 @@ class SteamPyMonitor(SteamPyScout):
                 # 🛡️ 智能熔断：如果搜出来的名字和你传进来的 game_name 不一样，直接报错
                 error_log = f"🚨 严格匹配失败：列表中没有名为 '{game_name}' 的项"
                 print(error_log)
-                await self.take_screenshot("match_failed_stop")
+                await self.take_screenshot("match_failed_stop", flush=True)
                 return False, error_log
 
             # 4. 录入数据阶段
@@ -627,7 +615,7 @@ class SteamPyMonitor(SteamPyScout):
                     # --- C. 结果检查 ---
                     await asyncio.sleep(2)
                     captcha = await self.page.query_selector(".captcha-popup")
-                    await self.take_screenshot("post_result_final")
+                    await self.take_screenshot("post_result_final", flush=bool(captcha))
                     if captcha:
                         msg = f"🛡️ {game_name} 触发验证码！请去浏览器手动滑动。"
                         print(msg)
@@ -639,6 +627,7 @@ class SteamPyMonitor(SteamPyScout):
                 else:
                     msg = f"🚨 {game_name} 未能触发二次确认弹窗，可能上架受限（如sku禁售）。"
                     print(msg)
+                    await self.take_screenshot("no_confirm_modal", flush=True)
                     return False, msg # 💡 失败出口：未见确认弹窗
             else:
                 msg = "❌ 已取消提交（人工/手动干预）。"
@@ -647,6 +636,7 @@ class SteamPyMonitor(SteamPyScout):
 
         except Exception as e:
             print(f"🚨 [上架流程崩溃]: {e}")
+            await self.take_screenshot("post_flow_crash", flush=True)
             return False, f"🚨 上架失败: {e}"
         
     async def action_post_flow(self, arg, notifier=None):
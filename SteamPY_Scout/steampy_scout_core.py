@@ -3,21 +3,28 @@ import os
 from playwright.async_api import async_playwright
 
 class SteamPyScout:
-    def __init__(self, headless=True):
+    def __init__(self, headless=True, runtime=None):
         current_dir = os.path.dirname(os.path.abspath(__file__))
         self.user_data_dir = os.path.join(current_dir, "steampy_data")
         self.headless = headless
         self.context = None
         self.browser_instance = None
+        self.playwright = None
+        # 共用的浏览器运行时 (browser_runtime.BrowserRuntime)；不传则退回独占一个持久化浏览器
+        self.runtime = runtime
 
     async def start(self, url="https://steampy.com/home"):
         """初始化并进入已登录状态的首页"""
-        self.playwright = await async_playwright().start()
-        self.context = await self.playwright.chromium.launch_persistent_context(
-            self.user_data_dir,
-            headless=self.headless,
-            args=["--disable-blink-features=AutomationControlled"]
-        )
+        if self.runtime:
+            # 共用浏览器里的独立上下文，登录态 (含 localStorage 里的 accessToken) 来自 storage_state 快照
+            self.context = await self.runtime.new_context("steampy")
+        else:
+            self.playwright = await async_playwright().start()
+            self.context = await self.playwright.chromium.launch_persistent_context(
+                self.user_data_dir,
+                headless=self.headless,
+                args=["--disable-blink-features=AutomationControlled"]
+            )
         self.page = self.context.pages[0] if self.context.pages else await self.context.new_page()
         
         print("🌐 正在接管  状态...")
@@ -32,7 +39,11 @@ class SteamPyScout:
             if not is_login:
                 raise ValueError("Element Not Found")
             print("✅ SteamPy 登录状态确认。")
+            if self.runtime:
+                self.runtime.mark_alive("steampy")
         except:
+            if self.runtime:
+                self.runtime.mark_expired("steampy")
             print("\n" + "🚨 " * 10)
             print("⚠️ [SteamPy] 登录已失效或 Session 文件夹未正确加载。")
             print("👉 请运行 save_session.py 重新扫码。")
@@ -56,8 +67,10 @@ class SteamPyScout:
         """安全关闭"""
         if self.context:
             await self.context.close()
-        if hasattr(self, 'playwright'):
+        # 共用运行时的浏览器进程归运行时管，这里只关自己的上下文
+        if self.playwright:
             await self.playwright.stop()
+            self.playwright = None
         print("🔒 侦察机已安全返航。")
 
 # --- 使用示例（你可以直接运行这个脚本进行最后的确认） ---
@@ -1,5 +1,9 @@
 import asyncio
+import collections
+import contextlib
+import copy
 import sys
+import time
 import os
 import datetime
 import traceback
@@ -8,6 +12,11 @@ import config
 from pathlib import Path
 from Finance_Center.finance_service import FinanceService
 from Finance_Center.steampy_service import SteamPyService  # ✅ 新增这一行
+from event_bus import bus
+from price_store import PriceStore
+from opportunity_board import OpportunityBoard
+from browser_runtime import BrowserRuntime
+from tab_monitor import TabMonitor
 
 # --- 🚀 路径自愈逻辑 ---
 # 强制定位当前脚本所在的绝对路径为根目录
@@ -44,16 +53,28 @@ def get_search_query(raw_name):
     return clean
 
 class ArbitrageCommander:
-    def __init__(self, agent_state=None): # 💡 加上这个参数
+    def __init__(self, agent_state=None, price_store=None, board=None): # 💡 加上这个参数
         self.agent_state = agent_state   # 💡 将 Web 状态挂载到实例上
-        self.sonkwo = SonkwoCNMonitor()
-        self.steampy = SteamPyMonitor()
+        # 每一次比价观测都进时序库 (Web 端会传入同一个实例，历史视图与查询接口共用)
+        self.price_store = price_store or PriceStore()
+        # 利润榜：每条新结果 O(log n) 入榜，Web 的 history 就是它的前 100 名
+        self.board = board or OpportunityBoard()
+        # 两个平台共用一个 Playwright 驱动 + 一个浏览器进程，各自一个带登录态的上下文
+        self.runtime = BrowserRuntime()
+        self._session_alerted = set()
+        self.sonkwo = SonkwoCNMonitor(runtime=self.runtime)
+        self.steampy = SteamPyMonitor(runtime=self.runtime)
         self.ai = ArbitrageAI()
         # 💡 [新增] 将评分中心挂载到 Commander 上，并复用已有的 AI 引擎
         self.rating_center = GameRatingManager(ai_handler=self.ai)
         self.notifier = FeishuNotifier(config.NOTIFIER_CONFIG["WEBHOOK_URL"])
         self.steampy.notifier = self.notifier
         self.lock = asyncio.Lock()
+        # 浏览器上下文“借用”计数：后台同步等任务持有期间，close_all 会等它们归还再关浏览器
+        self.contexts_ready = asyncio.Event()
+        self._context_pins = 0
+        self._pins_released = asyncio.Event()
+        self._pins_released.set()
         self.min_profit = config.AUDIT_CONFIG["MIN_PROFIT"]  # 有了 AI 过滤，我们可以把门槛稍微调低点
         self.status = {
             "state": "IDLE",      # IDLE, RUNNING, RECOVERY, ERROR
@@ -63,6 +84,15 @@ class ArbitrageCommander:
         }
         self.finance = None
         self.steampy_center = None
+        # 交互通道：/check 等人工查询专用的标签页 (每个平台一个)，不和巡航抢同一个页面
+        self.lanes = None
+        self.interactive_lock = asyncio.Lock()
+        self._interactive_waiting = 0
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+        self.interactive_latency = collections.deque(maxlen=config.INTERACTIVE_CONFIG["WINDOW"])
+        # 标签页体检：某个页面内存泄漏时只换那一页，不必整轮重启浏览器
+        self.tab_monitor = TabMonitor(self)
 
     async def init_all(self):
         self.status["state"] = "INITIALIZING"
@@ -79,23 +109,43 @@ class ArbitrageCommander:
                 self.finance = FinanceService(self.sonkwo.context)
             if not self.steampy_center:
                 self.steampy_center = SteamPyService(self.steampy.context)
+            # 周期性重启后浏览器上下文是新的，财务服务要跟着换
+            self.finance.context = self.sonkwo.context
+            self.steampy_center.context = self.steampy.context
+            await self._open_lanes()
+            await self._check_sessions()
             print("✅ 所有系统组件启动成功，进入待命状态。")
             self.status["state"] = "RUNNING"
+            self.contexts_ready.set()
+            self.tab_monitor.start()
             return True
         except ConnectionError as e:
             # 捕获异常，更新 AGENT_STATE 并在终端报错
             print(f"🛑 初始化失败: {e}")
+            await self._check_sessions()
             # 如果你有 AGENT_STATE，可以更新它
             # AGENT_STATE["current_mission"] = f"错误: {e}"
             return False
     
+    async def _check_sessions(self):
+        """登录快照失效时提醒重新导出 (启动之后再查，缺失的快照已经引导导出过)；同一次失效只提醒一遍"""
+        for platform, status in self.runtime.sessions().items():
+            if not status["expired"]:
+                self._session_alerted.discard(platform)
+            elif platform not in self._session_alerted:
+                self._session_alerted.add(platform)
+                script = "Sonkwo_Scout/save_sonkwo_session.py" if platform == "sonkwo" else "SteamPY_Scout/save_session.py"
+                await self.notifier.send_text(f"🔑 {platform} 登录快照已失效或缺失，请运行 {script} 重新登录导出")
+
     async def update_result(self, log_entry):
         if self.agent_state is not None:
             # 💡 强制打印，确保 Commander 确实把数据发过来了
             print(f"📡 [DATA_SYNC] 正在将 {log_entry['name']} 写入 Web 状态...")
-            self.agent_state["history"].insert(0, log_entry)
-            if len(self.agent_state["history"]) > 100:
-                self.agent_state["history"] = self.agent_state["history"][:100]
+            # 入榜后整体重新赋值（而不是原地 insert），让 Web 状态的版本号跟着变，页面缓存才会失效
+            self.board.update(log_entry)
+            self.agent_state["history"] = self.board.top()
+            # 推给所有打开着的看板，由前端原地插入 / 替换这一行
+            bus.publish("log_entry", log_entry)
         # if self.agent_state:
         #     # 方案 B：去重覆盖逻辑
         #     self.agent_state["history"] = [
@@ -105,19 +155,119 @@ class ArbitrageCommander:
         #     self.agent_state["history"].insert(0, log_entry)
         #     self.agent_state["history"] = self.agent_state["history"][:50]
 
+    @contextlib.asynccontextmanager
+    async def pin_contexts(self, timeout=None):
+        """
+        借用两个平台的浏览器上下文：引擎重启中会先等它就绪，
+        持有期间 close_all 不会关闭浏览器（不必长时间占用巡航锁）。
+        """
+        await asyncio.wait_for(self.contexts_ready.wait(), timeout)
+        self._context_pins += 1
+        self._pins_released.clear()
+        try:
+            yield
+        finally:
+            self._context_pins -= 1
+            if self._context_pins == 0:
+                self._pins_released.set()
+
+    async def _open_lanes(self):
+        """
+        给交互查询各开一个专用标签页：监视器整体浅拷贝一份，只把 page 换成新标签，
+        原有的搜索 / 抓价方法无需改动即可在新页面上运行。开不出来就退回“商品边界抢占”模式。
+        """
+        self.lanes = None
+        if not config.INTERACTIVE_CONFIG["RESERVED_TABS"]:
+            return
+        try:
+            lanes = {}
+            for name, monitor in (("sonkwo", self.sonkwo), ("steampy", self.steampy)):
+                twin = copy.copy(monitor)
+                twin.page = await monitor.context.new_page()
+                lanes[name] = twin
+            self.lanes = lanes
+            print("🛣️ [交互通道] 专用标签页已就绪")
+        except Exception as e:
+            print(f"⚠️ [交互通道] 专用标签页创建失败，改为在商品边界抢占巡航: {e}")
+
+    @contextlib.asynccontextmanager
+    async def interactive_lane(self):
+        """
+        人工查询入口，产出 {"sonkwo": 监视器, "steampy": 监视器}
+        - 有专用标签页：只和其它人工查询排队，巡航照常跑
+        - 没有：登记“有人在等”，巡航在下一个商品边界让出，人工查询拿到巡航锁后在主页面上执行
+        """
+        self._interactive_waiting += 1
+        self._interactive_idle.clear()
+        try:
+            # 借用上下文：查询途中引擎不会被回收重启，专用标签页不会被关掉
+            async with self.interactive_lock, self.pin_contexts(timeout=config.INTERACTIVE_CONFIG["READY_TIMEOUT"]):
+                if self.lanes:
+                    yield self.lanes
+                else:
+                    async with self.lock:
+                        yield {"sonkwo": self.sonkwo, "steampy": self.steampy}
+        finally:
+            self._interactive_waiting -= 1
+            if not self._interactive_waiting:
+                self._interactive_idle.set()
+
+    async def yield_to_interactive(self):
+        """巡航在每个商品开始前调用：没有专用标签页且有人工查询在等时，先让路"""
+        if self.lanes is None and self._interactive_waiting:
+            print("🚦 [交互通道] 人工查询插队，巡航暂停...")
+            await self._interactive_idle.wait()
+
+    def get_interactive_metrics(self):
+        samples = sorted(self.interactive_latency)
+        target = config.INTERACTIVE_CONFIG["P95_TARGET"]
+        pick = lambda q: round(samples[min(len(samples) - 1, int(q * len(samples)))], 2) if samples else None
+        p95 = pick(0.95)
+        return {
+            "mode": "reserved_tabs" if self.lanes else "preempt",
+            "samples": len(samples),
+            "p50": pick(0.5),
+            "p95": p95,
+            "p95_target": target,
+            "meets_target": p95 is None or p95 <= target,
+            "waiting": self._interactive_waiting,
+        }
+
     async def close_all(self):
+        # 先拒绝新的借用，再等在途任务归还
+        self.contexts_ready.clear()
+        if self._context_pins:
+            print(f"⏳ 等待 {self._context_pins} 个后台任务归还浏览器上下文...")
+            await self._pins_released.wait()
+        # 关之前把轮换过的登录 cookie 回写快照，下一轮 (以及并行开出的上下文) 拿到的是最新登录态
+        await self.runtime.refresh_all()
+        # 专用标签页随上下文一起关闭；浏览器进程留给运行时复用，下一次 init_all 不必重新冷启动
+        self.lanes = None
         await self.sonkwo.stop()
         await self.steampy.stop()
 
+    async def shutdown(self):
+        """彻底下线：关上下文之后把缓冲的价格观测刷进库，连浏览器进程和驱动一起回收，最后把飞书摘要发完并关掉连接池"""
+        await self.close_all()
+        # 命令行模式没有 price_store.run() 常驻任务，不足一批的观测只能在这里落盘
+        await self.price_store.aclose()
+        await self.runtime.stop()
+        await self.notifier.aclose()
+
     async def analyze_arbitrage(self, game_name):
-        """专项点杀：适配 Top 5 展示"""
+        """专项点杀：适配 Top 5 展示 (走交互通道，不排在巡航后面)"""
         clean_name = get_search_query(game_name) 
-        sk_results = await self.sonkwo.get_search_results(keyword=clean_name)
-        
-        if not sk_results: return "❌ 杉果未找到该商品"
+        started = time.perf_counter()
+        try:
+            async with self.interactive_lane() as lane:
+                sk_results = await lane["sonkwo"].get_search_results(keyword=clean_name)
+
+                if not sk_results: return "❌ 杉果未找到该商品"
 
-        # 💡 这里会自动调用 process_arbitrage_item，内部已经处理了 Top5 逻辑
-        log_entry = await self.process_arbitrage_item(sk_results[0], is_manual=True)
+                # 💡 这里会自动调用 process_arbitrage_item，内部已经处理了 Top5 逻辑
+                log_entry = await self.process_arbitrage_item(sk_results[0], is_manual=True, lane=lane)
+        finally:
+            self.interactive_latency.append(time.perf_counter() - started)
 
         if not log_entry: return "❌ 变现端未搜到匹配结果"
 
@@ -134,9 +284,10 @@ class ArbitrageCommander:
         )
         return report
 
-    async def process_arbitrage_item(self, sk_item, is_manual=False):
+    async def process_arbitrage_item(self, sk_item, is_manual=False, lane=None):
         """
         全能加工中心：负责清洗、搜索、AI 语义审计（含理由捕获）及利润核算
+        lane: 交互通道 (interactive_lane 产出)；传入时调用方已持有对应的锁，这里直接用通道里的页面
         """
         sk_name = sk_item.get('title', '未知商品')
         # --- 1. [关键补回] 进货价提取与防弹处理 ---
@@ -206,10 +357,11 @@ class ArbitrageCommander:
         # --- 3. 跨平台侦察 (SteamPy 撞库) ---
         py_data = None
         # --- 3. 跨平台侦察 (SteamPy 撞库) ---
-        async with self.lock:
+        steampy = lane["steampy"] if lane else self.steampy
+        async with (contextlib.nullcontext() if lane else self.lock):
             try:
                 # 💡 核心修复：直接获取结果并判定
-                res = await self.steampy.get_game_market_price_with_name(search_keyword)
+                res = await steampy.get_game_market_price_with_name(search_keyword)
                 
                 if not res or len(res) < 3:
                     print(f"⚠️ [COMMANDER] {search_keyword} 变现端无匹配或格式错误")
@@ -259,7 +411,8 @@ class ArbitrageCommander:
         
         # 直接调用底层接口获取原始文本，以便解析理由
         # 直接调用底层接口获取原始文本
-        raw_response = self.ai._call_with_retry(audit_prompt)
+        # 同步 SDK 调用放进线程池，审计等待期间事件循环还能服务交互查询
+        raw_response = await asyncio.to_thread(self.ai._call_with_retry, audit_prompt)
         
         # 1. 设定初始值
         audit_result = "ERROR"
@@ -306,8 +459,10 @@ class ArbitrageCommander:
             # 而把那一大串理由留在 log_entry['reason'] 供鼠标悬停查看
             display_rating = "🔍 待核实" if "识别弃权" in str(rating) else "⚠️ 审计跳过"
         # 构造完整 log_entry，确保包含 'profit' 等所有字段防止前端 KeyError
+        now = datetime.datetime.now()
         log_entry = {
-            "time": datetime.datetime.now().strftime("%H:%M:%S"),
+            "time": now.strftime("%H:%M:%S"),
+            "ts": now.timestamp(),  # 跨天排序用
             "name": f"🛰️(点杀) {sk_name}" if is_manual else sk_name,
             "rating": display_rating,
             "sk_price": f"¥{sk_price}",
@@ -319,6 +474,7 @@ class ArbitrageCommander:
             "roi": current_roi
         }
 
+        self.price_store.record(log_entry, sonkwo_price=sk_price, steampy_top=top5_list or [py_price])
         await self.update_result(log_entry)
         return log_entry
 
@@ -349,14 +505,14 @@ class ArbitrageCommander:
                 if profit_val >= self.min_profit and "✅" in log_entry['status']:
                     print(f"🔥 发现利润点: {log_entry['name']} | 预计赚: {log_entry['profit']}")
                     
-                    # 💡 [异步通知]：这里的 URL 现在绝对是详情页链接了
-                    asyncio.create_task(self.notifier.send_arbitrage_report([{
+                    # 💡 [异步通知]：只进摘要队列，窗口结束后合并推送；URL 现在绝对是详情页链接了
+                    await self.notifier.send_arbitrage_report([{
                         "title": log_entry['name'], 
                         "sk_price": log_entry['sk_price'], 
                         "py_price": log_entry['py_price'], 
                         "profit": log_entry['profit'], 
                         "url": log_entry['url'] # 这里引用的是加工后的 log_entry 里的 url
-                    }]))
+                    }])
                 
                 # 巡航频率控制
                 await asyncio.sleep(1.0) 
@@ -378,7 +534,7 @@ async def start_cruise_with_watchdog(commander, target_keyword):
             
             if target_keyword: 
                 print("🎯 定点打击完成，系统安全下线。")
-                await commander.close_all()
+                await commander.shutdown()
                 break 
                 
             print("💤 巡航结束，等待 30 分钟后进行下一轮...")
@@ -421,7 +577,7 @@ async def main():
         # 给 Watchdog 一点初始化浏览器的时间
         await asyncio.sleep(10) 
         print("\n" + "🎮 " * 10)
-        print("【系统就绪】输入 'sync' 进入财务审计交互模式")
+        print("【系统就绪】输入 'sync' 进入财务审计交互模式，'prewarm' 预热翻译缓存")
         print("🎮 " * 10 + "\n")
         
         while True:
@@ -440,6 +596,13 @@ async def main():
                     await commander.steampy_center.enter_interactive_mode()
                 else:
                     print("❌ SteamPy 服务尚未就绪（Watchdog 还在初始化...）")
+            elif cmd == "prewarm":  # 后台批量预热翻译缓存，不阻塞巡航
+                from game_rating.keyword_cache import collect_known_names
+                names = collect_known_names()
+                print(f"🔥 已在后台启动翻译预热，共 {len(names)} 个游戏名...")
+                asyncio.create_task(commander.rating_center.matcher.prewarm_keywords(
+                    names, concurrency=config.SCOUT_CONFIG["PREWARM_CONCURRENCY"]
+                ))
 
     # --- 🚀 只运行巡航和监听 ---
     await asyncio.gather(
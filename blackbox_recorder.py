@@ -0,0 +1,103 @@
+import asyncio
+import collections
+import datetime
+import gzip
+import os
+import shutil
+
+import config
+
+
+class Frame:
+    """黑匣子里的一帧：压缩截图 + gzip 源码，全部在内存里"""
+    __slots__ = ("ts", "step", "url", "image", "html_gz")
+
+    def __init__(self, ts, step, url, image, html_gz):
+        self.ts = ts
+        self.step = step
+        self.url = url
+        self.image = image
+        self.html_gz = html_gz
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class BlackboxRecorder:
+    """
+    [黑匣子] 环形缓冲最近 N 帧 (JPEG 截图 + gzip HTML)
+    - 平时只进内存，不碰磁盘
+    - 出故障或手动要求时 flush：整段缓冲写进 blackbox/<name>/<时间>_<原因>/，写盘在线程池里完成
+    - 目录总大小超过上限时，从最早的一次 flush 开始删除
+    """
+    def __init__(self, name, capacity=None, root=None):
+        cfg = config.BLACKBOX_CONFIG
+        self.name = name
+        self.dir = os.path.join(root or cfg["ROOT"], name)
+        self.frames = collections.deque(maxlen=capacity or cfg["CAPACITY"])
+
+    async def capture(self, page, step, html=None):
+        """抓一帧进缓冲区，失败只打日志，绝不影响主流程"""
+        cfg = config.BLACKBOX_CONFIG
+        with_html = cfg["CAPTURE_HTML"] if html is None else html
+        try:
+            image = await page.screenshot(type="jpeg", quality=cfg["JPEG_QUALITY"])
+            html_gz = None
+            if with_html:
+                content = await page.content()
+                html_gz = await asyncio.to_thread(gzip.compress, content.encode("utf-8"), 6)
+            self.frames.append(Frame(datetime.datetime.now(), step, page.url, image, html_gz))
+        except Exception as e:
+            print(f"🚨 [黑匣子] {self.name} 记录 {step} 失败: {e}")
+
+    async def flush(self, reason="manual"):
+        """把当前缓冲整段落盘，返回目录路径；缓冲为空时返回 None"""
+        if not self.frames:
+            return None
+        frames = list(self.frames)
+        self.frames.clear()
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        target = os.path.join(self.dir, f"{stamp}_{reason}")
+        try:
+            await asyncio.to_thread(self._write, target, frames)
+            print(f"📼 [黑匣子] {self.name} 已落盘 {len(frames)} 帧 -> {target}")
+            return target
+        except Exception as e:
+            print(f"🚨 [黑匣子] {self.name} 落盘失败: {e}")
+            return None
+
+    def _write(self, target, frames):
+        os.makedirs(target, exist_ok=True)
+        index = []
+        for i, f in enumerate(frames):
+            prefix = os.path.join(target, f"{i:02d}_{f.step}")
+            with open(f"{prefix}.jpg", "wb") as fp:
+                fp.write(f.image)
+            if f.html_gz:
+                with open(f"{prefix}.html.gz", "wb") as fp:
+                    fp.write(f.html_gz)
+            index.append(f"{i:02d} {f.ts.strftime('%H:%M:%S')} {f.step} {f.url}")
+        with open(os.path.join(target, "index.txt"), "w", encoding="utf-8") as fp:
+            fp.write("\n".join(index) + "\n")
+        self._enforce_retention()
+
+    def _enforce_retention(self):
+        """按目录名（即时间）从旧到新删除，直到总大小回到上限以内"""
+        limit = config.BLACKBOX_CONFIG["MAX_BYTES"]
+        dumps = sorted(d for d in os.listdir(self.dir) if os.path.isdir(os.path.join(self.dir, d)))
+        sizes = {d: _dir_size(os.path.join(self.dir, d)) for d in dumps}
+        total = sum(sizes.values())
+        # 最新的一次总是保留
+        for d in dumps[:-1]:
+            if total <= limit:
+                break
+            shutil.rmtree(os.path.join(self.dir, d), ignore_errors=True)
+            total -= sizes[d]
@@ -0,0 +1,260 @@
+import asyncio
+import json
+import os
+import re
+import time
+
+from playwright.async_api import async_playwright
+
+import config
+
+
+def state_path(platform):
+    path = config.BROWSER_CONFIG["PLATFORMS"][platform]["STATE_PATH"]
+    return path if os.path.isabs(path) else os.path.join(config.PROJECT_ROOT, path)
+
+
+async def export_state(context, platform):
+    """把上下文当前的登录态写成 storage_state 快照 (tmp + os.replace，读者永远看不到半个文件)"""
+    save_state(platform, await context.storage_state())
+    return state_path(platform)
+
+
+def save_state(platform, state):
+    path = state_path(platform)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def load_state(platform):
+    path = state_path(platform)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ [浏览器运行时] {platform} 登录快照损坏: {e}")
+        return None
+
+
+def auth_fingerprint(platform, state):
+    """登录相关 cookie / localStorage 的指纹：cookie 轮换后指纹变化，据此决定是否回写快照"""
+    cfg = config.BROWSER_CONFIG["PLATFORMS"][platform]
+    pattern = re.compile(cfg["AUTH_COOKIE_PATTERN"], re.IGNORECASE)
+    cookies = sorted((c["domain"], c["name"], c["value"]) for c in (state or {}).get("cookies", [])
+                     if cfg["DOMAIN"] in c.get("domain", "") and pattern.search(c["name"]))
+    storage = sorted((o["origin"], item["name"], item["value"]) for o in (state or {}).get("origins", [])
+                     if cfg["DOMAIN"] in o.get("origin", "")
+                     for item in o.get("localStorage", []) if item["name"] in cfg["AUTH_STORAGE_KEYS"])
+    return cookies, storage
+
+
+def session_status(platform, state=None, now=None):
+    """
+    只看快照判断登录态：没有登录凭据、或者所有带过期时间的登录 cookie 都已过期，即视为失效。
+    会话 cookie (expires = -1) 看不出寿命，这种情况只能靠页面探针 (LOGIN_PROBE) 兜底。
+    """
+    now = now or time.time()
+    state = state if state is not None else load_state(platform)
+    if state is None:
+        return {"exists": False, "expired": True, "expires_at": None}
+    cfg = config.BROWSER_CONFIG["PLATFORMS"][platform]
+    cookies, storage = auth_fingerprint(platform, state)
+    pattern = re.compile(cfg["AUTH_COOKIE_PATTERN"], re.IGNORECASE)
+    expiries = [c["expires"] for c in state.get("cookies", [])
+                if c.get("expires", -1) > 0 and cfg["DOMAIN"] in c.get("domain", "") and pattern.search(c["name"])]
+    expires_at = max(expiries) if expiries else None
+    expired = (not cookies and not storage) or (expires_at is not None and expires_at <= now and not storage)
+    return {"exists": True, "expired": expired, "expires_at": expires_at,
+            "auth_cookies": len(cookies), "auth_storage": len(storage)}
+
+
+class BrowserRuntime:
+    """
+    [浏览器运行时] 全进程共用一个 Playwright 驱动 + 一个 Chromium
+    - 每个平台 (sonkwo / steampy) 拿到的是独立的 BrowserContext，cookie / localStorage 互不串号
+    - 登录态来自各平台的 storage_state 快照 (JSON)；同一平台可以同时开多个上下文
+    - 旧版的登录态在 Chromium 用户目录里：快照不存在时先用它“引导导出”一次，之后就不再碰用户目录
+    - 引擎周期性重启只关上下文，驱动和浏览器进程常驻；浏览器崩了下次 start() 会自动重新拉起
+    - 登录 cookie 轮换后回写快照 (refresh_snapshot)；快照过期或页面探针失败时标记为失效
+    """
+    def __init__(self, headless=None):
+        cfg = config.BROWSER_CONFIG
+        self.headless = cfg["HEADLESS"] if headless is None else headless
+        self.playwright = None
+        self.browser = None
+        self.contexts = {}      # platform -> [BrowserContext, ...]
+        self._lock = asyncio.Lock()
+        self._state_lock = asyncio.Lock()   # 同一平台并发开上下文时只引导导出一次
+        self.stats = {"launches": 0, "contexts_opened": 0, "bootstraps": 0, "refreshes": 0}
+        self.expired = {}       # platform -> 页面探针发现登录失效的时间
+        self._fingerprints = {} # platform -> 最近一次写盘快照的登录指纹
+
+    @property
+    def running(self):
+        return self.browser is not None and self.browser.is_connected()
+
+    async def start(self):
+        """幂等：已在运行直接返回；浏览器掉线则重新拉起"""
+        async with self._lock:
+            if self.running:
+                return self.browser
+            if self.playwright is None:
+                self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(
+                headless=self.headless, args=config.BROWSER_CONFIG["ARGS"])
+            self.contexts = {}
+            self.stats["launches"] += 1
+            print("🧭 [浏览器运行时] Chromium 已启动 (全平台共用)")
+            return self.browser
+
+    # ---------- 登录态快照 ----------
+
+    async def bootstrap(self, platform):
+        """
+        从旧版 Chromium 用户目录导出 storage_state 快照。
+        storage_state 只带得出本次会话访问过的源的 localStorage，所以先打开一次平台首页再导出。
+        """
+        cfg = config.BROWSER_CONFIG["PLATFORMS"][platform]
+        user_data_dir = os.path.join(config.PROJECT_ROOT, cfg["USER_DATA_DIR"])
+        path = state_path(platform)
+        if not os.path.isdir(user_data_dir):
+            print(f"⚠️ [浏览器运行时] {platform} 没有快照也没有旧版用户目录，将以未登录状态启动")
+            return None
+        if self.playwright is None:
+            await self.start()
+        print(f"📦 [浏览器运行时] 正在从 {cfg['USER_DATA_DIR']} 导出 {platform} 登录快照...")
+        context = await self.playwright.chromium.launch_persistent_context(
+            user_data_dir, headless=self.headless, args=config.BROWSER_CONFIG["ARGS"])
+        try:
+            page = context.pages[0] if context.pages else await context.new_page()
+            await page.goto(cfg["HOME_URL"], wait_until="domcontentloaded", timeout=60000)
+            await export_state(context, platform)
+        finally:
+            await context.close()
+        self.stats["bootstraps"] += 1
+        return path
+
+    # ---------- 上下文 ----------
+
+    async def new_context(self, platform):
+        """为平台开一个带登录态的新上下文；同一平台可并发持有多个"""
+        await self.start()
+        path = state_path(platform)
+        async with self._state_lock:
+            if not os.path.exists(path):
+                path = await self.bootstrap(platform)
+        context = await self.browser.new_context(storage_state=path)
+        self.contexts.setdefault(platform, []).append(context)
+        context.on("close", lambda _: self._forget(platform, context))
+        self.stats["contexts_opened"] += 1
+        return context
+
+    async def new_contexts(self, platform, n):
+        """上下文工厂：用同一份快照克隆出 n 个互相独立、都已登录的上下文 (横向扩展多个侦察页)"""
+        return list(await asyncio.gather(*[self.new_context(platform) for _ in range(n)]))
+
+    # ---------- 快照维护 ----------
+
+    async def refresh_snapshot(self, platform, context=None):
+        """
+        cookie 轮换后回写快照：取该平台一个在用的上下文，登录指纹和盘上的不同才写。
+        新状态里已经没有登录凭据 (被踢下线) 时不覆盖，免得把好快照换成未登录的。
+        """
+        context = context or next(iter(self.contexts.get(platform, [])), None)
+        if context is None:
+            return False
+        try:
+            state = await context.storage_state()
+        except Exception as e:
+            print(f"⚠️ [浏览器运行时] 读取 {platform} 登录态失败: {e}")
+            return False
+        fingerprint = auth_fingerprint(platform, state)
+        if not any(fingerprint):
+            return False
+        if platform not in self._fingerprints:
+            self._fingerprints[platform] = auth_fingerprint(platform, load_state(platform))
+        if fingerprint == self._fingerprints[platform]:
+            return False
+        save_state(platform, state)
+        self._fingerprints[platform] = fingerprint
+        self.mark_alive(platform)
+        self.stats["refreshes"] += 1
+        print(f"🔄 [浏览器运行时] {platform} 登录 cookie 已轮换，快照已更新")
+        return True
+
+    async def refresh_all(self):
+        for platform in list(self.contexts):
+            await self.refresh_snapshot(platform)
+
+    async def probe_login(self, platform, page):
+        """页面探针：平台首页上找登录后才有的元素，找不到就记为失效"""
+        selector = config.BROWSER_CONFIG["PLATFORMS"][platform]["LOGIN_PROBE"]
+        try:
+            ok = await page.query_selector(selector) is not None
+        except Exception:
+            return None
+        if ok:
+            self.mark_alive(platform)
+        else:
+            self.mark_expired(platform)
+        return ok
+
+    def mark_alive(self, platform):
+        self.expired.pop(platform, None)
+
+    def mark_expired(self, platform):
+        self.expired.setdefault(platform, time.time())
+        print(f"🚨 [浏览器运行时] {platform} 登录已失效，请重新运行对应的 save_session 脚本导出快照")
+
+    def sessions(self):
+        """各平台登录态：快照自身的过期判断 + 页面探针的结论"""
+        result = {}
+        for platform in config.BROWSER_CONFIG["PLATFORMS"]:
+            status = session_status(platform)
+            status["probe_failed_at"] = self.expired.get(platform)
+            status["expired"] = status["expired"] or platform in self.expired
+            result[platform] = status
+        return result
+
+    def _forget(self, platform, context):
+        bucket = self.contexts.get(platform, [])
+        if context in bucket:
+            bucket.remove(context)
+
+    async def close_contexts(self, platform=None):
+        """关闭某个平台 (缺省为全部) 的上下文，浏览器进程保留"""
+        platforms = [platform] if platform else list(self.contexts)
+        for name in platforms:
+            for context in list(self.contexts.get(name, [])):
+                try:
+                    await context.close()
+                except Exception:
+                    pass
+                self._forget(name, context)
+
+    async def stop(self):
+        """彻底关停：上下文、浏览器、驱动一起回收"""
+        await self.close_contexts()
+        if self.browser is not None:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+            self.browser = None
+        if self.playwright is not None:
+            await self.playwright.stop()
+            self.playwright = None
+        print("🔒 [浏览器运行时] 已关停")
+
+    def get_metrics(self):
+        return {
+            **self.stats,
+            "running": self.running,
+            "contexts": {name: len(bucket) for name, bucket in self.contexts.items()},
+            "sessions": self.sessions(),
+        }
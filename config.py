@@ -19,15 +19,171 @@ SCOUT_CONFIG = {
     "SLEEP_INTERVAL": 1.0,       # 巡航项之间的间隔 (秒)
     "MAX_HISTORY": 100,          # Web 历史记录保存上限
     "RETRY_COUNT": 3,            # AI 接口或网络请求重试次数
+    "PREWARM_CONCURRENCY": 4,    # 翻译缓存预热时的 AI 并发上限
+}
+
+# --- SteamSpy 库同步 ---
+SPY_SYNC_CONFIG = {
+    "CONCURRENCY": 4,            # 同时在途的分页请求数
+    "MIN_INTERVAL": 0.5,         # 两次请求发起之间的最小间隔 (秒)，礼貌限流
+}
+
+# --- 评分身份缓存 (秒) ---
+RATING_CACHE_CONFIG = {
+    "SUCCESS_TTL": 30 * 86400,   # 已锁定身份：30 天 (库重新同步时会提前失效)
+    "UNCERTAIN_TTL": 86400,      # 识别弃权：1 天后重新审计
+    "MISSING_TTL": 6 * 3600,     # 库里没搜到：6 小时后重试
+}
+
+# --- 候选重排 (BM25) ---
+RERANK_CONFIG = {
+    "ENABLED": True,             # 关闭后退回旧版：30 个候选全量送审
+    "TOP_K": 5,                  # 送给 AI 审计的候选数上限 (3~5 为宜)
+    "SKIP_MARGIN": 3.0,          # 第一名领先第二名超过该分差且关键词全覆盖时，直接采信、跳过 AI
+    "DIGIT_BONUS": 1.5,          # 数字完全一致的加分
+    "EDITION_PENALTY": 4.0,      # DLC / 原声 / 捆绑包等非本体的扣分
+    "PRIOR_WEIGHT": 0.5,         # 评论数先验权重 (乘 log10(评论数))
+}
+
+# --- 财务对账 ---
+FINANCE_CONFIG = {
+    "STEAMPY_FEE_RATE": 0.03,    # SteamPY 成交手续费 (与巡航利润公式的 0.97 保持一致)
+    "FUZZY_CUTOFF": 0.85,        # 采购名与货架名模糊匹配的最低相似度
+}
+
+# --- 黑匣子 (故障现场截图) ---
+BLACKBOX_CONFIG = {
+    "ROOT": "blackbox",          # 落盘根目录
+    "CAPACITY": 10,              # 每个模块在内存里保留的最近帧数
+    "JPEG_QUALITY": 60,          # 截图压缩质量
+    "CAPTURE_HTML": True,        # 是否同时保存 gzip 压缩的页面源码
+    "MAX_BYTES": 50 * 1024 * 1024,  # 每个模块落盘目录的总大小上限
 }
 
 # --- 飞书通知 ---
 NOTIFIER_CONFIG = {
     "WEBHOOK_URL": "https://open.feishu.cn/open-apis/bot/v2/hook/70423ec9-8744-40c2-a3af-c94bbbd0990a",
     "REPORT_TITLE": "🛰️ Arbitrage Sentinel 实时战报",
+    "DIGEST_WINDOW": 30,         # 利润机会合并窗口 (秒)：窗口内发现的机会合成一张摘要
+    "RATE_PER_SEC": 5,           # 飞书自定义机器人限流：每秒 5 条
+    "RATE_PER_MIN": 100,         # 每分钟 100 条
+    "MAX_RETRIES": 4,            # 网络错误 / 5xx / 限流码的最大重试次数
+    "BACKOFF_BASE": 1.0,         # 退避基数 (秒)，第 n 次重试等待 BASE × 2^(n-1)
+    "DEDUP_TTL": 6 * 3600,       # 同一 SKU 在该时长内不重复提醒……
+    "PROFIT_DELTA_PCT": 0.1,     # ……除非利润变化超过 10%
+    "PROFIT_DELTA_ABS": 2.0,     # 且至少 ¥2
 }
 
 # --- 路径配置 ---
 PATH_CONFIG = {
     "DB_NAME": "steamspy_all.json",
-}
\ No newline at end of file
+    "APP_LIST": "steam_app_list.json",   # 精确名快速通道的数据源
+}
+# --- 实时推送 (SSE) ---
+EVENT_BUS_CONFIG = {
+    "QUEUE_SIZE": 256,           # 每个浏览器连接的积压上限，塞满即判定为慢客户端并断开
+    "HEARTBEAT": 15,             # 空闲时心跳间隔 (秒)，防止反向代理掐断长连接
+    "METRICS_INTERVAL": 10,      # 指标快照推送间隔 (秒)，没人订阅时不推
+}
+
+# --- 价格时序库 ---
+PRICE_STORE_CONFIG = {
+    "DB_PATH": "data/prices.db",  # 每一次比价观测都记在这里
+    "BATCH_SIZE": 50,            # 缓冲满这么多条立即批量写入
+    "FLUSH_INTERVAL": 5,         # 不满一批时的定时写入间隔 (秒)
+    "HISTORY_VIEW": 100,         # arbitrage_history.json 视图保留的条数
+}
+
+# --- 机会榜 ---
+OPPORTUNITY_CONFIG = {
+    "CAPACITY": 100,             # 看板 / 历史视图展示的条数
+    "TTL": 12 * 3600,            # 超过该时长没再被扫到的条目自动下榜 (秒)
+    "MAX_ENTRIES": 2000,         # 榜单内部最多跟踪的游戏数，超出先淘汰最早过期的
+}
+
+# --- 巡航排程 (按产出分配翻页预算) ---
+CRAWL_CONFIG = {
+    "STATE_PATH": "data/crawl_planner.json",
+    "PAGE_BUDGET": 60,           # 每轮翻页总数 (与旧版 2 模式 × 10 分类 × 3 页持平)
+    "MAX_PAGES": 6,              # 每个分类可探索的最深页码，候选分段多于预算才有得挑
+    "UCB_C": 0.5,                # 探索系数：越大越愿意回访沉寂分段
+    "HIT_WEIGHT": 5.0,           # 盈利命中相对“新 SKU”的收益权重
+    "DECAY": 0.95,               # 每轮对历史统计的折扣
+    "NEW_SKU_WINDOW": 24 * 3600, # 该时长内重复出现的 SKU 不算新
+}
+
+# --- 单点查询 (/check) 合并与缓存 ---
+CHECK_CACHE_CONFIG = {
+    "TTL": 300,                  # 查到结果的报告缓存时长 (秒)
+    "NEGATIVE_TTL": 60,          # “未找到 / 未匹配”的报告缓存时长，短一点以便上架后尽快可见
+    "MAX_ENTRIES": 256,          # 缓存条数上限 (LRU)
+}
+
+# --- 交互通道 (人工点杀优先) ---
+INTERACTIVE_CONFIG = {
+    "RESERVED_TABS": True,       # 为人工查询在每个平台预留一个专用标签页；关闭则在商品边界抢占巡航
+    "P95_TARGET": 20.0,          # 人工查询 p95 延迟目标 (秒)，看板上对照展示
+    "WINDOW": 200,               # 统计最近多少次查询
+    "READY_TIMEOUT": 120,        # 引擎重启中时，最多等多久浏览器就绪 (秒)
+}
+
+# --- 浏览器运行时 (单驱动 + 单浏览器，平台间用上下文隔离) ---
+BROWSER_CONFIG = {
+    "HEADLESS": True,
+    "ARGS": ["--disable-blink-features=AutomationControlled", "--no-sandbox"],
+    "PLATFORMS": {
+        # STATE_PATH: storage_state 登录快照；USER_DATA_DIR: 旧版持久化目录，仅在快照缺失时用来引导导出
+        # DOMAIN / AUTH_COOKIE_PATTERN / AUTH_STORAGE_KEYS: 判断快照里有没有登录凭据、是否过期、cookie 是否轮换
+        # LOGIN_PROBE: 登录后才会出现的页面元素，快照看不出寿命时靠它兜底
+        "sonkwo": {
+            "STATE_PATH": "data/sessions/sonkwo_state.json",
+            "USER_DATA_DIR": "Sonkwo_Scout/sonkwo_data",
+            "HOME_URL": "https://www.sonkwo.cn/",
+            "DOMAIN": "sonkwo",
+            "AUTH_COOKIE_PATTERN": r"session|token|remember|user",
+            "AUTH_STORAGE_KEYS": [],
+            "LOGIN_PROBE": ".avatar, .user-avatar, .new-avatar-block",
+        },
+        "steampy": {
+            "STATE_PATH": "data/sessions/steampy_state.json",
+            "USER_DATA_DIR": "SteamPY_Scout/steampy_data",
+            "HOME_URL": "https://steampy.com/home",
+            "DOMAIN": "steampy",
+            "AUTH_COOKIE_PATTERN": r"session|token",
+            "AUTH_STORAGE_KEYS": ["accessToken"],
+            "LOGIN_PROBE": "li:has-text('退出登录'), .ivu-menu-submenu:has-text('卖家中心')",
+        },
+    },
+}
+
+# --- 标签页体检 (CDP 内存采样 + 单页回收) ---
+TAB_MONITOR_CONFIG = {
+    "INTERVAL": 60,              # 采样间隔 (秒)
+    "HEAP_MB": 400,              # JS 堆占用上限 (MB)
+    "NODES": 100000,             # DOM 节点数上限
+    "LISTENERS": 20000,          # 事件监听器数上限
+    "BREACHES": 2,               # 连续超限这么多次才换页，避免瞬时峰值误判
+    "TREND_PATH": "data/tab_metrics.jsonl",  # 每次采样追加一行，用于看内存趋势
+    "TREND_KEEP": 360,           # 内存里每个标签页保留的采样点 (算增长斜率用)
+    "SKIP_ROUND_RESTART": True,  # 标签页都健康时跳过每轮的整体重启；关闭则恢复旧行为
+    "FULL_RESTART_EVERY": 24,    # 兜底：连续跳过这么多轮后仍做一次整体重启 (0 = 从不)
+}
+
+# --- 后台任务队列 ---
+JOB_CONFIG = {
+    "PATH": "data/jobs.json",    # 排队中的任务 (含参数) 与最近完成的任务
+    "KEEP_FINISHED": 200,        # 已结束任务保留条数
+    "WORKERS": {                 # 每种任务的并发上限
+        "steampy_post": 1,       # 上架共用 SteamPy 主页面，只能一个一个来
+        "sync_all": 1,
+        "feishu_query": 2,       # 实际执行仍会在交互通道里排队
+    },
+    "PRIORITY": {                # 数字越小越先执行
+        "feishu_query": 0,
+        "steampy_post": 10,
+        "sync_all": 20,
+    },
+    "RETRY_ON_RESTART": {        # 执行中被重启打断后能否重放；缺省可以
+        "steampy_post": False,   # 上架不幂等：重放可能把同一个 CDKEY 挂两次
+    },
+}
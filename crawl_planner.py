@@ -0,0 +1,114 @@
+import json
+import math
+import os
+import time
+
+import config
+
+
+def segment_key(mode, keyword, page):
+    return f"{mode}|{keyword}|{page}"
+
+
+class CrawlPlanner:
+    """
+    [巡航排程] 把每轮固定的“分类 × 页码”全扫，换成按历史产出分配的页面预算
+    - 臂 = (模式, 关键词, 页码)；每次拉取的收益 = 新 SKU 比例 + HIT_WEIGHT × 盈利命中比例
+    - UCB1 选臂：高产的分段更常回访，沉寂的分段偶尔探一下，翻页预算总量不变
+    - 每轮对历史统计打个折 (DECAY)，档期变化后能重新发现曾经沉寂的分段
+    - 见过的 SKU 记一个最后出现时间，NEW_SKU_WINDOW 内重复出现的不算“新”
+    - 统计持久化到 JSON，重启后沿用
+    """
+    def __init__(self, path=None):
+        cfg = config.CRAWL_CONFIG
+        self.path = path or cfg["STATE_PATH"]
+        self.segments = {}   # key -> {"pulls", "reward", "items", "new_skus", "hits", "empty", "last_pulled"}
+        self.seen = {}       # sku -> 最后一次见到的时间戳
+        self.rounds = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.segments = data.get("segments", {})
+            self.seen = data.get("seen", {})
+            self.rounds = data.get("rounds", 0)
+        except Exception as e:
+            print(f"⚠️ [巡航排程] 统计文件损坏，从零开始学习: {e}")
+
+    def save(self):
+        # 过期很久的 SKU 没必要一直记着
+        horizon = time.time() - 7 * config.CRAWL_CONFIG["NEW_SKU_WINDOW"]
+        self.seen = {sku: ts for sku, ts in self.seen.items() if ts >= horizon}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"segments": self.segments, "seen": self.seen, "rounds": self.rounds}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    # ---------- 选臂 ----------
+
+    def _ucb(self, stats, total_pulls):
+        if not stats or stats["pulls"] < 1e-6:
+            return math.inf
+        mean = stats["reward"] / stats["pulls"]
+        return mean + config.CRAWL_CONFIG["UCB_C"] * math.sqrt(math.log(max(2, total_pulls)) / stats["pulls"])
+
+    def plan(self, modes, keywords, budget=None, max_pages=None):
+        """
+        返回本轮要抓的 [(mode, keyword, page), ...]，按 UCB 分数从高到低
+        没拉过的分段分数为无穷大，优先探索；同分时浅页优先
+        """
+        cfg = config.CRAWL_CONFIG
+        budget = budget or cfg["PAGE_BUDGET"]
+        max_pages = max_pages or cfg["MAX_PAGES"]
+        arms = [(m, k, p) for m in modes for k in keywords for p in range(1, max_pages + 1)]
+        # 折扣旧观测：促销档期会变，很久以前的高产不该一直占着预算
+        for s in self.segments.values():
+            s["pulls"] *= cfg["DECAY"]
+            s["reward"] *= cfg["DECAY"]
+        total = sum(s["pulls"] for s in self.segments.values())
+        scored = sorted(arms, key=lambda a: (-self._ucb(self.segments.get(segment_key(*a)), total), a[2]))
+        self.rounds += 1
+        return scored[:budget]
+
+    # ---------- 反馈 ----------
+
+    def is_new(self, sku, now=None):
+        now = now or time.time()
+        last = self.seen.get(sku)
+        self.seen[sku] = now
+        return last is None or now - last > config.CRAWL_CONFIG["NEW_SKU_WINDOW"]
+
+    def observe(self, mode, keyword, page, items, new_skus, hits):
+        """登记一次拉取结果；空页收益为 0，并累计 empty 次数"""
+        stats = self.segments.setdefault(segment_key(mode, keyword, page), {
+            "pulls": 0, "reward": 0.0, "items": 0, "new_skus": 0, "hits": 0, "empty": 0, "last_pulled": 0,
+        })
+        reward = 0.0
+        if items:
+            reward = new_skus / items + config.CRAWL_CONFIG["HIT_WEIGHT"] * hits / items
+        else:
+            stats["empty"] += 1
+        stats["pulls"] += 1
+        stats["reward"] += reward
+        stats["items"] += items
+        stats["new_skus"] += new_skus
+        stats["hits"] += hits
+        stats["last_pulled"] = time.time()
+        return reward
+
+    def get_metrics(self, top=10):
+        """产出最高的若干分段，供 /api/metrics 展示"""
+        ranked = sorted(
+            ((k, s["reward"] / s["pulls"], s) for k, s in self.segments.items() if s["pulls"]),
+            key=lambda x: -x[1])
+        return {
+            "rounds": self.rounds,
+            "segments": len(self.segments),
+            "tracked_skus": len(self.seen),
+            "top": [{"segment": k, "mean_reward": round(m, 3), "pulls": s["pulls"], "hits": s["hits"]} for k, m, s in ranked[:top]],
+        }
@@ -0,0 +1,100 @@
+import asyncio
+import itertools
+import json
+import time
+
+import config
+
+
+class Subscriber:
+    """一个 SSE 连接：自带有界队列，满了就判定为慢客户端并踢掉"""
+    __slots__ = ("id", "queue", "dropped", "connected_at")
+
+    def __init__(self, sid, maxsize):
+        self.id = sid
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = False
+        self.connected_at = time.time()
+
+
+class EventBus:
+    """
+    [事件总线] 进程内一对多广播
+    - publish 只做 put_nowait，从不等待，巡航主循环不会被任何一个浏览器拖慢
+    - 每个订阅者一个有界队列；队列塞满说明对方读得太慢，直接断开，让浏览器自己重连后整表刷新
+    - 只在事件循环线程里调用（线程池里的代码请用 publish_threadsafe）
+    """
+    def __init__(self, queue_size=None):
+        self.queue_size = queue_size or config.EVENT_BUS_CONFIG["QUEUE_SIZE"]
+        self.subscribers = {}
+        self._ids = itertools.count(1)
+        self._seq = itertools.count(1)
+        self._loop = None
+        self.stats = {"published": 0, "delivered": 0, "dropped_clients": 0}
+
+    def subscribe(self):
+        self._loop = asyncio.get_running_loop()
+        sub = Subscriber(next(self._ids), self.queue_size)
+        self.subscribers[sub.id] = sub
+        return sub
+
+    def unsubscribe(self, sub):
+        self.subscribers.pop(sub.id, None)
+
+    def publish(self, event, data):
+        if not self.subscribers:
+            return
+        message = (next(self._seq), event, data)
+        self.stats["published"] += 1
+        for sub in list(self.subscribers.values()):
+            try:
+                sub.queue.put_nowait(message)
+                self.stats["delivered"] += 1
+            except asyncio.QueueFull:
+                self._drop(sub)
+
+    def publish_threadsafe(self, event, data):
+        if self._loop is not None and self.subscribers:
+            self._loop.call_soon_threadsafe(self.publish, event, data)
+
+    def _drop(self, sub):
+        """清空积压并塞一个结束标记，让该连接的生成器尽快退出"""
+        sub.dropped = True
+        self.unsubscribe(sub)
+        self.stats["dropped_clients"] += 1
+        while not sub.queue.empty():
+            sub.queue.get_nowait()
+        sub.queue.put_nowait(None)
+        print(f"🐌 [事件总线] 客户端 #{sub.id} 读取过慢，已断开")
+
+    def get_metrics(self):
+        return {**self.stats, "clients": len(self.subscribers)}
+
+
+def format_sse(seq, event, data):
+    """编码成一条 text/event-stream 消息"""
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    return f"id: {seq}\nevent: {event}\ndata: {payload}\n\n"
+
+
+async def stream(sub, is_disconnected):
+    """
+    单个连接的输出生成器：有事件就发，空闲时定期发心跳注释，防止代理掐断长连接
+    is_disconnected: 无参协程函数 (通常是 request.is_disconnected)
+    """
+    heartbeat = config.EVENT_BUS_CONFIG["HEARTBEAT"]
+    while True:
+        try:
+            message = await asyncio.wait_for(sub.queue.get(), timeout=heartbeat)
+        except asyncio.TimeoutError:
+            if await is_disconnected():
+                return
+            yield ": ping\n\n"
+            continue
+        if message is None:
+            return
+        yield format_sse(*message)
+
+
+# 全进程共用一条总线
+bus = EventBus()
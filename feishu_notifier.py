@@ -1,89 +1,268 @@
-import requests
+import asyncio
+import collections
 import json
+import time
+
 import httpx # 确保文件顶部有这个导入
 
+import config
+from history_index import parse_money
+from price_store import sku_of
+
+# 飞书自定义机器人的限流错误码 (HTTP 200 + body.code)
+RATE_LIMIT_CODES = (9499, 11232)
+
+
 class FeishuNotifier:
+    """
+    [飞书通知] 一个长连接池客户端 + 出站限流 + 失败重试
+    - send_card / send_text：立即发送 (仍受限流与重试约束)
+    - send_arbitrage_report：只进队列，DIGEST_WINDOW 内发现的机会合并成一张摘要卡片；
+      同一 SKU 利润没有明显变化时不重复提醒
+    webhook_url 可以指向本地替身服务，便于联调 (见文件末尾的 __main__)
+    """
     def __init__(self, webhook_url):
         self.webhook_url = webhook_url
+        self._client = None
+        self._sent = collections.deque()     # 最近一分钟的发送时间，用于限流
+        self._rate_lock = asyncio.Lock()
+        self._digest = {}                    # sku -> 机会条目 (窗口内同一 SKU 只保留最新)
+        self._digest_task = None
+        self._alerted = {}                   # sku -> (上次提醒的利润, 时间)
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "throttled": 0, "digests": 0, "deduped": 0}
+
+    @property
+    def client(self):
+        """懒加载的共享客户端：复用 TLS 连接，不再每条消息握手一次"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=10.0, limits=httpx.Limits(max_connections=4, max_keepalive_connections=2))
+        return self._client
+
+    async def aclose(self):
+        """关停：先把窗口里还没发出去的机会摘要发掉，再关连接池"""
+        await self.flush()
+        if self._client is not None:
+            await self._client.aclose()
+
+    # ---------- 底层发送 ----------
+
+    async def _throttle(self):
+        """滑动窗口限流：每秒 RATE_PER_SEC 条、每分钟 RATE_PER_MIN 条"""
+        cfg = config.NOTIFIER_CONFIG
+        async with self._rate_lock:
+            while True:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] > 60:
+                    self._sent.popleft()
+                last_sec = sum(1 for t in self._sent if now - t < 1)
+                if len(self._sent) < cfg["RATE_PER_MIN"] and last_sec < cfg["RATE_PER_SEC"]:
+                    self._sent.append(now)
+                    return
+                self.stats["throttled"] += 1
+                wait = 60 - (now - self._sent[0]) if len(self._sent) >= cfg["RATE_PER_MIN"] else 1.0 / cfg["RATE_PER_SEC"]
+                await asyncio.sleep(max(0.05, wait))
+
+    async def _post(self, payload):
+        """
+        带限流与指数退避的发送，返回飞书回执 (dict)；最终失败返回 None (对外的 send_* 统一折成 bool)
+        网络错误、5xx、429 以及飞书限流码会重试，其它业务错误直接放弃
+        """
+        cfg = config.NOTIFIER_CONFIG
+        for attempt in range(cfg["MAX_RETRIES"] + 1):
+            if attempt:
+                self.stats["retries"] += 1
+                await asyncio.sleep(cfg["BACKOFF_BASE"] * 2 ** (attempt - 1))
+            await self._throttle()
+            try:
+                resp = await self.client.post(self.webhook_url, json=payload)
+            except httpx.HTTPError as e:
+                print(f"🚨 [Notifier] 网络请求失败 (第 {attempt + 1} 次): {e}")
+                continue
+            if resp.status_code == 429 or resp.status_code >= 500:
+                print(f"⚠️ [Notifier] 飞书回执 {resp.status_code}，稍后重试")
+                continue
+            try:
+                body = resp.json()
+            except ValueError:
+                body = {}
+            code = body.get("code", body.get("StatusCode", 0))
+            if code in RATE_LIMIT_CODES:
+                print("⚠️ [Notifier] 触发飞书限流，退避后重试")
+                continue
+            if resp.status_code != 200 or code:
+                print(f"🚨 [Notifier] 推送失败详情: {resp.status_code} {resp.text[:200]}")
+                break
+            self.stats["sent"] += 1
+            return body
+        self.stats["failed"] += 1
+        return None
 
     async def send_card(self, card_content):
         payload = {
             "msg_type": "interactive",
             "card": card_content
         }
-        try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                # 💡 关键：打印发送前的 Payload 长度，确认没发空包
-                print(f"📡 [Notifier] 准备推送卡片，Payload 长度: {len(json.dumps(payload))} 字节")
-                
-                resp = await client.post(self.webhook_url, json=payload)
-                
-                # 💡 核心检查点：打印飞书的原始回执
-                print(f"📡 [Notifier] 飞书回执状态: {resp.status_code}")
-                if resp.status_code != 200:
-                    print(f"🚨 [Notifier] 推送失败详情: {resp.text}")
-                return resp.status_code == 200
-        except Exception as e:
-            print(f"🚨 [Notifier] 网络请求崩溃: {e}")
-            return False
-
-    def send_arbitrage_report(self, games):
-        """发送富文本报告"""
-        post_data = {
+        # 💡 关键：打印发送前的 Payload 长度，确认没发空包
+        print(f"📡 [Notifier] 准备推送卡片，Payload 长度: {len(json.dumps(payload))} 字节")
+        return await self._post(payload) is not None
+
+    async def send_text(self, text: str):
+        """
+        升级版：发送富文本消息。
+        即便传入的是普通字符串，也会包装成富文本，确保链接、换行完美渲染。
+        返回是否送达 (与 send_card 一致)。
+        """
+        payload = {
             "msg_type": "post",
             "content": {
                 "post": {
                     "zh_cn": {
-                        "title": "🛰️ 杉果 x SteamPy 侦察报告",
-                        "content": []
+                        "title": "🛰️ 侦察回报",
+                        "content": [
+                            [
+                                {"tag": "text", "text": text}
+                            ]
+                        ]
                     }
                 }
             }
         }
-        
+        return await self._post(payload) is not None
+
+    # ---------- 机会摘要 ----------
+
+    def _should_alert(self, sku, profit, now):
+        """同一 SKU 在 DEDUP_TTL 内只有利润变化超过阈值才再次提醒"""
+        cfg = config.NOTIFIER_CONFIG
+        last = self._alerted.get(sku)
+        if last is None or now - last[1] > cfg["DEDUP_TTL"]:
+            return True
+        threshold = max(cfg["PROFIT_DELTA_ABS"], abs(last[0]) * cfg["PROFIT_DELTA_PCT"])
+        return abs(profit - last[0]) >= threshold
+
+    async def send_arbitrage_report(self, games):
+        """
+        登记一批利润机会 (字段: title / sk_price / py_price / profit / url)，立即返回；
+        窗口结束时合并成一条摘要发出。返回实际入队的条数。
+        """
+        now = time.time()
+        queued = 0
+        for game in games:
+            sku = sku_of({"url": game.get('url'), "name": game.get('title')})
+            profit = parse_money(game.get('profit')) or 0.0
+            if not self._should_alert(sku, profit, now):
+                self.stats["deduped"] += 1
+                continue
+            self._alerted[sku] = (profit, now)
+            self._digest[sku] = {**game, "profit_value": profit}
+            queued += 1
+        if self._digest and (self._digest_task is None or self._digest_task.done()):
+            self._digest_task = asyncio.create_task(self._flush_after(config.NOTIFIER_CONFIG["DIGEST_WINDOW"]))
+        return queued
+
+    async def _flush_after(self, delay):
+        await asyncio.sleep(delay)
+        await self._send_digest()
+
+    async def flush(self):
+        """立即发出当前积攒的摘要 (关停前调用)"""
+        if self._digest_task and not self._digest_task.done():
+            self._digest_task.cancel()
+            # 等它真正退出：若正发到一半被打断，条目会放回 _digest，下面一并重发
+            try:
+                await self._digest_task
+            except asyncio.CancelledError:
+                pass
+        await self._send_digest()
+
+    async def _send_digest(self):
+        if not self._digest:
+            return
+        items = sorted(self._digest.values(), key=lambda g: -g["profit_value"])
+        self._digest = {}
+
         segments = []
-        for i, game in enumerate(games, 1):
+        for i, game in enumerate(items, 1):
             segments.append([
                 {"tag": "text", "text": f"{i}. {game['title']}\n"},
-                {"tag": "text", "text": f"   💰 进货: ￥{game['sk_price']} | 出货: ￥{game['py_price']}\n"},
-                {"tag": "text", "text": f"   🔥 预期纯利: ￥{game['profit']:.2f}\n"},
+                {"tag": "text", "text": f"   💰 进货: {game['sk_price']} | 出货: {game['py_price']}\n"},
+                {"tag": "text", "text": f"   🔥 预期纯利: ￥{game['profit_value']:.2f}\n"},
                 {"tag": "a", "text": "🔗 点击进货", "href": game['url']},
                 {"tag": "text", "text": "\n------------------\n"}
             ])
-        
-        post_data["content"]["post"]["zh_cn"]["content"] = segments
-        
-        response = requests.post(self.webhook_url, json=post_data)
-        return response.json()
-    
-    async def send_text(self, text: str):
-        """
-        升级版：发送富文本消息。
-        即便传入的是普通字符串，也会包装成富文本，确保链接、换行完美渲染。
-        """
-        # 1. 自动处理文本中的 URL，将其转换为可点击的 a 标签（如果需要）
-        # 但最简单的办法是直接发 POST 格式
-        payload = {
+        post_data = {
             "msg_type": "post",
             "content": {
                 "post": {
                     "zh_cn": {
-                        "title": "🛰️ 侦察回报",
-                        "content": [
-                            [
-                                {"tag": "text", "text": text}
-                            ]
-                        ]
+                        "title": f"🛰️ 杉果 x SteamPy 侦察报告 ({len(items)} 个机会)",
+                        "content": segments
                     }
                 }
             }
         }
-        
+        self.stats["digests"] += 1
         try:
-            async with httpx.AsyncClient() as client:
-                # 注意：这里改用异步 httpx 保持一致性
-                response = await client.post(self.webhook_url, json=payload, timeout=10.0)
-                response.raise_for_status()
-                return response.json()
-        except Exception as e:
-            print(f"❌ 飞书推送失败: {e}")
\ No newline at end of file
+            delivered = await self._post(post_data) is not None
+        except asyncio.CancelledError:
+            for game in items:
+                self._digest.setdefault(sku_of({"url": game.get('url'), "name": game.get('title')}), game)
+            raise
+        if not delivered:
+            # 彻底发不出去：撤销去重记录，下次发现时还能再提醒
+            for game in items:
+                self._alerted.pop(sku_of({"url": game.get('url'), "name": game.get('title')}), None)
+
+    def get_metrics(self):
+        return {**self.stats, "pending_digest": len(self._digest)}
+
+
+# ==========================================
+# 🚀 本地联调：python feishu_notifier.py
+# 起一个假的飞书 webhook (前 2 次返回 500、之后每 10 条触发一次限流码)，
+# 灌 30 个机会 + 若干文本，检查合并、去重、重试与限流是否按预期工作
+# ==========================================
+if __name__ == "__main__":
+    from aiohttp import web
+
+    async def selftest():
+        received = []
+        calls = {"n": 0}
+
+        async def hook(request):
+            calls["n"] += 1
+            if calls["n"] <= 2:
+                return web.Response(status=500)
+            if calls["n"] % 10 == 0:
+                return web.json_response({"code": 9499, "msg": "too many request"})
+            received.append((time.monotonic(), await request.json()))
+            return web.json_response({"code": 0, "msg": "success"})
+
+        app = web.Application()
+        app.router.add_post("/hook", hook)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 18765)
+        await site.start()
+
+        config.NOTIFIER_CONFIG.update({"DIGEST_WINDOW": 1.0, "BACKOFF_BASE": 0.1})
+        notifier = FeishuNotifier("http://127.0.0.1:18765/hook")
+        t0 = time.monotonic()
+        games = [{"title": f"Game {i}", "sk_price": "¥10", "py_price": "¥30", "profit": f"¥{19 + i % 3}",
+                  "url": f"https://www.sonkwo.cn/sku/{i % 20}"} for i in range(30)]
+        queued = await notifier.send_arbitrage_report(games)
+        again = await notifier.send_arbitrage_report(games[:5])
+        await asyncio.gather(*[notifier.send_text(f"ping {i}") for i in range(12)])
+        await asyncio.sleep(1.5)
+        await notifier.aclose()
+        await runner.cleanup()
+
+        digests = [p for _, p in received if "侦察报告" in json.dumps(p, ensure_ascii=False)]
+        stamps = [t for t, _ in received]
+        peak = max(sum(1 for s in stamps if 0 <= s - t < 1) for t in stamps)
+        print(f"入队 {queued} (30 条里 20 个 SKU) | 重复提交被去重 {5 - again} | 摘要 {len(digests)} 条")
+        print(f"送达 {len(received)} 条 | 最高 {peak} 条/秒 | 用时 {time.monotonic() - t0:.2f}s")
+        print(f"统计: {notifier.get_metrics()}")
+
+    asyncio.run(selftest())
\ No newline at end of file
@@ -6,6 +6,12 @@ root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if root_path not in sys.path:
     sys.path.append(root_path)
 
+def estimate_tokens(text):
+    """粗估 Prompt token 数：中日韩字符按 1 个计，其余按 4 字符 1 个计"""
+    cjk = sum(1 for ch in text if '\u2e80' <= ch <= '\u9fff' or '\uac00' <= ch <= '\ud7af')
+    return cjk + (len(text) - cjk + 3) // 4
+
+
 class AssetAuditor:
     def __init__(self, ai_handler=None):
         if ai_handler is None:
@@ -21,6 +27,21 @@ class AssetAuditor:
         if not candidates:
             return "NONE", "未发现任何候选资产"
 
+        prompt = self.build_prompt(query_name, candidates)
+        try:
+            response = self.ai._call_with_retry(prompt)
+            if "ID:" in response:
+                # 提取 ID 和 理由
+                parts = response.split("|")
+                final_id = parts[0].replace("ID:", "").strip()
+                reason = parts[1].replace("Reason:", "").strip() if len(parts) > 1 else "语义锁定"
+                return final_id, reason
+            return "NONE", "AI 未能锁定唯一资产"
+        except Exception as e:
+            return "NONE", f"审计过程异常: {str(e)}"
+
+    def build_prompt(self, query_name, candidates):
+        """拼装审计 Prompt（单独拆出来，方便统计 token 体积）"""
         # 格式化候选名单供 AI 参考
         # 我们把好评率和评论数也喂给 AI，它会自动识别哪个是“主版本”
         candidate_str = ""
@@ -43,17 +64,7 @@ class AssetAuditor:
         输出格式：
         ID: [AppID 或 NONE] | Reason: [简述你如何根据“副标题”或“数字”逻辑排除干扰项的]
         """
-        try:
-            response = self.ai._call_with_retry(prompt)
-            if "ID:" in response:
-                # 提取 ID 和 理由
-                parts = response.split("|")
-                final_id = parts[0].replace("ID:", "").strip()
-                reason = parts[1].replace("Reason:", "").strip() if len(parts) > 1 else "语义锁定"
-                return final_id, reason
-            return "NONE", "AI 未能锁定唯一资产"
-        except Exception as e:
-            return "NONE", f"审计过程异常: {str(e)}"
+        return prompt
 
 # ==========================================
 # 🚀 集成测试：Matcher + Auditor 联动
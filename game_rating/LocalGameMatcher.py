@@ -1,9 +1,9 @@
-import json
 import os
 import re
 import asyncio
 import sys
 from collections import defaultdict
+import numpy as np
 
 # 路径修复：确保能找到根目录的 arbitrage_commander
 root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -13,6 +13,22 @@ if root_path not in sys.path:
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 DEFAULT_JSON = os.path.join(CURRENT_DIR, "steamspy_all.json")
 
+try:
+    from .keyword_cache import KeywordCache, prompt_version
+    from .spy_store import SpyStore
+except ImportError:
+    from keyword_cache import KeywordCache, prompt_version
+    from spy_store import SpyStore
+
+# 关键词提取 Prompt：改动这里会自动让翻译缓存整体失效
+KEYWORD_PROMPT = """
+        请将游戏名 '{game_name}' 翻译成 Steam 商店中的英文核心单词。
+        要求：仅输出 1-2 个核心单词，用逗号分隔。不要输出任何解释，不要带数字。
+        示例：'人中之龙7' -> 'Yakuza, Dragon'
+        示例：'绝地潜兵 2' -> 'Helldivers'
+        示例：'生化危机' -> 'Resident, Evil'
+        """
+
 class SpyGameMatcher:
     def __init__(self, ai_handler=None, spy_json_path=DEFAULT_JSON):
         # 弹性初始化
@@ -24,26 +40,23 @@ class SpyGameMatcher:
             self.ai = ai_handler
             
         self.spy_json_path = spy_json_path
-        self.index = defaultdict(list)
-        self.apps = {}
+        self.index = {}          # token -> 行号数组 (已排序)
+        self.digit_index = {}    # 数字串 -> 行号数组 (已排序)
+        self.apps = None         # SpyStore：只保留 name / positive / negative 的精简列存
         self.is_ready = False
+        self._substring_memo = {}
+        # 翻译缓存：同名游戏只问一次 AI
+        self.keyword_cache = KeywordCache(prompt_version(KEYWORD_PROMPT))
 
     def initialize(self):
-        """载入 6 万条 SteamSpy 数据并构建倒排索引"""
+        """载入 6 万条 SteamSpy 数据并构建倒排索引 + NumPy 列存"""
         if not os.path.exists(self.spy_json_path):
             print(f"❌ 错误: 未找到 {self.spy_json_path}。请先运行同步脚本。")
             return False
         
         try:
-            with open(self.spy_json_path, 'r', encoding='utf-8') as f:
-                self.apps = json.load(f)
-
-            for appid, info in self.apps.items():
-                name = str(info.get('name', '')).upper()
-                # 仅索引字母和数字
-                tokens = set(re.findall(r'[A-Z0-9]+', name))
-                for token in tokens:
-                    self.index[token].append(appid)
+            self.apps = SpyStore.load(self.spy_json_path)
+            self._build_columns()
             
             self.is_ready = True
             print(f"✅ 索引构建完成！当前库内资产: {len(self.apps)} 条。")
@@ -52,6 +65,90 @@ class SpyGameMatcher:
             print(f"❌ 索引构建异常: {e}")
             return False
 
+    def _build_columns(self):
+        """
+        在精简列存之上补齐检索用的结构：
+        token 与数字串各自一份倒排索引（值是行号数组）+ “是否含数字”掩码，检索时全程向量化。
+        """
+        token_rows = defaultdict(list)
+        digit_rows = defaultdict(list)
+        has_digits = np.zeros(len(self.apps), dtype=bool)
+
+        for row, name in enumerate(self.apps.names):
+            upper = name.upper()
+            # 仅索引字母和数字
+            for token in set(re.findall(r'[A-Z0-9]+', upper)):
+                token_rows[token].append(row)
+            digits = set(re.findall(r'\d+', upper))
+            for d in digits:
+                digit_rows[d].append(row)
+            has_digits[row] = bool(digits)
+
+        self.appids = self.apps.appids
+        self.names = self.apps.names
+        self.positive = self.apps.positive
+        self.negative = self.apps.negative
+        self.has_digits = has_digits
+        self.index = {sys.intern(t): np.asarray(r, dtype=np.int32) for t, r in token_rows.items()}
+        self.digit_index = {d: np.asarray(r, dtype=np.int32) for d, r in digit_rows.items()}
+        self._substring_memo = {}
+
+    def _translate(self, game_name):
+        """同步调用 AI 翻译，失败时抛异常交给上层兜底"""
+        raw_keywords = self.ai._call_with_retry(KEYWORD_PROMPT.format(game_name=game_name))
+        return [k.strip().upper() for k in re.split(r'[,，\s]', raw_keywords) if len(k.strip()) > 1]
+
+    async def extract_keywords(self, game_name):
+        """
+        [漏斗第零层] 中文名 -> 英文核心词，命中缓存时零 AI 延迟
+        """
+        cached = self.keyword_cache.get(game_name)
+        if cached is not None:
+            return cached
+
+        try:
+            keywords = await asyncio.to_thread(self._translate, game_name)
+            print(f"🔑 AI 提取关键词: {keywords}")
+            # 只缓存 AI 的正常产出，兜底结果下次还要重试
+            if keywords:
+                self.keyword_cache.put(game_name, keywords)
+            return keywords
+        except:
+            return set(re.findall(r'[A-Z]+', game_name.upper()))
+
+    async def prewarm_keywords(self, names, concurrency=4):
+        """
+        [批量预热] 后台并发翻译所有未缓存的名字，信号量控制并发上限
+        """
+        pending = [n for n in dict.fromkeys(names) if n not in self.keyword_cache]
+        if not pending:
+            return 0
+
+        sem = asyncio.Semaphore(max(1, concurrency))
+        done = 0
+
+        async def warm_one(name):
+            nonlocal done
+            async with sem:
+                try:
+                    keywords = await asyncio.to_thread(self._translate, name)
+                except Exception as e:
+                    print(f"⚠️ [预热] {name} 翻译失败: {e}")
+                    return
+                if keywords:
+                    # 批量阶段先只写内存，结束时统一落盘
+                    self.keyword_cache.put(name, keywords, persist=False)
+                    done += 1
+                    if done % 20 == 0:
+                        await self.keyword_cache.flush_async()
+                        print(f"🔥 [预热] 进度 {done}/{len(pending)}")
+
+        try:
+            await asyncio.gather(*(warm_one(n) for n in pending))
+        finally:
+            await self.keyword_cache.flush_async()
+        return done
+
     async def fetch_candidates(self, game_name, limit=30):
         """
         [漏斗第一层] 广撒网检索
@@ -59,62 +156,92 @@ class SpyGameMatcher:
         if not self.is_ready:
             return []
 
-        # 1. AI 提取纯净核心词 (严格约束 Prompt)
-        prompt = f"""
-        请将游戏名 '{game_name}' 翻译成 Steam 商店中的英文核心单词。
-        要求：仅输出 1-2 个核心单词，用逗号分隔。不要输出任何解释，不要带数字。
-        示例：'人中之龙7' -> 'Yakuza, Dragon'
-        示例：'绝地潜兵 2' -> 'Helldivers'
-        示例：'生化危机' -> 'Resident, Evil'
+        # 1. AI 提取纯净核心词 (优先走翻译缓存)
+        keywords = await self.extract_keywords(game_name)
+
+        # 2~4. 碰撞、过滤、排序全部在行号数组上完成
+        return self.rank_candidates(game_name, keywords, limit=limit)
+
+    def _substring_rows(self, kw):
         """
-        try:
-            raw_keywords = self.ai._call_with_retry(prompt)
-            keywords = [k.strip().upper() for k in re.split(r'[,，\s]', raw_keywords) if len(k.strip()) > 1]
-            print(f"🔑 AI 提取关键词: {keywords}")
-        except:
-            keywords = set(re.findall(r'[A-Z]+', game_name.upper()))
+        含有子串 kw 的所有行。纯字母数字的 kw 不可能跨越标点，
+        所以只需在 token 词表里找包含它的 token，再合并它们的行号。
+        """
+        rows = self._substring_memo.get(kw)
+        if rows is None:
+            postings = [r for t, r in self.index.items() if kw in t]
+            rows = np.unique(np.concatenate(postings)) if postings else np.empty(0, dtype=np.int32)
+            if len(self._substring_memo) > 4096:
+                self._substring_memo.clear()
+            self._substring_memo[kw] = rows
+        return rows
+
+    def _keyword_hits(self, kw, rows):
+        """kw 是否出现在这些行的大写名字里（与 `kw in app_name` 语义一致）"""
+        if re.fullmatch(r'[A-Z0-9]+', kw):
+            return np.isin(rows, self._substring_rows(kw), assume_unique=True)
+        # 带标点/非 ASCII 的关键词很少见，逐行兜底以保证结果一致
+        return np.fromiter((kw in self.names[r].upper() for r in rows), dtype=bool, count=len(rows))
 
+    def rank_candidates(self, game_name, keywords, limit=30):
+        """
+        [漏斗第一层·内核] 关键词 -> 排好序的候选资产
+        排序规则：匹配度第一，热度第二，同分按库内顺序。
+        """
         # 2. 倒排索引碰撞 (OR 逻辑)
-        hit_ids = set()
-        for kw in keywords:
-            if kw in self.index:
-                hit_ids.update(self.index[kw])
+        postings = [self.index[kw] for kw in keywords if kw in self.index]
+        if not postings:
+            return []
+        rows = np.unique(np.concatenate(postings))
 
         # 3. 筛选逻辑 (放松限制)
-        candidates = []
+        # --- 核心改进：冲突剔除法 ---
+        # 只有当两边都有数字，且数字完全不重合时才剔除（比如 4代 vs 6代）
+        # 如果一边有一边没有，我们选择保留，交给下游 AI 判定
         target_digits = set(re.findall(r'\d+', game_name))
+        if target_digits:
+            keep = ~self.has_digits[rows]
+            for d in target_digits:
+                if d in self.digit_index:
+                    keep |= np.isin(rows, self.digit_index[d], assume_unique=True)
+            rows = rows[keep]
 
-        for aid in hit_ids:
-            app = self.apps[aid]
-            app_name = app['name'].upper()
-            app_digits = set(re.findall(r'\d+', app_name))
-            
-            # --- 核心改进：冲突剔除法 ---
-            # 只有当两边都有数字，且数字完全不重合时才剔除（比如 4代 vs 6代）
-            # 如果一边有一边没有，我们选择保留，交给下游 AI 判定
-            if target_digits and app_digits:
-                if not (target_digits & app_digits):
-                    continue
-            
-            # 计算基本分：命中的关键词越多排名越靠前
-            match_score = sum(1 for kw in keywords if kw in app_name)
-            if match_score == 0: continue
+        # 计算基本分：命中的关键词越多排名越靠前
+        match_score = np.zeros(len(rows), dtype=np.int64)
+        for kw in keywords:
+            match_score += self._keyword_hits(kw, rows)
+        keep = match_score > 0
+        rows, match_score = rows[keep], match_score[keep]
+        if not len(rows):
+            return []
 
-            pos = app.get('positive', 0)
-            neg = app.get('negative', 1)
-            score = int((pos / (pos + neg)) * 100) if (pos + neg) > 0 else 0
-            
-            candidates.append({
-                "appid": str(aid),
-                "name": app['name'],
-                "info": f"Rating: {score}% | Reviews: {pos + neg}",
-                "review_count": pos + neg,
-                "match_score": match_score
-            })
-
-        # 排序策略：匹配度第一，热度第二
-        candidates.sort(key=lambda x: (x['match_score'], x['review_count']), reverse=True)
-        return candidates[:limit]
+        pos = self.positive[rows].astype(np.int64)
+        neg = self.negative[rows].astype(np.int64)
+        reviews = pos + neg
+
+        # 4. 排序策略：匹配度第一，热度第二 (复合键 + argpartition 取 Top-K)
+        key = (match_score << 40) | reviews
+        if len(key) > limit:
+            top = np.argpartition(-key, limit - 1)[:limit]
+            # 把与第 K 名同分的行也带上，保证同分时的顺序是确定的
+            pick = np.flatnonzero(key >= key[top].min())
+        else:
+            pick = np.arange(len(key))
+        order = pick[np.lexsort((rows[pick], -key[pick]))][:limit]
+
+        return [self.describe_row(rows[i], int(match_score[i])) for i in order]
+
+    def describe_row(self, row, match_score=0):
+        """把库内一行整理成下游通用的候选字典（含评分快照）"""
+        p, n = int(self.positive[row]), int(self.negative[row])
+        score = int((p / (p + n)) * 100) if (p + n) > 0 else 0
+        return {
+            "appid": self.appids[row],
+            "name": self.names[row],
+            "info": f"Rating: {score}% | Reviews: {p + n}",
+            "review_count": p + n,
+            "match_score": match_score
+        }
 
 # ==========================================
 # 🚀 最终测试入口
@@ -1,52 +1,279 @@
-import requests
+import aiohttp
+import asyncio
+import hashlib
 import json
 import os
+import sys
 import time
 
+# 路径修复：确保能找到根目录的 config
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+import config
+from game_rating.identity_cache import db_fingerprint
+
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(CURRENT_DIR, "steamspy_all.json")
+MANIFEST_PATH = os.path.join(CURRENT_DIR, "steamspy_manifest.json")
+DIFF_PATH = os.path.join(CURRENT_DIR, "steamspy_diff.json")
+BASE_URL = "https://steamspy.com/api.php"
+HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
+# 下游（评分漏斗）真正会读的字段，diff 只看这些字段的变化
+PROJECTED_FIELDS = ("name", "positive", "negative")
+
+
+def _app_digest(info):
+    raw = json.dumps([info.get(k) for k in PROJECTED_FIELDS], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:10]
+
+
+def _load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️ 读取 {os.path.basename(path)} 失败，按空处理: {e}")
+        return default
+
+
+def _write_json_atomic(path, payload):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
 
-def sync_all_pages(max_pages=65):
+
+class _Politeness:
+    """礼貌限流：并发上限 + 两次请求发起之间的最小间隔，避免被 SteamSpy 封 IP"""
+    def __init__(self, concurrency, min_interval):
+        self.sem = asyncio.Semaphore(max(1, concurrency))
+        self.min_interval = min_interval
+        self._next_slot = 0.0
+        self._slot_lock = asyncio.Lock()
+
+    async def acquire(self, skip=None):
+        """排队拿号；轮到时 skip() 为真就直接让出 (不占请求间隔)，返回是否真的拿到了号"""
+        await self.sem.acquire()
+        if skip and skip():
+            self.sem.release()
+            return False
+        async with self._slot_lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.min_interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+        if skip and skip():
+            self.sem.release()
+            return False
+        return True
+
+    def release(self):
+        self.sem.release()
+
+    async def __aenter__(self):
+        await self.acquire()
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class SpySyncer:
     """
-    SteamSpy 每一页大约 1000 条数据。
-    循环抓取所有页面并合并成一个大的 json 文件。
+    SteamSpy 全库同步器
+    - 多页并发抓取（受礼貌限流约束）
+    - 每页抓完立即流式写入临时文件，最后原子替换正式库，崩溃不会留下半截文件
+    - 增量模式：带条件请求头 / 内容哈希判断分页是否变化，未变化的分页直接沿用旧库
+    - 每次同步输出变更 AppID 清单 (steamspy_diff.json)，供下游缓存按需失效
     """
-    full_library = {}
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+    def __init__(self, base_url=BASE_URL, data_path=DATA_PATH, manifest_path=MANIFEST_PATH,
+                 diff_path=DIFF_PATH, concurrency=None, min_interval=None, max_retries=3):
+        cfg = config.SPY_SYNC_CONFIG
+        self.base_url = base_url
+        self.data_path = data_path
+        self.manifest_path = manifest_path
+        self.diff_path = diff_path
+        self.concurrency = concurrency or cfg["CONCURRENCY"]
+        self.min_interval = cfg["MIN_INTERVAL"] if min_interval is None else min_interval
+        self.max_retries = max_retries
+
+    async def _fetch_page(self, session, limiter, page, validators, skip=None):
+        """
+        返回 (状态, 数据, 响应头)；状态: OK / NOT_MODIFIED / EMPTY / SKIPPED
+        skip: 排到号时再确认一次是否还需要这一页 (已经遇到空页时，更靠后的分页直接放弃)
+        """
+        req_headers = dict(HEADERS)
+        if validators.get("etag"):
+            req_headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            req_headers["If-Modified-Since"] = validators["last_modified"]
+
+        last_error = None
+        for attempt in range(self.max_retries):
+            try:
+                if not await limiter.acquire(skip):
+                    return "SKIPPED", None, {}
+                try:
+                    async with session.get(self.base_url, params={"request": "all", "page": str(page)},
+                                           headers=req_headers) as resp:
+                        if resp.status == 304:
+                            return "NOT_MODIFIED", None, resp.headers
+                        if resp.status != 200:
+                            raise RuntimeError(f"状态码 {resp.status}")
+                        data = await resp.json(content_type=None)
+                        return ("OK" if data else "EMPTY"), data, resp.headers
+                finally:
+                    limiter.release()
+            except Exception as e:
+                last_error = e
+                await asyncio.sleep(2 ** attempt)
+        raise RuntimeError(f"第 {page} 页抓取失败: {last_error}")
 
-    print(f"📡 开始全量同步计划，预计抓取 {max_pages} 个数据分片...")
+    async def sync(self, max_pages=65, incremental=False):
+        """
+        执行一次同步，成功返回 diff 字典，失败返回 None（旧库保持原样）
+        """
+        manifest = _load_json(self.manifest_path, {"pages": {}, "apps": {}}) if incremental else {"pages": {}, "apps": {}}
+        old_pages = manifest.get("pages", {})
+        old_apps = manifest.get("apps", {})
+        old_library = None  # 只有需要沿用旧分页时才载入
 
-    for page in range(max_pages):
-        url = f"https://steamspy.com/api.php?request=all&page={page}"
+        new_pages, new_apps = {}, {}
+        end_page = max_pages  # 遇到空页后，更靠后的分页不再请求
+        tmp_path = f"{self.data_path}.tmp"
+        first_entry = True
+        stats = {"fetched": 0, "reused": 0}
+
+        mode = "增量" if incremental else "全量"
+        print(f"📡 开始{mode}同步，预计抓取 {max_pages} 个数据分片 (并发 {self.concurrency})...")
+        started = time.time()
+
+        timeout = aiohttp.ClientTimeout(total=60)
         try:
-            print(f"🔄 正在抓取第 {page} 页...", end='\r')
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                page_data = response.json()
-                if not page_data: # 如果某一页没数据了，提前停止
-                    break
-                full_library.update(page_data)
-                # 稍微缓一下，避免被 SteamSpy 封 IP
-                time.sleep(0.5) 
-            else:
-                print(f"\n❌ 第 {page} 页抓取失败，状态码: {response.status_code}")
-                break
+            with open(tmp_path, 'w', encoding='utf-8') as out:
+                out.write("{")
+
+                def write_entries(items):
+                    nonlocal first_entry
+                    for appid, info in items:
+                        out.write(("" if first_entry else ",") + json.dumps(str(appid)) + ":" + json.dumps(info, ensure_ascii=False))
+                        first_entry = False
+
+                async def handle_page(session, limiter, page):
+                    nonlocal end_page, old_library
+                    if page >= end_page:
+                        return
+                    prev = old_pages.get(str(page), {})
+                    status, data, headers = await self._fetch_page(session, limiter, page, prev if incremental else {},
+                                                                   skip=lambda: page >= end_page)
+
+                    if status == "SKIPPED":
+                        return
+                    if status == "EMPTY":
+                        end_page = min(end_page, page)
+                        return
+
+                    digest = hashlib.sha1(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest() if data else None
+                    if status == "NOT_MODIFIED":
+                        # 服务端确认分页未变化：沿用旧库里这一页的内容
+                        if old_library is None:
+                            old_library = _load_json(self.data_path, {})
+                        data = {aid: old_library[aid] for aid in prev.get("appids", []) if aid in old_library}
+                        digest = prev.get("sha1")
+                        stats["reused"] += 1
+                    elif incremental and digest == prev.get("sha1"):
+                        # 服务端不支持条件请求，但内容哈希一致，同样视为未变化
+                        stats["reused"] += 1
+                    else:
+                        stats["fetched"] += 1
+
+                    write_entries(data.items())
+                    new_pages[str(page)] = {
+                        "etag": headers.get("ETag") or prev.get("etag"),
+                        "last_modified": headers.get("Last-Modified") or prev.get("last_modified"),
+                        "sha1": digest,
+                        "appids": [str(a) for a in data.keys()],
+                    }
+                    for aid, info in data.items():
+                        new_apps[str(aid)] = _app_digest(info)
+                    print(f"🔄 第 {page} 页完成 ({len(data)} 条)，累计 {len(new_apps)} 条...", end='\r')
+
+                async with aiohttp.ClientSession(timeout=timeout) as session:
+                    limiter = _Politeness(self.concurrency, self.min_interval)
+                    tasks = [asyncio.ensure_future(handle_page(session, limiter, p)) for p in range(max_pages)]
+                    try:
+                        await asyncio.gather(*tasks)
+                    finally:
+                        # 任意一页彻底失败就整体放弃，其余在途请求一并取消
+                        for t in tasks:
+                            t.cancel()
+                        await asyncio.gather(*tasks, return_exceptions=True)
+
+                out.write("}")
+                out.flush()
+                os.fsync(out.fileno())
         except Exception as e:
-            print(f"\n❌ 抓取异常: {e}")
-            break
-
-    if full_library:
-        with open(DATA_PATH, 'w', encoding='utf-8') as f:
-            json.dump(full_library, f, ensure_ascii=False, indent=4)
-        
-        file_size = os.path.getsize(DATA_PATH) / (1024 * 1024)
-        print(f"\n✅ 同步完成！")
-        print(f"📊 最终资产总数: {len(full_library)}")
+            print(f"\n❌ 同步中断，正式库保持不变: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+
+        if not new_apps:
+            print("\n❌ 未抓取到任何有效数据。")
+            os.remove(tmp_path)
+            return None
+
+        # 原子替换：要么是旧库，要么是完整的新库
+        old_fingerprint = db_fingerprint(self.data_path)
+        os.replace(tmp_path, self.data_path)
+        new_fingerprint = db_fingerprint(self.data_path)
+
+        added = [a for a in new_apps if a not in old_apps]
+        removed = [a for a in old_apps if a not in new_apps]
+        modified = [a for a, h in new_apps.items() if a in old_apps and old_apps[a] != h]
+        diff = {
+            "from": old_fingerprint,
+            "to": new_fingerprint,
+            "full": not incremental or not old_apps,
+            "added": added,
+            "removed": removed,
+            "modified": modified,
+            "synced_at": int(time.time()),
+        }
+        _write_json_atomic(self.manifest_path, {"pages": new_pages, "apps": new_apps})
+        _write_json_atomic(self.diff_path, diff)
+
+        file_size = os.path.getsize(self.data_path) / (1024 * 1024)
+        print(f"\n✅ 同步完成！耗时 {time.time() - started:.1f}s")
+        print(f"📊 最终资产总数: {len(new_apps)} (新抓 {stats['fetched']} 页 / 沿用 {stats['reused']} 页)")
+        print(f"🧾 变更: 新增 {len(added)} | 下架 {len(removed)} | 数据变化 {len(modified)}")
         print(f"💾 文件大小: {file_size:.2f} MB")
-        print(f"📂 存储路径: {DATA_PATH}")
-    else:
-        print("\n❌ 未抓取到任何有效数据。")
+        print(f"📂 存储路径: {self.data_path}")
+        return diff
+
 
+def sync_all_pages(max_pages=65, incremental=False, base_url=BASE_URL):
+    """兼容旧入口：同步阻塞执行一次同步"""
+    return asyncio.run(SpySyncer(base_url=base_url).sync(max_pages=max_pages, incremental=incremental))
+
+
+# ==========================================
+# 🚀 命令行入口
+# python game_rating/SyncSpyData.py [--incremental] [--pages 65] [--base-url http://127.0.0.1:8765/api.php]
+# ==========================================
 if __name__ == "__main__":
-    sync_all_pages()
\ No newline at end of file
+    args = sys.argv[1:]
+
+    def arg_value(flag, default):
+        return args[args.index(flag) + 1] if flag in args and args.index(flag) + 1 < len(args) else default
+
+    sync_all_pages(
+        max_pages=int(arg_value("--pages", 65)),
+        incremental="--incremental" in args,
+        base_url=arg_value("--base-url", BASE_URL),
+    )
@@ -0,0 +1,191 @@
+import os
+import re
+import sys
+import time
+import json
+import random
+import tempfile
+import subprocess
+
+# 路径修复
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+from game_rating.LocalGameMatcher import SpyGameMatcher, DEFAULT_JSON
+
+
+def legacy_rank(matcher, legacy_apps, game_name, keywords, limit=30):
+    """旧版逐行 Python 循环（原样保留，作为一致性与速度的基准），legacy_apps 为完整 dict 库"""
+    hit_ids = set()
+    for kw in keywords:
+        if kw in matcher.index:
+            hit_ids.update(matcher.appids[r] for r in matcher.index[kw])
+
+    candidates = []
+    target_digits = set(re.findall(r'\d+', game_name))
+    for aid in hit_ids:
+        app = legacy_apps[aid]
+        app_name = app['name'].upper()
+        app_digits = set(re.findall(r'\d+', app_name))
+        if target_digits and app_digits:
+            if not (target_digits & app_digits):
+                continue
+        match_score = sum(1 for kw in keywords if kw in app_name)
+        if match_score == 0: continue
+        pos = app.get('positive', 0)
+        neg = app.get('negative', 1)
+        score = int((pos / (pos + neg)) * 100) if (pos + neg) > 0 else 0
+        candidates.append({
+            "appid": str(aid),
+            "name": app['name'],
+            "info": f"Rating: {score}% | Reviews: {pos + neg}",
+            "review_count": pos + neg,
+            "match_score": match_score
+        })
+    candidates.sort(key=lambda x: (x['match_score'], x['review_count']), reverse=True)
+    return candidates[:limit]
+
+
+def synthetic_library(n=65000, seed=7):
+    """没有真实库时，按 SteamSpy 的命名分布造一个同量级的假库"""
+    rnd = random.Random(seed)
+    words = ["THE", "OF", "DRAGON", "SIMULATOR", "WAR", "LEGEND", "DARK", "SOULS", "SPACE", "RESIDENT",
+             "EVIL", "FANTASY", "FINAL", "TALES", "HERO", "CITY", "WORLD", "RACING", "ZERO", "TOTAL"]
+    lib = {}
+    for aid in range(10, 10 + n):
+        parts = rnd.sample(words, rnd.randint(1, 4))
+        if rnd.random() < 0.35:
+            parts.append(str(rnd.choice([2, 3, 4, 7, 2077, 14, 1998])))
+        if rnd.random() < 0.1:
+            parts.append(rnd.choice(["- Soundtrack", ": Deluxe Edition", "DLC"]))
+        # 字段与 request=all 的真实返回保持一致，RSS 对比才有意义
+        lib[str(aid)] = {
+            "appid": aid,
+            "name": " ".join(parts).title(),
+            "developer": f"Synthetic Studio {rnd.randint(1, 9000)}",
+            "publisher": f"Synthetic Publisher {rnd.randint(1, 4000)}",
+            "score_rank": "",
+            "positive": rnd.randint(0, 200000),
+            "negative": rnd.randint(0, 30000),
+            "userscore": 0,
+            "owners": "20,000 .. 50,000",
+            "average_forever": rnd.randint(0, 3000),
+            "average_2weeks": rnd.randint(0, 300),
+            "median_forever": rnd.randint(0, 3000),
+            "median_2weeks": rnd.randint(0, 300),
+            "price": str(rnd.randint(0, 5999)),
+            "initialprice": str(rnd.randint(0, 5999)),
+            "discount": str(rnd.choice([0, 10, 50, 75])),
+            "ccu": rnd.randint(0, 5000),
+        }
+    return lib
+
+
+def same_ranking(a, b):
+    """同分项在旧版里按 set 顺序随机排列，因此逐位比较排序键 + 整体集合"""
+    keys_a = [(c['match_score'], c['review_count']) for c in a]
+    keys_b = [(c['match_score'], c['review_count']) for c in b]
+    if keys_a != keys_b:
+        return False
+    # 边界同分项可能取到不同成员，只比较严格高于末位键的部分
+    if not keys_a:
+        return True
+    last = keys_a[-1]
+    strict_a = {c['appid'] for c in a if (c['match_score'], c['review_count']) != last}
+    strict_b = {c['appid'] for c in b if (c['match_score'], c['review_count']) != last}
+    return strict_a == strict_b
+
+
+def rss_mb():
+    """当前进程常驻内存 (Linux 读 /proc，其余平台退回峰值 RSS)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure_rss(mode, db_path):
+    """子进程里单独测量一种载入方式，避免互相污染"""
+    import gc
+    base = rss_mb()
+    if mode == "legacy":
+        with open(db_path, 'r', encoding='utf-8') as f:
+            holder = json.load(f)
+    else:
+        matcher = SpyGameMatcher(ai_handler=object(), spy_json_path=db_path)
+        matcher.initialize()
+        holder = matcher.apps
+    gc.collect()
+    print(json.dumps({"mode": mode, "rss_mb": round(rss_mb() - base, 1), "rows": len(holder)}))
+
+
+def compare_rss(db_path):
+    print("\n" + "=" * 50)
+    print(f"{'载入方式':<22} | {'资产数':>7} | {'RSS 增量(MB)':>12}")
+    print("-" * 50)
+    labels = {"legacy": "完整 dict (旧版)", "store": "SpyStore + 索引 (新版)"}
+    for mode in ("legacy", "store"):
+        out = subprocess.run([sys.executable, __file__, "--rss-child", mode, db_path],
+                             capture_output=True, text=True, check=True).stdout.strip().splitlines()[-1]
+        res = json.loads(out)
+        print(f"{labels[mode]:<22} | {res['rows']:>7} | {res['rss_mb']:>12.1f}")
+    print("=" * 50)
+
+
+# ==========================================
+# 🚀 基准测试入口：python game_rating/bench_matcher.py [--synthetic] [--rss]
+# ==========================================
+if __name__ == "__main__":
+    if "--rss-child" in sys.argv:
+        measure_rss(sys.argv[2], sys.argv[3])
+        sys.exit(0)
+
+    use_synthetic = "--synthetic" in sys.argv or not os.path.exists(DEFAULT_JSON)
+    db_path = DEFAULT_JSON
+    if use_synthetic:
+        db_path = os.path.join(tempfile.gettempdir(), "steamspy_synthetic.json")
+        with open(db_path, 'w', encoding='utf-8') as f:
+            json.dump(synthetic_library(), f)
+        print(f"🧪 使用合成库: {db_path}")
+
+    if "--rss" in sys.argv:
+        compare_rss(db_path)
+        sys.exit(0)
+
+    matcher = SpyGameMatcher(ai_handler=object(), spy_json_path=db_path)
+    if not matcher.initialize():
+        sys.exit(1)
+    with open(db_path, 'r', encoding='utf-8') as f:
+        legacy_apps = json.load(f)
+
+    # 常见 token 会把命中集撑到上万条，这正是旧版最慢的场景
+    cases = [
+        ("最终幻想", ["FINAL", "FANTASY"]),
+        ("黑暗之魂3", ["DARK", "SOULS"]),
+        ("某某2", ["THE", "2"]),
+        ("生化危机4", ["RESIDENT", "EVIL", "THE"]),
+    ]
+
+    print("\n" + "=" * 72)
+    print(f"{'关键词':<26} | {'命中集':>7} | {'旧版(ms)':>9} | {'向量化(ms)':>10} | {'加速':>6} | 一致")
+    print("-" * 72)
+    rounds = 5
+    for name, kws in cases:
+        hits = len(set().union(*(matcher.index[k].tolist() for k in kws if k in matcher.index)))
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            old = legacy_rank(matcher, legacy_apps, name, kws)
+        t_old = (time.perf_counter() - t0) / rounds * 1000
+        t0 = time.perf_counter()
+        for _ in range(rounds):
+            new = matcher.rank_candidates(name, kws)
+        t_new = (time.perf_counter() - t0) / rounds * 1000
+        ok = "✅" if same_ranking(old, new) else "❌"
+        print(f"{','.join(kws):<26} | {hits:>7} | {t_old:>9.1f} | {t_new:>10.1f} | {t_old / max(t_new, 1e-6):>5.1f}x | {ok}")
+    print("=" * 72)
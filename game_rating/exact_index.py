@@ -0,0 +1,55 @@
+import json
+import os
+import sys
+
+# 路径修复：确保能找到根目录的 config
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+import config
+
+try:
+    from .name_utils import normalize_name
+except ImportError:
+    from name_utils import normalize_name
+
+DEFAULT_APP_LIST = os.path.join(root_path, config.PATH_CONFIG["APP_LIST"])
+
+
+class ExactNameIndex:
+    """
+    [精确名快速通道] 归一化名称 -> AppID 集合
+    数据来源：steam_app_list.json + SteamSpy 库里的英文名。
+    只有“一名对一 ID”的精确命中才算数，重名一律交给完整漏斗。
+    """
+    def __init__(self, app_list_path=DEFAULT_APP_LIST):
+        self.app_list_path = app_list_path
+        self.index = {}
+
+    def _add(self, name, appid):
+        key = normalize_name(name)
+        if key:
+            self.index.setdefault(key, set()).add(str(appid))
+
+    def build(self, store):
+        self.index = {}
+        if os.path.exists(self.app_list_path):
+            try:
+                with open(self.app_list_path, 'r', encoding='utf-8') as f:
+                    apps = json.load(f).get("applist", {}).get("apps", [])
+                for app in apps:
+                    self._add(app.get("name", ""), app.get("appid"))
+            except Exception as e:
+                print(f"⚠️ [快速通道] 读取 {os.path.basename(self.app_list_path)} 失败: {e}")
+
+        for appid, name in zip(store.appids, store.names):
+            self._add(name, appid)
+        print(f"⚡ [快速通道] 精确名索引就绪: {len(self.index)} 个名称。")
+
+    def lookup(self, title):
+        """唯一命中时返回 AppID，未命中或有歧义返回 None"""
+        ids = self.index.get(normalize_name(title))
+        if ids and len(ids) == 1:
+            return next(iter(ids))
+        return None
@@ -0,0 +1,187 @@
+import asyncio
+import atexit
+import json
+import os
+import sys
+import time
+
+# 路径修复：确保能找到根目录的 config
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+import config
+
+try:
+    from .name_utils import normalize_name
+except ImportError:
+    from name_utils import normalize_name
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE = os.path.join(CURRENT_DIR, "identity_cache.json")
+DEFAULT_DIFF = os.path.join(CURRENT_DIR, "steamspy_diff.json")
+
+# 这些状态是“答案”，可以缓存；ERROR 属于系统故障，永远不缓存
+CACHEABLE_STATUS = ("SUCCESS", "UNCERTAIN", "MISSING")
+
+# 落盘合并窗口 (秒)：窗口内的多次写入只写一次文件
+FLUSH_DELAY = 2.0
+
+
+def db_fingerprint(db_path):
+    """SteamSpy 库指纹：大小 + 修改时间，重新同步后必然变化"""
+    try:
+        st = os.stat(db_path)
+        return f"{st.st_size}-{int(st.st_mtime)}"
+    except OSError:
+        return None
+
+
+class IdentityCache:
+    """
+    [身份缓存] 杉果标题 -> (AppID, 状态, 评分快照)
+    稳态下一次评分查询就是一次字典读取；SteamSpy 库重新同步后整体失效。
+    写入只标脏，由后台任务合并后在线程池里落盘 (同 KeywordCache)；进程退出前再补写一次。
+    """
+    def __init__(self, cache_path=DEFAULT_CACHE):
+        self.cache_path = cache_path
+        self.ttl = {
+            "SUCCESS": config.RATING_CACHE_CONFIG["SUCCESS_TTL"],
+            "UNCERTAIN": config.RATING_CACHE_CONFIG["UNCERTAIN_TTL"],
+            "MISSING": config.RATING_CACHE_CONFIG["MISSING_TTL"],
+        }
+        self.fingerprint = None
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = 0
+        self._flush_task = None
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+            self.fingerprint = raw.get("fingerprint")
+            self.entries = raw.get("entries", {})
+        except Exception as e:
+            print(f"⚠️ [身份缓存] 读取失败，将重新构建: {e}")
+            self.entries = {}
+
+    def bind_database(self, db_path, diff_path=DEFAULT_DIFF):
+        """
+        启动时与当前 SteamSpy 库对齐：指纹不一致说明库已重新同步。
+        如果同步器留下了恰好衔接的增量 diff，只作废受影响的条目，否则整体清空。
+        """
+        current = db_fingerprint(db_path)
+        if current == self.fingerprint:
+            print(f"🗂️ [身份缓存] 已载入 {len(self.entries)} 条身份记录。")
+            return
+
+        diff = self._load_diff(diff_path)
+        if self.entries and diff and not diff.get("full") and diff.get("from") == self.fingerprint and diff.get("to") == current:
+            changed = set(diff.get("added", [])) | set(diff.get("removed", [])) | set(diff.get("modified", []))
+            before = len(self.entries)
+            # 新上架的资产可能正好是之前“弃权/没搜到”的答案，非 SUCCESS 一律重审
+            self.entries = {
+                k: v for k, v in self.entries.items()
+                if v["status"] == "SUCCESS" and str(v["appid"]) not in changed
+            }
+            print(f"♻️ [身份缓存] SteamSpy 库增量更新，按 diff 作废 {before - len(self.entries)} / {before} 条身份。")
+        elif self.entries:
+            print(f"♻️ [身份缓存] SteamSpy 库已更新 ({self.fingerprint} -> {current})，清空 {len(self.entries)} 条旧身份。")
+            self.entries = {}
+        self.fingerprint = current
+        self._dirty += 1
+        self._schedule_flush()
+
+    def _load_diff(self, diff_path):
+        if not os.path.exists(diff_path):
+            return None
+        try:
+            with open(diff_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return None
+
+    def get(self, title):
+        """命中且未过期时返回 (appid, data, status)，否则返回 None"""
+        key = normalize_name(title)
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if time.time() - entry["ts"] > self.ttl.get(entry["status"], 0):
+            del self.entries[key]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["appid"], entry["data"], entry["status"]
+
+    def put(self, title, appid, data, status):
+        if status not in CACHEABLE_STATUS:
+            return
+        self.entries[normalize_name(title)] = {
+            "appid": appid,
+            "data": data,
+            "status": status,
+            "ts": int(time.time())
+        }
+        self._dirty += 1
+        self._schedule_flush()
+
+    def _schedule_flush(self):
+        """在事件循环里：合并写入、稍后落盘；不在事件循环里 (命令行脚本) 就直接同步写"""
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_task = loop.create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        while self._dirty:
+            await asyncio.sleep(FLUSH_DELAY)
+            await self.flush_async()
+
+    def _take_snapshot(self):
+        """在调用方线程里取快照并清脏计数；条目写入后不会原地修改，浅拷贝即可"""
+        dirty, self._dirty = self._dirty, 0
+        return {"fingerprint": self.fingerprint, "entries": dict(self.entries)}, dirty
+
+    def _write(self, payload):
+        """原子落盘：先写临时文件再替换"""
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            content = json.dumps(payload, ensure_ascii=False)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, self.cache_path)
+            return True
+        except Exception as e:
+            print(f"🚨 [身份缓存] 写入失败: {e}")
+            return False
+
+    def flush(self):
+        """同步落盘 (脚本 / 进程退出时用)"""
+        if not self._dirty:
+            return
+        payload, dirty = self._take_snapshot()
+        if not self._write(payload):
+            self._dirty += dirty
+
+    async def flush_async(self):
+        """异步落盘：序列化与写文件都在线程池里做"""
+        if not self._dirty:
+            return
+        payload, dirty = self._take_snapshot()
+        if not await asyncio.to_thread(self._write, payload):
+            self._dirty += dirty
+
+    def __len__(self):
+        return len(self.entries)
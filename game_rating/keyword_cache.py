@@ -0,0 +1,178 @@
+import json
+import os
+import sys
+import time
+import hashlib
+import asyncio
+import atexit
+
+# 路径修复：确保能找到根目录的 arbitrage_commander / config
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CACHE = os.path.join(CURRENT_DIR, "keyword_cache.json")
+
+# 预热时扫描的名字来源：巡航历史 + 两本财务账
+NAME_SOURCES = [
+    os.path.join(root_path, "arbitrage_history.json"),
+    os.path.join(root_path, "data", "purchase_ledger.json"),
+    os.path.join(root_path, "data", "steampy_sales.json"),
+]
+
+
+# 落盘合并窗口 (秒)：窗口内的多次写入只写一次文件
+FLUSH_DELAY = 2.0
+
+
+def prompt_version(prompt_template):
+    """Prompt 指纹：模板一改，旧缓存自动作废"""
+    return hashlib.sha1(prompt_template.encode("utf-8")).hexdigest()[:12]
+
+
+def normalize_key(game_name):
+    """缓存键：只做空白归一，数字/版本信息必须保留（Prompt 里用的是原名）"""
+    return " ".join(str(game_name).split())
+
+
+class KeywordCache:
+    """
+    [翻译缓存] 游戏名 -> AI 提取的英文核心词
+    持久化到 JSON，按 Prompt 版本号隔离，版本不符的条目载入时直接丢弃。
+    写入只标脏，由后台任务合并后在线程池里落盘，不阻塞事件循环；进程退出前再补写一次。
+    """
+    def __init__(self, version, cache_path=DEFAULT_CACHE):
+        self.version = version
+        self.cache_path = cache_path
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self._dirty = 0
+        self._flush_task = None
+        self._load()
+        atexit.register(self.flush)
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                raw = json.load(f)
+            if raw.get("version") == self.version:
+                self.entries = raw.get("entries", {})
+                print(f"🗂️ [翻译缓存] 已载入 {len(self.entries)} 条关键词 (v{self.version})")
+            else:
+                print(f"♻️ [翻译缓存] Prompt 已变更 ({raw.get('version')} -> {self.version})，旧缓存作废。")
+        except Exception as e:
+            print(f"⚠️ [翻译缓存] 读取失败，将重新构建: {e}")
+            self.entries = {}
+
+    def get(self, game_name):
+        entry = self.entries.get(normalize_key(game_name))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["keywords"]
+
+    def put(self, game_name, keywords, persist=True):
+        self.entries[normalize_key(game_name)] = {
+            "keywords": list(keywords),
+            "ts": int(time.time())
+        }
+        self._dirty += 1
+        if persist:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """在事件循环里：合并写入、稍后落盘；不在事件循环里 (命令行脚本) 就直接同步写"""
+        if self._flush_task is not None and not self._flush_task.done():
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.flush()
+            return
+        self._flush_task = loop.create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        while self._dirty:
+            await asyncio.sleep(FLUSH_DELAY)
+            await self.flush_async()
+
+    def _take_snapshot(self):
+        """在调用方线程里取快照并清脏计数；条目写入后不会原地修改，浅拷贝即可"""
+        dirty, self._dirty = self._dirty, 0
+        return dict(self.entries), dirty
+
+    def _write(self, entries):
+        """原子落盘：先写临时文件再替换，防止写一半断电把缓存搞坏"""
+        tmp_path = f"{self.cache_path}.tmp"
+        try:
+            content = json.dumps({"version": self.version, "entries": entries}, ensure_ascii=False)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            os.replace(tmp_path, self.cache_path)
+            return True
+        except Exception as e:
+            print(f"🚨 [翻译缓存] 写入失败: {e}")
+            return False
+
+    def flush(self):
+        """同步落盘 (脚本 / 进程退出时用)"""
+        if not self._dirty:
+            return
+        entries, dirty = self._take_snapshot()
+        if not self._write(entries):
+            self._dirty += dirty
+
+    async def flush_async(self):
+        """异步落盘：序列化与写文件都在线程池里做"""
+        if not self._dirty:
+            return
+        entries, dirty = self._take_snapshot()
+        if not await asyncio.to_thread(self._write, entries):
+            self._dirty += dirty
+
+    def __contains__(self, game_name):
+        return normalize_key(game_name) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def collect_known_names(sources=NAME_SOURCES):
+    """从历史与账本文件里收集所有出现过的游戏名（去重保序）"""
+    names = []
+    for path in sources:
+        if not os.path.exists(path):
+            continue
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                rows = json.load(f)
+        except Exception as e:
+            print(f"⚠️ [预热] 跳过无法解析的文件 {path}: {e}")
+            continue
+        for row in rows if isinstance(rows, list) else []:
+            name = str(row.get("name", "")).replace("🛰️(点杀)", "").strip()
+            if name:
+                names.append(name)
+    return list(dict.fromkeys(names))
+
+
+# ==========================================
+# 🚀 批量预热入口：python game_rating/keyword_cache.py [并发数]
+# ==========================================
+if __name__ == "__main__":
+    from game_rating.LocalGameMatcher import SpyGameMatcher
+
+    async def main_prewarm():
+        concurrency = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 4
+        matcher = SpyGameMatcher()
+        names = collect_known_names()
+        print(f"📚 共收集到 {len(names)} 个游戏名，已缓存 {sum(1 for n in names if n in matcher.keyword_cache)} 个。")
+        done = await matcher.prewarm_keywords(names, concurrency=concurrency)
+        print(f"✅ 预热完成：新增翻译 {done} 条，缓存总量 {len(matcher.keyword_cache)} 条。")
+
+    asyncio.run(main_prewarm())
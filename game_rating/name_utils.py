@@ -0,0 +1,14 @@
+import re
+import unicodedata
+
+# 手动点杀会在名字前加标记，归一时要剥掉
+MANUAL_TAG = "🛰️(点杀)"
+
+
+def normalize_name(name):
+    """
+    [名称归一] 全角转半角 + 忽略大小写 + 去掉所有标点空白
+    '生化危机4 重制版' 与 '生化危机４：重制版' 归一后完全相同
+    """
+    text = unicodedata.normalize("NFKC", str(name or "")).replace(MANUAL_TAG, "")
+    return re.sub(r'[\W_]+', '', text.casefold())
@@ -1,6 +1,7 @@
 import asyncio
 import os
 import sys
+import time
 
 # 确保能找到上级目录的模块
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -8,27 +9,82 @@ root_path = os.path.dirname(current_dir)
 if root_path not in sys.path:
     sys.path.append(root_path)
 
+import config
+
 try:
     from .LocalGameMatcher import SpyGameMatcher
-    from .AssetAuditor import AssetAuditor
+    from .AssetAuditor import AssetAuditor, estimate_tokens
+    from .identity_cache import IdentityCache, db_fingerprint
+    from .exact_index import ExactNameIndex
+    from .reranker import CandidateReranker
 except ImportError:
     from LocalGameMatcher import SpyGameMatcher
-    from AssetAuditor import AssetAuditor
+    from AssetAuditor import AssetAuditor, estimate_tokens
+    from identity_cache import IdentityCache, db_fingerprint
+    from exact_index import ExactNameIndex
+    from reranker import CandidateReranker
 
 class GameRatingManager:
     def __init__(self, ai_handler=None):
         # 1. 初始化内部组件（AI 实例会自动在 Matcher 内部按需创建）
         self.matcher = SpyGameMatcher(ai_handler=ai_handler)
         self.auditor = AssetAuditor(ai_handler=self.matcher.ai)
+        # 2. 身份缓存：同一个标题的答案是稳定的，只跑一次完整漏斗
+        self.identity_cache = IdentityCache()
+        # 3. 精确名快速通道：英文原名一步到位，跳过两次 AI 调用
+        self.exact_index = ExactNameIndex()
+        # 4. 本地重排：缩小送审名单，领先足够大时直接免审
+        self.reranker = CandidateReranker(self.matcher)
+        self.stats = {
+            "lookups": 0, "cache_hits": 0, "fast_path_checks": 0, "fast_path_hits": 0, "funnel_runs": 0,
+            "audit_calls": 0, "audit_skips": 0, "audit_seconds": 0.0,
+            "prompt_tokens_full": 0, "prompt_tokens_sent": 0,
+        }
         self.is_ready = False
 
     def initialize(self):
         """一次性加载 6 万条索引，主程序启动时调用一次即可"""
         if self.matcher.initialize():
+            self.identity_cache.bind_database(self.matcher.spy_json_path)
+            self.exact_index.build(self.matcher.apps)
             self.is_ready = True
             return True
         return False
 
+    def refresh_database(self):
+        """
+        不整轮重启时由巡航循环调用：SteamSpy 库重新同步过 (指纹变化) 才重新载入索引、对齐身份缓存。
+        返回是否重新载入过。
+        """
+        if self.is_ready and db_fingerprint(self.matcher.spy_json_path) == self.identity_cache.fingerprint:
+            return False
+        print("♻️ [评分中心] SteamSpy 库已更新，重新载入索引...")
+        return self.initialize()
+
+    def get_metrics(self):
+        """导出给 Dashboard 的评分中心指标"""
+        s = self.stats
+        return {
+            **s,
+            "fast_path_hit_ratio": round(s["fast_path_hits"] / s["fast_path_checks"], 4) if s["fast_path_checks"] else 0.0,
+            "audit_seconds": round(s["audit_seconds"], 2),
+            "avg_audit_latency": round(s["audit_seconds"] / s["audit_calls"], 3) if s["audit_calls"] else 0.0,
+            # 全量 = 旧版 30 个候选全部送审时的体积；实发 = 重排后真正送出的体积
+            "prompt_token_saving": round(1 - s["prompt_tokens_sent"] / s["prompt_tokens_full"], 4) if s["prompt_tokens_full"] else 0.0,
+            "identity_cache_size": len(self.identity_cache),
+            "keyword_cache_size": len(self.matcher.keyword_cache),
+        }
+
+    def _fast_path(self, chinese_name):
+        """精确名唯一命中且库内有评分数据时直接返回 SUCCESS"""
+        self.stats["fast_path_checks"] += 1
+        appid = self.exact_index.lookup(chinese_name)
+        row = self.matcher.apps.row_of(appid) if appid else None
+        if row is None:
+            return None
+        self.stats["fast_path_hits"] += 1
+        return appid, self.matcher.describe_row(row), "SUCCESS"
+
     async def get_rating_and_id(self, chinese_name):
         """
         [总控函数] 输入中文名，直接输出 AppID 和 评价明细
@@ -36,19 +92,57 @@ class GameRatingManager:
         if not self.is_ready:
             return None, "引擎未初始化", "ERROR"
 
-        # Step 1: 捞鱼 (广撒网)
-        candidates = await self.matcher.fetch_candidates(chinese_name)
+        self.stats["lookups"] += 1
+        # Step 0: 身份缓存 (稳态下只有这一次字典读取)
+        cached = self.identity_cache.get(chinese_name)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        # Step 0.5: 精确名快速通道
+        fast = self._fast_path(chinese_name)
+        if fast is not None:
+            return fast
+
+        self.stats["funnel_runs"] += 1
+        appid, data, status = await self._run_funnel(chinese_name)
+        # 审计过程本身崩溃属于临时故障，不把它当成答案记下来
+        if not (status == "UNCERTAIN" and "审计过程异常" in str(data)):
+            self.identity_cache.put(chinese_name, appid, data, status)
+        return appid, data, status
+
+    async def _run_funnel(self, chinese_name):
+        """完整漏斗：AI 提词 -> 倒排检索 -> 本地重排 -> AI 审计"""
+        # Step 1: 捞鱼 (广撒网)，关键词留着给重排用
+        keywords = await self.matcher.extract_keywords(chinese_name)
+        candidates = self.matcher.rank_candidates(chinese_name, keywords)
         if not candidates:
             return None, "未找到候选资产", "MISSING"
 
+        # Step 1.5: 本地重排
+        full_tokens = estimate_tokens(self.auditor.build_prompt(chinese_name, candidates))
+        self.stats["prompt_tokens_full"] += full_tokens
+        if config.RERANK_CONFIG["ENABLED"]:
+            shortlist, decided = self.reranker.rerank(chinese_name, keywords, candidates)
+        else:
+            shortlist, decided = candidates, None
+
+        if decided is not None:
+            self.stats["audit_skips"] += 1
+            return decided['appid'], decided, "SUCCESS"
+
         # Step 2: 审计 (精判别)
-        final_id, reason = await self.auditor.audit(chinese_name, candidates)
+        self.stats["prompt_tokens_sent"] += full_tokens if shortlist is candidates else estimate_tokens(self.auditor.build_prompt(chinese_name, shortlist))
+        started = time.perf_counter()
+        final_id, reason = await self.auditor.audit(chinese_name, shortlist)
+        self.stats["audit_calls"] += 1
+        self.stats["audit_seconds"] += time.perf_counter() - started
 
         if final_id == "NONE" or not final_id:
             return None, f"识别弃权: {reason}", "UNCERTAIN"
 
         # Step 3: 数据提纯
-        target_info = next((c for c in candidates if str(c['appid']) == str(final_id)), None)
+        target_info = next((c for c in shortlist if str(c['appid']) == str(final_id)), None)
         
         if target_info:
             return final_id, target_info, "SUCCESS"
@@ -0,0 +1,152 @@
+import math
+import os
+import re
+import sys
+
+# 路径修复：确保能找到根目录的 config
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+import config
+
+# 审计 Prompt 第 3 条要排除的“非本体”资产
+EDITION_PATTERN = re.compile(r'\b(DLC|SOUNDTRACK|OST|PACK|BUNDLE|UPGRADE|SEASON PASS|ARTBOOK|DEMO|EXPANSION)\b')
+# 目标名里出现这些字样，说明用户要找的本来就是非本体，此时不扣分
+NON_BASE_HINTS = ("DLC", "扩展", "季票", "原声", "OST", "捆绑", "合集", "升级", "礼包", "资料片", "试玩")
+
+
+# 续作编号常写成罗马数字 (Dark Souls III)，数字一致性比较前统一换成阿拉伯数字
+ROMAN_NUMERALS = {"II": "2", "III": "3", "IV": "4", "V": "5", "VI": "6", "VII": "7", "VIII": "8", "IX": "9", "X": "10"}
+
+
+def _tokens(text):
+    return re.findall(r'[A-Z0-9]+', str(text).upper())
+
+
+def _digits(tokens):
+    return {t for t in tokens if t.isdigit()} | {ROMAN_NUMERALS[t] for t in tokens if t in ROMAN_NUMERALS}
+
+
+class CandidateReranker:
+    """
+    [漏斗第 1.5 层] 本地重排
+    在 fetch_candidates 与 AI 审计之间，用 BM25 + 数字一致性 + 版本惩罚 + 评论数先验给候选打分，
+    只把前 TOP_K 名送审；第一名遥遥领先时直接采信，连 AI 都不用叫。
+    """
+    def __init__(self, matcher, k1=1.2, b=0.75):
+        self.matcher = matcher
+        self.k1 = k1
+        self.b = b
+        self._avgdl = None
+
+    @property
+    def avgdl(self):
+        """库内平均文档长度（去重 token 数），直接由倒排表长度求和得到"""
+        if self._avgdl is None:
+            total = sum(len(rows) for rows in self.matcher.index.values())
+            self._avgdl = total / max(1, len(self.matcher.appids))
+        return self._avgdl
+
+    def idf(self, term):
+        n = len(self.matcher.appids)
+        df = len(self.matcher.index.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def score(self, query_name, keywords, candidate):
+        """返回 (总分, 关键词是否全覆盖, 是否非本体)"""
+        cfg = config.RERANK_CONFIG
+        doc = _tokens(candidate['name'])
+        doc_set = set(doc)
+        dl = len(doc_set)
+
+        # 1. BM25：关键词本身可能带标点 (如 COD:MW)，按 token 拆开逐个计分
+        bm25, covered = 0.0, True
+        for kw in keywords:
+            terms = _tokens(kw)
+            if not terms or not all(t in doc_set for t in terms):
+                covered = False
+            for t in terms:
+                tf = doc.count(t)
+                if tf:
+                    bm25 += self.idf(t) * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * dl / self.avgdl))
+
+        # 2. 数字一致性（冲突项已在检索层剔除，这里只奖励完全一致）
+        target_digits = set(re.findall(r'\d+', query_name)) | _digits([t for kw in keywords for t in _tokens(kw)])
+        cand_digits = _digits(doc)
+        digit_score = cfg["DIGIT_BONUS"] if target_digits and target_digits == cand_digits else 0.0
+
+        # 3. 非本体惩罚
+        upper_query = str(query_name).upper()
+        non_base = bool(EDITION_PATTERN.search(candidate['name'].upper())) and not any(h in upper_query for h in NON_BASE_HINTS)
+        penalty = cfg["EDITION_PENALTY"] if non_base else 0.0
+
+        # 4. 评论数先验：正传的评论数通常比外传 / DLC 高一个量级
+        prior = cfg["PRIOR_WEIGHT"] * math.log10(1 + candidate.get('review_count', 0))
+
+        return bm25 + digit_score - penalty + prior, covered, non_base
+
+    def rerank(self, query_name, keywords, candidates):
+        """
+        返回 (送审名单, 直接采信的候选或 None)
+        """
+        cfg = config.RERANK_CONFIG
+        if not candidates:
+            return [], None
+
+        scored = [(self.score(query_name, keywords, c), i, c) for i, c in enumerate(candidates)]
+        # 同分时保持检索层原有顺序
+        scored.sort(key=lambda x: (-x[0][0], x[1]))
+
+        (top_score, covered, non_base), _, top = scored[0]
+        runner_up = scored[1][0][0] if len(scored) > 1 else 0.0
+        if covered and not non_base and top_score - runner_up >= cfg["SKIP_MARGIN"]:
+            print(f"⚡ [本地重排] {top['name']} 领先 {top_score - runner_up:.1f} 分，免审采信。")
+            return [top], top
+
+        return [c for _, _, c in scored[:cfg["TOP_K"]]], None
+
+
+# ==========================================
+# 🚀 对比入口：python game_rating/reranker.py 名字1 名字2 ...
+# 同一批目标分别以“全量 30 个候选”和“重排后”送审，打印 token 与耗时
+# ==========================================
+if __name__ == "__main__":
+    import asyncio
+    import time
+    from game_rating.LocalGameMatcher import SpyGameMatcher
+    from game_rating.AssetAuditor import AssetAuditor, estimate_tokens
+
+    async def compare():
+        matcher = SpyGameMatcher()
+        if not matcher.initialize():
+            return
+        auditor = AssetAuditor(ai_handler=matcher.ai)
+        reranker = CandidateReranker(matcher)
+        names = sys.argv[1:] or ["人中之龙7", "生化危机4 重制版", "绝地潜兵 2", "黑暗之魂3"]
+
+        print("\n" + "=" * 88)
+        print(f"{'目标':<14} | {'全量 tok':>8} | {'全量(s)':>7} | {'重排 tok':>8} | {'重排(s)':>7} | {'全量结论':<10} | 重排结论")
+        print("-" * 88)
+        for name in names:
+            keywords = await matcher.extract_keywords(name)
+            candidates = matcher.rank_candidates(name, keywords)
+
+            t0 = time.perf_counter()
+            full_id, _ = await auditor.audit(name, candidates)
+            t_full = time.perf_counter() - t0
+            tok_full = estimate_tokens(auditor.build_prompt(name, candidates))
+
+            shortlist, decided = reranker.rerank(name, keywords, candidates)
+            t0 = time.perf_counter()
+            if decided:
+                new_id, tok_new = decided['appid'], 0
+            else:
+                new_id, _ = await auditor.audit(name, shortlist)
+                tok_new = estimate_tokens(auditor.build_prompt(name, shortlist)) if shortlist else 0
+            t_new = time.perf_counter() - t0
+
+            print(f"{name:<16} | {tok_full:>8} | {t_full:>7.2f} | {tok_new:>8} | {t_new:>7.2f} | {full_id:<10} | {new_id}{' (免审)' if decided else ''}")
+        print("=" * 88)
+
+    asyncio.run(compare())
@@ -0,0 +1,149 @@
+import asyncio
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+# 路径修复：确保能找到根目录的 config
+root_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if root_path not in sys.path:
+    sys.path.append(root_path)
+
+
+class SpyStandin:
+    """
+    [SteamSpy 替身] 本地起一个假的 api.php，供 SyncSpyData 联调 / 自检
+    - request=all&page=N：前 pages 页每页 per_page 条，之后返回空对象 (与 SteamSpy 一致)
+    - 每页带 ETag，If-None-Match 命中返回 304，用来验证增量同步
+    - 记录每个请求的发起时间与同时在途的峰值，用来验证礼貌限流
+    """
+    def __init__(self, pages=5, per_page=20, latency=0.05, port=8765):
+        self.pages = pages
+        self.per_page = per_page
+        self.latency = latency
+        self.port = port
+        self.library = {
+            str(appid): {"appid": appid, "name": f"Game {appid}", "positive": appid * 3, "negative": appid}
+            for appid in range(10, 10 + pages * per_page)
+        }
+        self.requests = []      # [(发起时间, 页码, 状态码)]
+        self.in_flight = 0
+        self.peak = 0
+        self._runner = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.port}/api.php"
+
+    def page_body(self, page):
+        appids = sorted(self.library, key=int)[page * self.per_page:(page + 1) * self.per_page]
+        return {aid: self.library[aid] for aid in appids}
+
+    def touch(self, appid, **fields):
+        """改动某个 App 的字段，模拟 SteamSpy 数据更新"""
+        self.library[str(appid)].update(fields)
+
+    async def handle(self, request):
+        page = int(request.query.get("page", 0))
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            started = time.monotonic()
+            await asyncio.sleep(self.latency)
+            body = json.dumps(self.page_body(page) if request.query.get("request") == "all" else {})
+            etag = '"%s"' % hashlib.sha1(body.encode("utf-8")).hexdigest()[:16]
+            status = 304 if request.headers.get("If-None-Match") == etag else 200
+            self.requests.append((started, page, status))
+            if status == 304:
+                return web.Response(status=304, headers={"ETag": etag})
+            return web.Response(text=body, content_type="application/json", headers={"ETag": etag})
+        finally:
+            self.in_flight -= 1
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/api.php", self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+        return self
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def reset_log(self):
+        self.requests = []
+        self.peak = 0
+
+
+# ==========================================
+# 🚀 本地自检：python game_rating/spy_standin.py [--serve]
+# 缺省：起替身 → 全量同步 → 改一条数据后增量同步，检查分页、空页止损、限流与 304 沿用
+# --serve：只起替身，另开终端跑 SyncSpyData.py --base-url http://127.0.0.1:8765/api.php
+# ==========================================
+if __name__ == "__main__":
+    from game_rating.SyncSpyData import SpySyncer
+
+    async def selftest():
+        concurrency, min_interval, pages = 2, 0.2, 5
+        standin = await SpyStandin(pages=pages, latency=0.5).start()  # 延迟大于间隔，才压得出并发
+        failures = []
+
+        def check(ok, label):
+            print(f"{'✅' if ok else '❌'} {label}")
+            if not ok:
+                failures.append(label)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            syncer = SpySyncer(base_url=standin.url,
+                               data_path=os.path.join(tmp, "steamspy_all.json"),
+                               manifest_path=os.path.join(tmp, "steamspy_manifest.json"),
+                               diff_path=os.path.join(tmp, "steamspy_diff.json"),
+                               concurrency=concurrency, min_interval=min_interval)
+
+            # 1. 全量：max_pages 故意给大，遇到空页后后面的分页不应再请求
+            diff = await syncer.sync(max_pages=pages + 10)
+            with open(syncer.data_path, 'r', encoding='utf-8') as f:
+                library = json.load(f)
+            requested = sorted(p for _, p, _ in standin.requests)
+            stamps = sorted(t for t, _, _ in standin.requests)
+            gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+            check(diff is not None and library == standin.library, f"全量同步拿到全部 {len(standin.library)} 条")
+            check(set(range(pages)) <= set(requested), f"前 {pages} 页都抓到了")
+            check(max(requested) < pages + concurrency, f"空页后止损，最多请求到第 {max(requested)} 页")
+            check(min(gaps) >= min_interval * 0.9, f"请求间隔 ≥ {min_interval}s (最小 {min(gaps):.3f}s)")
+            check(standin.peak <= concurrency, f"在途峰值 {standin.peak} ≤ 并发上限 {concurrency}")
+
+            # 2. 增量：只改第 1 页的一条，其余分页应走 304 沿用旧库
+            standin.reset_log()
+            standin.touch(10 + standin.per_page, positive=0)
+            diff = await syncer.sync(max_pages=pages + 10, incremental=True)
+            with open(syncer.data_path, 'r', encoding='utf-8') as f:
+                library = json.load(f)
+            not_modified = sum(1 for _, _, s in standin.requests if s == 304)
+            check(diff is not None and library == standin.library, "增量同步后与替身数据一致")
+            check(not_modified == pages - 1, f"未变化的 {pages - 1} 页走了 304 (实际 {not_modified})")
+            check(diff is not None and diff["modified"] == [str(10 + standin.per_page)], "diff 只报告改动的那一条")
+
+        await standin.stop()
+        print(f"\n{'🎉 自检通过' if not failures else f'💥 {len(failures)} 项未通过'}")
+        return not failures
+
+    async def serve():
+        standin = await SpyStandin().start()
+        print(f"🛰️ SteamSpy 替身已启动: {standin.url} (Ctrl+C 退出)")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await standin.stop()
+
+    if "--serve" in sys.argv[1:]:
+        asyncio.run(serve())
+    else:
+        sys.exit(0 if asyncio.run(selftest()) else 1)
@@ -0,0 +1,75 @@
+import json
+import sys
+import numpy as np
+
+
+class SpyRecord:
+    """单条 SteamSpy 资产的投影：评分漏斗只读这三个字段"""
+    __slots__ = ("name", "positive", "negative")
+
+    def __init__(self, name, positive, negative):
+        self.name = name
+        self.positive = positive
+        self.negative = negative
+
+
+def _project(obj):
+    """
+    json.load 的 object_hook：每条资产字典解析出来的瞬间就被压成 SpyRecord，
+    owners / price / developer / ccu 等字段根本不会在内存里长期存在。
+    """
+    if "name" in obj or "appid" in obj:
+        return SpyRecord(
+            sys.intern(str(obj.get("name", ""))),
+            obj.get("positive", 0),
+            obj.get("negative", 1),
+        )
+    return obj
+
+
+class SpyStore:
+    """
+    [精简列存] appid / name 为 Python 列表（名字做了字符串驻留），
+    好评/差评为 int32 数组，三者按行号对齐。
+    """
+    def __init__(self, appids, names, positive, negative):
+        self.appids = appids
+        self.names = names
+        self.positive = np.asarray(positive, dtype=np.int32)
+        self.negative = np.asarray(negative, dtype=np.int32)
+        self._row_of = None
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f, object_hook=_project)
+
+        n = len(records)
+        appids, names = [None] * n, [None] * n
+        positive = np.empty(n, dtype=np.int32)
+        negative = np.empty(n, dtype=np.int32)
+        for row, (appid, rec) in enumerate(records.items()):
+            appids[row] = str(appid)
+            names[row] = rec.name
+            positive[row] = rec.positive
+            negative[row] = rec.negative
+        del records
+        return cls(appids, names, positive, negative)
+
+    def row_of(self, appid):
+        """appid -> 行号，首次调用时才构建映射"""
+        if self._row_of is None:
+            self._row_of = {a: i for i, a in enumerate(self.appids)}
+        return self._row_of.get(str(appid))
+
+    def get(self, appid):
+        row = self.row_of(appid)
+        if row is None:
+            return None
+        return SpyRecord(self.names[row], int(self.positive[row]), int(self.negative[row]))
+
+    def __contains__(self, appid):
+        return self.row_of(appid) is not None
+
+    def __len__(self):
+        return len(self.appids)
@@ -0,0 +1,167 @@
+import base64
+import bisect
+import json
+import re
+
+from game_rating.name_utils import MANUAL_TAG
+
+# 缺值（'---'、'🔍 待核实' 等）统一排到最后
+MISSING = -1e18
+
+# 对外开放的字段（投影白名单）
+FIELDS = ("time", "ts", "name", "rating", "sk_price", "py_price", "profit", "status", "url", "reason", "roi")
+
+
+def parse_money(text):
+    """'¥15.50' -> 15.5；'---' 等无法解析时返回 None"""
+    m = re.search(r'-?\d+(?:\.\d+)?', str(text if text is not None else ""))
+    return float(m.group()) if m else None
+
+
+def parse_percent(text):
+    """'92%' / '12.5%' / 92 -> 数值；'⚠️ 审计跳过' -> None"""
+    if isinstance(text, (int, float)):
+        return float(text)
+    return parse_money(text) if '%' in str(text) else None
+
+
+def profit_value(entry, default=MISSING):
+    """历史记录的利润数值（排序 / 过滤共用）"""
+    v = parse_money(entry.get('profit'))
+    return default if v is None else v
+
+
+def entry_time(entry):
+    """优先用时间戳；老记录只有 HH:MM:SS，按当天秒数近似"""
+    if entry.get('ts'):
+        return float(entry['ts'])
+    m = re.match(r'(\d+):(\d+):(\d+)', str(entry.get('time', '')))
+    return float(int(m[1]) * 3600 + int(m[2]) * 60 + int(m[3])) if m else MISSING
+
+
+SORT_KEYS = {
+    "profit": profit_value,
+    "roi": lambda e: parse_percent(e.get('roi')) if parse_percent(e.get('roi')) is not None else MISSING,
+    "rating": lambda e: parse_percent(e.get('rating')) if parse_percent(e.get('rating')) is not None else MISSING,
+    "time": entry_time,
+}
+
+
+def _name_key(entry):
+    return str(entry.get('name', '')).replace(MANUAL_TAG, '').strip().casefold()
+
+
+def encode_cursor(sort, key):
+    raw = json.dumps([sort, key], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor):
+    sort, key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    return sort, tuple(key)
+
+
+class HistoryIndex:
+    """
+    [历史索引] 对巡航历史建排序索引，供 /api/history 分页查询
+    - 每个排序字段一份升序 (值, 时间, 名称, 行号) 数组，翻页用键集游标 + 二分定位，历史刷新后游标依然有效
+    - 状态分桶、利润有序数组、名称前缀有序数组，过滤时先用最窄的索引缩小候选集
+    历史列表整体替换时才重建（对象身份变化即视为新版本）。
+    """
+    def __init__(self):
+        self._source = None
+        self.entries = []
+        self.orders = {}
+        self.status_buckets = {}
+        self.names = []
+
+    def sync(self, entries):
+        if entries is self._source:
+            return
+        self._source = entries
+        self.entries = list(entries)
+        self.orders = {}
+        for field, fn in SORT_KEYS.items():
+            self.orders[field] = sorted(
+                (fn(e), entry_time(e), str(e.get('name', '')), i) for i, e in enumerate(self.entries)
+            )
+        self.status_buckets = {}
+        for i, e in enumerate(self.entries):
+            self.status_buckets.setdefault(str(e.get('status', '')), set()).add(i)
+        self.names = sorted((_name_key(e), i) for i, e in enumerate(self.entries))
+
+    # ---------- 过滤 ----------
+
+    def _candidates(self, status=None, min_profit=None, name_prefix=None):
+        """返回满足全部过滤条件的行号集合；没有任何过滤时返回 None（表示全部）"""
+        sets = []
+        if status:
+            ids = set()
+            for s, bucket in self.status_buckets.items():
+                if status in s:
+                    ids |= bucket
+            sets.append(ids)
+        if min_profit is not None:
+            order = self.orders["profit"]
+            start = bisect.bisect_left(order, (float(min_profit),))
+            sets.append({row[-1] for row in order[start:]})
+        if name_prefix:
+            prefix = name_prefix.strip().casefold()
+            start = bisect.bisect_left(self.names, (prefix,))
+            ids = set()
+            for key, i in self.names[start:]:
+                if not key.startswith(prefix):
+                    break
+                ids.add(i)
+            sets.append(ids)
+        if not sets:
+            return None
+        sets.sort(key=len)
+        result = sets[0]
+        for other in sets[1:]:
+            result = result & other
+        return result
+
+    # ---------- 查询 ----------
+
+    def query(self, sort="profit", order="desc", cursor=None, limit=20,
+              status=None, min_profit=None, name_prefix=None, fields=None):
+        if sort not in SORT_KEYS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        rows = self.orders[sort]
+        allowed = self._candidates(status, min_profit, name_prefix)
+        limit = max(1, min(int(limit), 100))
+        projection = [f for f in (fields or FIELDS) if f in FIELDS]
+
+        # 游标定位：上一页最后一条的排序键，严格在它之后开始
+        if cursor:
+            cursor_sort, last = decode_cursor(cursor)
+            if cursor_sort != sort:
+                raise ValueError("游标与排序字段不一致")
+            pos = bisect.bisect_left(rows, last) - 1 if order == "desc" else bisect.bisect_right(rows, last)
+        else:
+            pos = len(rows) - 1 if order == "desc" else 0
+        step = -1 if order == "desc" else 1
+
+        items, last_key = [], None
+        while 0 <= pos < len(rows) and len(items) < limit:
+            row = rows[pos]
+            pos += step
+            if allowed is not None and row[-1] not in allowed:
+                continue
+            entry = self.entries[row[-1]]
+            items.append({f: entry.get(f) for f in projection})
+            last_key = list(row)
+
+        has_more = False
+        while 0 <= pos < len(rows):
+            if allowed is None or rows[pos][-1] in allowed:
+                has_more = True
+                break
+            pos += step
+
+        return {
+            "total": len(self.entries) if allowed is None else len(allowed),
+            "items": items,
+            "next_cursor": encode_cursor(sort, last_key) if has_more and last_key else None,
+        }
@@ -0,0 +1,238 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import time
+import uuid
+
+import config
+from event_bus import bus
+
+QUEUED, RUNNING, SUCCESS, FAILED, CANCELLED = "QUEUED", "RUNNING", "SUCCESS", "FAILED", "CANCELLED"
+FINISHED = (SUCCESS, FAILED, CANCELLED)
+
+
+def dedup_digest(key):
+    """去重键只存摘要：上架任务的去重键就是 CDKEY，原文不能出现在 /api/jobs、SSE 和 jobs.json 里"""
+    return hashlib.sha256(str(key).encode('utf-8')).hexdigest()[:16]
+
+
+class Job:
+    """一个后台任务：类型 + 参数 + 状态 / 进度；handler 通过 report() 汇报进度"""
+    __slots__ = ("id", "type", "payload", "priority", "dedup_key", "status", "progress", "message",
+                 "result", "error", "created_at", "started_at", "finished_at", "_queue", "_seq")
+
+    def __init__(self, type, payload, priority, dedup_key=None, id=None, created_at=None):
+        self.id = id or uuid.uuid4().hex[:12]
+        self.type = type
+        self.payload = payload
+        self.priority = priority
+        self.dedup_key = dedup_key
+        self.status = QUEUED
+        self.progress = 0
+        self.message = "排队中"
+        self.result = None
+        self.error = None
+        self.created_at = created_at or time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._queue = None
+        self._seq = None       # 入队序号，同优先级先到先出
+
+    def report(self, progress=None, message=None):
+        if progress is not None:
+            self.progress = max(0, min(100, int(progress)))
+        if message is not None:
+            self.message = message
+        if self._queue:
+            self._queue._changed(self)
+
+    def to_dict(self, with_payload=False):
+        data = {k: getattr(self, k) for k in self.__slots__ if not k.startswith("_") and k != "payload"}
+        if with_payload:
+            data["payload"] = self.payload
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls(data["type"], data.get("payload") or {}, data.get("priority", 0), data.get("dedup_key"),
+                  id=data["id"], created_at=data.get("created_at"))
+        for k in ("status", "progress", "message", "result", "error", "started_at", "finished_at"):
+            setattr(job, k, data.get(k, getattr(job, k)))
+        return job
+
+
+class JobQueue:
+    """
+    [任务队列] 取代散落各处的 asyncio.create_task
+    - 每种任务一个优先级队列 + 固定数量的 worker，突发 50 个上架请求也是按优先级、先来后到逐个消化
+    - 同类型同 dedup_key 的任务在排队 / 执行中时不会重复创建，直接返回已有任务
+    - 排队中的任务连同参数持久化到 JSON (data/ 不入库)，重启后自动重新排队；
+      执行中被打断的只有可重放的类型 (JOB_CONFIG["RETRY_ON_RESTART"]) 才重新排队，其余记为失败待人工确认
+    - 状态变化广播 job 事件，看板和 /api/jobs 可以实时看到进度
+    """
+    def __init__(self, path=None):
+        cfg = config.JOB_CONFIG
+        self.path = path or cfg["PATH"]
+        self.jobs = {}
+        self.handlers = {}     # type -> (handler, workers, default_priority)
+        self.queues = {}
+        self.workers = []
+        self._seq = itertools.count()
+        self._save_task = None
+        self._dirty = False
+        self._load()
+
+    def register(self, type, handler, workers=None, priority=None):
+        """handler: async def handler(job) -> 可 JSON 序列化的结果"""
+        cfg = config.JOB_CONFIG
+        self.handlers[type] = (handler, workers or cfg["WORKERS"].get(type, 1),
+                               cfg["PRIORITY"].get(type, 10) if priority is None else priority)
+
+    def start(self):
+        """为每种任务拉起 worker，并把持久化下来的排队任务重新入队"""
+        for type, (_, workers, _) in self.handlers.items():
+            self.queues[type] = asyncio.PriorityQueue()
+            for i in range(workers):
+                self.workers.append(asyncio.create_task(self._worker(type, i)))
+        retry = config.JOB_CONFIG["RETRY_ON_RESTART"]
+        for job in sorted(self.jobs.values(), key=lambda j: j.created_at):
+            if job.type not in self.queues:
+                continue
+            if job.status == QUEUED:
+                job.message = "服务重启后重新排队"
+                self._enqueue(job)
+            elif job.status == RUNNING and retry.get(job.type, True):
+                job.status, job.message = QUEUED, "执行中被打断，服务重启后重新排队"
+                self._enqueue(job)
+                self._changed(job)
+            elif job.status == RUNNING:
+                # 上架这类任务重放可能把同一个 CDKEY 挂两次，只能交给人确认
+                job.status, job.finished_at = FAILED, time.time()
+                job.message = job.error = "执行中被打断，需人工确认"
+                self._changed(job)
+
+    # ---------- 提交 / 查询 ----------
+
+    def submit(self, type, payload, priority=None, dedup_key=None):
+        """返回 (job, 是否为新建)；相同任务还没跑完时返回已有的那个"""
+        if type not in self.handlers:
+            raise ValueError(f"未注册的任务类型: {type}")
+        if dedup_key is not None:
+            dedup_key = dedup_digest(dedup_key)
+            for job in self.jobs.values():
+                if job.type == type and job.dedup_key == dedup_key and job.status not in FINISHED:
+                    return job, False
+        job = Job(type, payload, self.handlers[type][2] if priority is None else priority, dedup_key)
+        self.jobs[job.id] = job
+        self._enqueue(job)
+        self._changed(job)
+        return job, True
+
+    def _enqueue(self, job):
+        job._queue = self
+        job._seq = next(self._seq)
+        self.queues[job.type].put_nowait((job.priority, job._seq, job.id))
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self, status=None, type=None, limit=50):
+        jobs = [j for j in self.jobs.values() if (not status or j.status == status) and (not type or j.type == type)]
+        jobs.sort(key=lambda j: j.created_at, reverse=True)
+        return jobs[:limit]
+
+    def position(self, job):
+        """排队中的任务前面还有几个 (同类型、优先级更高或同级先到)"""
+        if job.status != QUEUED:
+            return 0
+        return sum(1 for j in self.jobs.values() if j.type == job.type and j.status == QUEUED
+                   and j._seq is not None and (j.priority, j._seq) < (job.priority, job._seq))
+
+    def cancel(self, job_id):
+        """只能取消还在排队的任务；出队时发现已取消会直接跳过"""
+        job = self.jobs.get(job_id)
+        if not job or job.status != QUEUED:
+            return False
+        job.status, job.message, job.finished_at = CANCELLED, "已取消", time.time()
+        self._changed(job)
+        return True
+
+    def get_metrics(self):
+        counts = {}
+        for job in self.jobs.values():
+            counts.setdefault(job.type, {}).setdefault(job.status, 0)
+            counts[job.type][job.status] += 1
+        return {"by_type": counts, "workers": {t: h[1] for t, h in self.handlers.items()}}
+
+    # ---------- 执行 ----------
+
+    async def _worker(self, type, index):
+        handler = self.handlers[type][0]
+        queue = self.queues[type]
+        while True:
+            _, _, job_id = await queue.get()
+            job = self.jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                continue
+            job.status, job.started_at, job.message = RUNNING, time.time(), "执行中"
+            self._changed(job)
+            try:
+                job.result = await handler(job)
+                job.status, job.progress, job.message = SUCCESS, 100, "完成"
+            except asyncio.CancelledError:
+                # 服务关闭：保持 RUNNING 落盘，下次启动重新排队
+                self._changed(job)
+                raise
+            except Exception as e:
+                job.status, job.error, job.message = FAILED, str(e)[:300], "失败"
+                print(f"🚨 [任务队列] {type}#{job.id} 失败: {e}")
+            job.finished_at = time.time()
+            self._changed(job)
+
+    # ---------- 持久化 ----------
+
+    def _changed(self, job):
+        bus.publish("job", job.to_dict())
+        # 合并短时间内的多次变化，只写一次盘；写盘途中又有变化时由 _dirty 触发补写
+        self._dirty = True
+        if self._save_task is None or self._save_task.done():
+            try:
+                self._save_task = asyncio.get_running_loop().create_task(self._save_soon())
+            except RuntimeError:
+                self._write(self._snapshot())
+
+    async def _save_soon(self):
+        while self._dirty:
+            await asyncio.sleep(0.2)
+            self._dirty = False
+            # 快照在事件循环里取，线程池只负责写文件
+            await asyncio.to_thread(self._write, self._snapshot())
+
+    def _snapshot(self):
+        """已结束的任务只保留最近一批 (且不再保留参数，CDKEY 不会长期躺在盘上)，顺手从内存里清掉更早的"""
+        keep = config.JOB_CONFIG["KEEP_FINISHED"]
+        active = [j for j in self.jobs.values() if j.status not in FINISHED]
+        finished = sorted((j for j in self.jobs.values() if j.status in FINISHED),
+                          key=lambda j: j.finished_at or 0, reverse=True)[:keep]
+        self.jobs = {j.id: j for j in active + finished}
+        return [j.to_dict(with_payload=j.status not in FINISHED) for j in active + finished]
+
+    def _write(self, rows):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for data in json.load(f):
+                    job = Job.from_dict(data)
+                    self.jobs[job.id] = job
+        except Exception as e:
+            print(f"⚠️ [任务队列] 任务文件损坏，已忽略: {e}")
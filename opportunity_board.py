@@ -0,0 +1,84 @@
+import heapq
+import itertools
+import time
+
+import config
+from history_index import profit_value
+
+
+class OpportunityBoard:
+    """
+    [机会榜] 按利润实时排序的去重榜单，取代每轮结束时的整表重排
+    - 每个游戏名只保留最新一条观测，更新是一次 O(log n) 的入堆，旧条目留在堆里惰性删除
+    - 超过 TTL 没再被观测到的条目自动过期（按过期时间另建一个小顶堆）
+    - top(k) 只弹出前 k 个有效条目再放回，结果按版本缓存
+    """
+    def __init__(self, capacity=None, ttl=None, max_entries=None):
+        cfg = config.OPPORTUNITY_CONFIG
+        self.capacity = capacity or cfg["CAPACITY"]
+        self.ttl = ttl or cfg["TTL"]
+        self.max_entries = max_entries or cfg["MAX_ENTRIES"]
+        self.entries = {}       # name -> (seq, entry, expires_at)
+        self._heap = []         # (-利润, -时间戳, seq, name)
+        self._expiry = []       # (expires_at, seq, name)
+        self._seq = itertools.count()
+        self.version = 0
+        self._top_cache = (None, None)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, entry, now=None):
+        """登记一条新结果；同名旧条目就地作废"""
+        now = now or time.time()
+        name = entry.get('name')
+        seq = next(self._seq)
+        ts = float(entry.get('ts') or now)
+        expires_at = ts + self.ttl
+        self.entries[name] = (seq, entry, expires_at)
+        heapq.heappush(self._heap, (-profit_value(entry, default=-999.0), -ts, seq, name))
+        heapq.heappush(self._expiry, (expires_at, seq, name))
+        self.version += 1
+        self._evict(now)
+
+    def discard(self, name):
+        if self.entries.pop(name, None) is not None:
+            self.version += 1
+
+    def _alive(self, seq, name):
+        current = self.entries.get(name)
+        return current is not None and current[0] == seq
+
+    def _evict(self, now):
+        """过期清理 + 条目数封顶 (先淘汰最早过期的)；堆里作废条目过多时重建"""
+        while self._expiry and (self._expiry[0][0] <= now or len(self.entries) > self.max_entries):
+            _, seq, name = heapq.heappop(self._expiry)
+            if self._alive(seq, name):
+                del self.entries[name]
+                self.version += 1
+        if len(self._heap) > 2 * len(self.entries) + 64:
+            self._heap = [item for item in self._heap if self._alive(item[2], item[3])]
+            heapq.heapify(self._heap)
+            self._expiry = [item for item in self._expiry if self._alive(item[1], item[2])]
+            heapq.heapify(self._expiry)
+
+    def top(self, k=None, now=None):
+        """利润从高到低的前 k 条 (默认 capacity)；同一版本重复调用直接返回缓存的列表对象"""
+        k = k or self.capacity
+        self._evict(now or time.time())
+        version, cached = self._top_cache
+        if version == (self.version, k):
+            return cached
+
+        picked, popped = [], []
+        while self._heap and len(picked) < k:
+            item = heapq.heappop(self._heap)
+            if self._alive(item[2], item[3]):
+                popped.append(item)
+                picked.append(self.entries[item[3]][1])
+        # 有效条目放回去，作废条目就此丢弃
+        for item in popped:
+            heapq.heappush(self._heap, item)
+
+        self._top_cache = ((self.version, k), picked)
+        return picked
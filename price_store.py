@@ -0,0 +1,203 @@
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import config
+from game_rating.name_utils import MANUAL_TAG, normalize_name
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY,
+    sku TEXT NOT NULL,
+    name TEXT,
+    ts REAL NOT NULL,
+    sonkwo_price REAL,
+    steampy_top TEXT,      -- JSON 数组：SteamPy 前 N 名报价
+    steampy_best REAL,
+    profit REAL,           -- 审计未通过时为 NULL
+    verdict TEXT,
+    entry TEXT             -- 原始 log_entry，生成历史视图用
+);
+CREATE INDEX IF NOT EXISTS idx_obs_sku_ts ON observations(sku, ts);
+CREATE INDEX IF NOT EXISTS idx_obs_ts ON observations(ts);
+"""
+
+
+def _numbers(text):
+    return [float(x) for x in re.findall(r'-?\d+(?:\.\d+)?', str(text if text is not None else ""))]
+
+
+def sku_of(entry):
+    """优先用杉果详情页的 sku 编号；没有链接时退回归一化名称"""
+    m = re.search(r'/sku/(\d+)', str(entry.get('url', '')))
+    if m:
+        return f"sonkwo:{m.group(1)}"
+    return f"name:{normalize_name(str(entry.get('name', '')).replace(MANUAL_TAG, ''))}"
+
+
+class PriceStore:
+    """
+    [价格时序库] 每一次比价观测都落进 SQLite，不再只留利润前 100
+    - WAL 模式 + (sku, ts) 索引：巡航写入与看板查询互不阻塞
+    - record 只进内存缓冲；攒够一批或定时由线程池批量写入，事件循环里没有磁盘 IO
+    - arbitrage_history.json 退化为“每个 sku 最新一条、按利润排序”的视图导出
+    """
+    def __init__(self, db_path=None):
+        cfg = config.PRICE_STORE_CONFIG
+        self.db_path = db_path or cfg["DB_PATH"]
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        # 写批次与查询都在线程池里跑，同一连接上串行执行
+        self._lock = threading.Lock()
+        self._pending = []
+        self._flushing = None
+        self.stats = {"recorded": 0, "written": 0, "batches": 0}
+
+    # ---------- 写入 ----------
+
+    def record(self, entry, sonkwo_price=None, steampy_top=None):
+        """登记一条观测 (只进缓冲区，不碰磁盘)；价格缺省时从 log_entry 的展示字符串里解析"""
+        top = [float(p) for p in steampy_top] if steampy_top else _numbers(entry.get('py_price'))
+        sk = sonkwo_price if sonkwo_price is not None else next(iter(_numbers(entry.get('sk_price'))), None)
+        profit = _numbers(entry.get('profit'))
+        self._pending.append((
+            sku_of(entry), entry.get('name'), float(entry.get('ts') or time.time()), sk,
+            json.dumps(top), min(top) if top else None, profit[0] if profit else None,
+            entry.get('status'), json.dumps(entry, ensure_ascii=False),
+        ))
+        self.stats["recorded"] += 1
+        if len(self._pending) >= config.PRICE_STORE_CONFIG["BATCH_SIZE"]:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._write(self._take())
+            return
+        if self._flushing is None or self._flushing.done():
+            self._flushing = loop.create_task(self.flush())
+
+    def _take(self):
+        batch, self._pending = self._pending, []
+        return batch
+
+    async def flush(self):
+        batch = self._take()
+        if batch:
+            await asyncio.to_thread(self._write, batch)
+
+    async def aclose(self):
+        """关停：等在途的批次写完，把缓冲区剩下的观测刷进库，再关连接"""
+        if self._flushing is not None and not self._flushing.done():
+            await self._flushing
+        await self.flush()
+        with self._lock:
+            self.conn.close()
+
+    def _write(self, batch):
+        if not batch:
+            return
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO observations (sku, name, ts, sonkwo_price, steampy_top, steampy_best, profit, verdict, entry) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+        self.stats["written"] += len(batch)
+        self.stats["batches"] += 1
+
+    async def run(self):
+        """常驻任务：定时把缓冲区刷进库"""
+        while True:
+            await asyncio.sleep(config.PRICE_STORE_CONFIG["FLUSH_INTERVAL"])
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"🚨 [价格库] 批量写入失败: {e}")
+
+    def import_history(self, path):
+        """库为空时，把旧版 arbitrage_history.json 作为种子导入 (老记录没有时间戳，用文件修改时间)"""
+        with self._lock:
+            if self.conn.execute("SELECT 1 FROM observations LIMIT 1").fetchone():
+                return 0
+        if not os.path.exists(path):
+            return 0
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except Exception as e:
+            print(f"⚠️ [价格库] 旧历史读取失败，跳过导入: {e}")
+            return 0
+        mtime = os.path.getmtime(path)
+        for entry in entries:
+            self.record({**entry, "ts": entry.get("ts") or mtime})
+        self._write(self._take())
+        print(f"📦 [价格库] 已从 {os.path.basename(path)} 导入 {len(entries)} 条观测")
+        return len(entries)
+
+    # ---------- 查询 ----------
+
+    def _query(self, sql, args=()):
+        with self._lock:
+            return self.conn.execute(sql, args).fetchall()
+
+    def resolve_sku(self, name):
+        """按展示名找最近一次观测用的 sku (有详情页链接的商品 sku 不是名字)"""
+        rows = self._query("SELECT sku FROM observations WHERE name = ? ORDER BY ts DESC LIMIT 1", (name,))
+        return rows[0][0] if rows else sku_of({"name": name})
+
+    def trajectory(self, sku, since=None, limit=500):
+        """某个 sku 的价格轨迹 (按时间升序)"""
+        rows = self._query(
+            "SELECT ts, sonkwo_price, steampy_best, steampy_top, profit, verdict FROM observations "
+            "WHERE sku = ? AND ts >= ? ORDER BY ts DESC LIMIT ?", (sku, since or 0, limit))
+        return [{"ts": ts, "sonkwo_price": sk, "steampy_best": best, "steampy_top": json.loads(top or "[]"),
+                 "profit": profit, "verdict": verdict} for ts, sk, best, top, profit, verdict in reversed(rows)]
+
+    def price_range(self, sku):
+        """某个 sku 的历史最低 / 最高价与观测次数"""
+        row = self._query(
+            "SELECT MIN(sonkwo_price), MAX(sonkwo_price), MIN(steampy_best), MAX(steampy_best), "
+            "COUNT(*), MIN(ts), MAX(ts), MAX(name) FROM observations WHERE sku = ?", (sku,))[0]
+        keys = ("sonkwo_min", "sonkwo_max", "steampy_min", "steampy_max", "observations", "first_seen", "last_seen", "name")
+        return dict(zip(keys, row))
+
+    def recent_deltas(self, hours=24, limit=50):
+        """最近 N 小时内价格发生变化的观测：与同 sku 的上一条比较，按变动幅度排序"""
+        since = time.time() - hours * 3600
+        rows = self._query("""
+            SELECT sku, name, ts, sonkwo_price, prev_sonkwo, steampy_best, prev_steampy FROM (
+                SELECT sku, name, ts, sonkwo_price, steampy_best,
+                       LAG(sonkwo_price) OVER w AS prev_sonkwo,
+                       LAG(steampy_best) OVER w AS prev_steampy
+                FROM observations WHERE sku IN (SELECT DISTINCT sku FROM observations WHERE ts >= ?)
+                WINDOW w AS (PARTITION BY sku ORDER BY ts)
+            )
+            WHERE ts >= ? AND (sonkwo_price IS NOT prev_sonkwo OR steampy_best IS NOT prev_steampy)
+              AND (prev_sonkwo IS NOT NULL OR prev_steampy IS NOT NULL)
+            ORDER BY ABS(COALESCE(sonkwo_price - prev_sonkwo, 0)) + ABS(COALESCE(steampy_best - prev_steampy, 0)) DESC
+            LIMIT ?""", (since, since, limit))
+        return [{
+            "sku": sku, "name": name, "ts": ts,
+            "sonkwo_price": sk, "sonkwo_delta": None if sk is None or prev_sk is None else round(sk - prev_sk, 2),
+            "steampy_best": best, "steampy_delta": None if best is None or prev_best is None else round(best - prev_best, 2),
+        } for sku, name, ts, sk, prev_sk, best, prev_best in rows]
+
+    def latest_view(self, limit=None):
+        """每个 sku 最新的一条观测，按利润从高到低 (审计未通过的排在最后) —— 即历史视图"""
+        limit = limit or config.PRICE_STORE_CONFIG["HISTORY_VIEW"]
+        # SQLite 的 MAX() 聚合会让同一行的其它裸列取自最大值所在行，一次 GROUP BY 即可拿到最新观测
+        rows = self._query("""
+            SELECT entry FROM (SELECT entry, profit, MAX(ts) FROM observations GROUP BY sku)
+            ORDER BY profit IS NULL, profit DESC LIMIT ?""", (limit,))
+        return [json.loads(entry) for (entry,) in rows]
+
+    def get_metrics(self):
+        count = self._query("SELECT COUNT(*), COUNT(DISTINCT sku) FROM observations")[0]
+        return {**self.stats, "pending": len(self._pending), "observations": count[0], "skus": count[1]}
@@ -0,0 +1,75 @@
+import asyncio
+import collections
+import time
+
+import config
+
+
+class RequestCoalescer:
+    """
+    [请求合并] 单飞 (single-flight) + 短 TTL 结果缓存
+    - 同一个 key 同时只跑一个任务，后来的请求直接等这个任务的结果 (coalesced)
+    - 结果在 TTL 内直接复用 (cached)；失败不缓存，所有等待者一起收到异常
+    - 任务用 shield 包住：最先发起的那个请求断开了，其他人等的任务也不会被取消
+    """
+    def __init__(self, name, ttl=None, max_entries=None):
+        cfg = config.CHECK_CACHE_CONFIG
+        self.name = name
+        self.ttl = ttl or cfg["TTL"]
+        self.max_entries = max_entries or cfg["MAX_ENTRIES"]
+        self.cache = collections.OrderedDict()   # key -> (expires_at, result)
+        self.inflight = {}
+        self.stats = {"requests": 0, "cached": 0, "coalesced": 0, "executed": 0, "errors": 0}
+
+    async def run(self, key, factory, ttl_of=None):
+        """
+        返回 (结果, 来源)，来源为 "cached" / "coalesced" / "fresh"
+        factory: 无参协程函数；ttl_of: 按结果决定缓存时长 (秒，0 表示不缓存)，缺省用 self.ttl
+        """
+        self.stats["requests"] += 1
+        hit = self.cache.get(key)
+        if hit and hit[0] > time.time():
+            self.cache.move_to_end(key)
+            self.stats["cached"] += 1
+            return hit[1], "cached"
+
+        task = self.inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task), "coalesced"
+
+        task = asyncio.ensure_future(factory())
+        self.inflight[key] = task
+        task.add_done_callback(lambda t: self._settle(key, t, ttl_of))
+        self.stats["executed"] += 1
+        return await asyncio.shield(task), "fresh"
+
+    def _settle(self, key, task, ttl_of):
+        """任务结束时 (无论调用方是否还在等) 清理在途表并写缓存"""
+        if self.inflight.get(key) is task:
+            del self.inflight[key]
+        if task.cancelled() or task.exception() is not None:
+            self.stats["errors"] += 1
+            return
+        result = task.result()
+        ttl = ttl_of(result) if ttl_of else self.ttl
+        if ttl > 0:
+            self.cache[key] = (time.time() + ttl, result)
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.max_entries:
+                self.cache.popitem(last=False)
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.cache.clear()
+        else:
+            self.cache.pop(key, None)
+
+    def get_metrics(self):
+        s = self.stats
+        return {
+            **s,
+            "saved_ratio": round((s["cached"] + s["coalesced"]) / s["requests"], 4) if s["requests"] else 0.0,
+            "inflight": len(self.inflight),
+            "cache_size": len(self.cache),
+        }
@@ -0,0 +1,178 @@
+import asyncio
+import collections
+import json
+import os
+import time
+
+import config
+
+# CDP Performance.getMetrics 里关心的三项
+WATCHED = ("JSHeapUsedSize", "Nodes", "JSEventListeners")
+
+
+class TabMonitor:
+    """
+    [标签页体检] 取代“每轮把两个浏览器整个重启”的一刀切回收
+    - 定时通过 CDP (Performance.getMetrics) 采样每个长驻标签页的 JS 堆、DOM 节点数、事件监听器数
+    - 连续 BREACHES 次超过阈值才判定泄漏，在该标签页对应的锁里换一个新页面、回到原来的 URL，
+      持有者 (监视器 / 交互通道) 的 page 属性原地替换，调用方无感
+    - 每次采样追加到 TREND_PATH (JSON Lines)，内存里保留最近一段算增长斜率，/api/metrics 可看
+    """
+    def __init__(self, commander):
+        cfg = config.TAB_MONITOR_CONFIG
+        self.commander = commander
+        self.path = os.path.join(config.PROJECT_ROOT, cfg["TREND_PATH"])
+        self.trends = {}        # 标签名 -> deque[(ts, heap_mb, nodes, listeners)]
+        self.breaches = {}      # 标签名 -> 连续超限次数
+        self._sessions = {}     # id(page) -> (page, CDPSession)
+        self._task = None
+        self.stats = {"samples": 0, "recycles": 0, "errors": 0, "last_recycle": None}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    def tabs(self):
+        """当前要体检的标签页：(标签名, 持有者, 对应的锁)；持有者的 .page 就是那个标签页"""
+        c = self.commander
+        tabs = [("sonkwo", c.sonkwo, c.lock), ("steampy", c.steampy, c.lock)]
+        for name, twin in (c.lanes or {}).items():
+            tabs.append((f"lane:{name}", twin, c.interactive_lock))
+        return [t for t in tabs if getattr(t[1], "page", None) is not None]
+
+    # ---------- 采样 ----------
+
+    async def _session(self, page):
+        hit = self._sessions.get(id(page))
+        if hit and hit[0] is page:
+            return hit[1]
+        session = await page.context.new_cdp_session(page)
+        await session.send("Performance.enable")
+        self._sessions[id(page)] = (page, session)
+        return session
+
+    async def sample(self, page):
+        """返回 {JSHeapUsedSize, Nodes, JSEventListeners}；页面已关闭返回 None"""
+        if page.is_closed():
+            self._sessions.pop(id(page), None)
+            return None
+        session = await self._session(page)
+        result = await session.send("Performance.getMetrics")
+        values = {m["name"]: m["value"] for m in result.get("metrics", [])}
+        return {k: values.get(k, 0) for k in WATCHED}
+
+    def _over(self, metrics):
+        cfg = config.TAB_MONITOR_CONFIG
+        return (metrics["JSHeapUsedSize"] / 1048576 > cfg["HEAP_MB"]
+                or metrics["Nodes"] > cfg["NODES"]
+                or metrics["JSEventListeners"] > cfg["LISTENERS"])
+
+    async def check_once(self):
+        """体检一遍所有标签页，超限的就地回收；返回本次的采样行"""
+        cfg = config.TAB_MONITOR_CONFIG
+        rows = []
+        for name, owner, lock in self.tabs():
+            try:
+                metrics = await self.sample(owner.page)
+            except Exception as e:
+                # 采样失败多半是页面正在跳转，下一轮再说
+                self.stats["errors"] += 1
+                self._sessions.pop(id(owner.page), None)
+                print(f"⚠️ [标签页体检] {name} 采样失败: {e}")
+                continue
+            if metrics is None:
+                continue
+            now = time.time()
+            heap_mb = round(metrics["JSHeapUsedSize"] / 1048576, 2)
+            self.trends.setdefault(name, collections.deque(maxlen=cfg["TREND_KEEP"])).append(
+                (now, heap_mb, int(metrics["Nodes"]), int(metrics["JSEventListeners"])))
+            rows.append({"ts": now, "tab": name, "heap_mb": heap_mb,
+                         "nodes": int(metrics["Nodes"]), "listeners": int(metrics["JSEventListeners"])})
+            self.stats["samples"] += 1
+
+            self.breaches[name] = self.breaches.get(name, 0) + 1 if self._over(metrics) else 0
+            if self.breaches[name] >= cfg["BREACHES"]:
+                print(f"♻️ [标签页体检] {name} 超限 (堆 {heap_mb}MB / 节点 {int(metrics['Nodes'])} / "
+                      f"监听器 {int(metrics['JSEventListeners'])})，准备换页")
+                if await self.recycle(name, owner, lock):
+                    rows[-1]["recycled"] = True
+        if rows:
+            await asyncio.to_thread(self._append, rows)
+        return rows
+
+    # ---------- 回收 ----------
+
+    async def recycle(self, name, owner, lock):
+        """
+        在该标签页的锁里换页：同一上下文开新页 → 回到旧 URL → 替换持有者的 page → 关旧页。
+        借用上下文期间引擎不会被重启；新页打不开就保留旧页，下一轮再试。
+        """
+        async with self.commander.pin_contexts(timeout=config.INTERACTIVE_CONFIG["READY_TIMEOUT"]), lock:
+            old = owner.page
+            url = old.url if old.url.startswith("http") else None
+            new = await old.context.new_page()
+            try:
+                if url:
+                    await new.goto(url, wait_until="domcontentloaded", timeout=60000)
+            except Exception as e:
+                print(f"⚠️ [标签页体检] {name} 新页恢复到 {url} 失败，继续用旧页: {e}")
+                await new.close()
+                return False
+            owner.page = new
+            self._sessions.pop(id(old), None)
+            try:
+                await old.close()
+            except Exception:
+                pass
+        # 斜率只描述当前这一页；旧页的历史已经导出在 TREND_PATH 里
+        self.breaches[name] = 0
+        self.trends.pop(name, None)
+        self.stats["recycles"] += 1
+        self.stats["last_recycle"] = {"tab": name, "ts": time.time(), "url": url}
+        print(f"✅ [标签页体检] {name} 已换新页并恢复到原位置")
+        return True
+
+    # ---------- 常驻循环 / 导出 ----------
+
+    async def run(self):
+        interval = config.TAB_MONITOR_CONFIG["INTERVAL"]
+        while True:
+            await asyncio.sleep(interval)
+            # 引擎重启中 (上下文没就绪) 就跳过这一拍
+            if not self.commander.contexts_ready.is_set():
+                continue
+            try:
+                await self.check_once()
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"⚠️ [标签页体检] 本轮体检异常: {e}")
+
+    def _append(self, rows):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for row in rows:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+    def healthy(self):
+        """整轮重启可以省掉的前提：浏览器还活着、上下文就绪、最近一拍没有标签页处于超限状态"""
+        return (self.commander.runtime.running and self.commander.contexts_ready.is_set()
+                and not any(self.breaches.values()))
+
+    @staticmethod
+    def _slope(points):
+        """最小二乘斜率：每小时增长多少 MB"""
+        if len(points) < 2:
+            return 0.0
+        xs = [p[0] for p in points]
+        ys = [p[1] for p in points]
+        mx, my = sum(xs) / len(xs), sum(ys) / len(ys)
+        den = sum((x - mx) ** 2 for x in xs)
+        return round(sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / den * 3600, 2) if den else 0.0
+
+    def get_metrics(self):
+        tabs = {}
+        for name, points in self.trends.items():
+            ts, heap_mb, nodes, listeners = points[-1]
+            tabs[name] = {"heap_mb": heap_mb, "nodes": nodes, "listeners": listeners,
+                          "heap_mb_per_hour": self._slope(points), "breaches": self.breaches.get(name, 0)}
+        return {**self.stats, "tabs": tabs}
@@ -11,13 +11,26 @@ import logging
 from logging.handlers import RotatingFileHandler
 import random
 import re  # 记得在文件顶部导入 re 模块
+import gzip
+import time
+from email.utils import formatdate, parsedate_to_datetime
 
 # --- 1. 路径挂载 ---
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.join(ROOT_DIR, "Sonkwo-Scout"))
 sys.path.append(os.path.join(ROOT_DIR, "SteamPY-Scout"))
 
+import config
 from arbitrage_commander import ArbitrageCommander
+from history_index import HistoryIndex
+from event_bus import bus, format_sse, stream
+from price_store import PriceStore, sku_of
+from opportunity_board import OpportunityBoard
+from crawl_planner import CrawlPlanner
+from request_coalescer import RequestCoalescer
+from job_queue import JobQueue
+from game_rating.name_utils import normalize_name
+from fastapi.responses import StreamingResponse
 
 # --- 2. 日志系统配置 ---
 logger = logging.getLogger("Sentinel")
@@ -28,39 +41,74 @@ logger.setLevel(logging.DEBUG)
 app = FastAPI()
 global_commander = None # 全局 Commander 实例，供路由调用
 
-AGENT_STATE = {
+class VersionedState(dict):
+    """
+    带版本号的状态字典：每次整键赋值版本号 +1，页面缓存据此判断是否需要重新渲染。
+    除 history 外的键变化会顺带广播一条 state 事件（history 由 log_entry / history_reset 事件单独推送）。
+    ⚠️ 列表等可变值请整体重新赋值，原地修改 (append/insert) 不会触发版本变化。
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version = 0
+        self.modified_at = time.time()
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.version += 1
+        self.modified_at = time.time()
+        if key != "history":
+            bus.publish("state", {"key": key, "value": value, "version": self.version})
+
+AGENT_STATE = VersionedState({
     "current_mission": "待命",
     "last_update": "从未",
     "is_running": False,
     "scanned_count": 0,
     "active_game": "无",
+    "cooldown_until": None,  # 冷却结束的时间戳，前端据此自己倒计时
     "history": [] # 最近 50 条比价记录
-}
+})
+
+# 进程启动标识：重启后版本号从 0 开始，ETag 里带上它避免撞上旧缓存
+BOOT_ID = format(int(time.time()), "x")
 
 HISTORY_FILE = os.path.join(ROOT_DIR, "arbitrage_history.json")
 
-def save_history():
-    """将历史记录持久化到磁盘 (原子性保护)"""
+# 价格时序库才是真正的数据源；HISTORY_FILE 只是它“每个 sku 最新一条”的导出视图
+price_store = PriceStore(os.path.join(ROOT_DIR, config.PRICE_STORE_CONFIG["DB_PATH"]))
+
+# 利润榜：巡航过程中实时维护，AGENT_STATE["history"] 即其前 100 名
+opportunity_board = OpportunityBoard()
+
+# 巡航排程：按 (模式, 分类, 页码) 的历史产出分配每轮翻页预算
+crawl_planner = CrawlPlanner(os.path.join(ROOT_DIR, config.CRAWL_CONFIG["STATE_PATH"]))
+
+def _write_history_view():
+    content = json.dumps(price_store.latest_view(), ensure_ascii=False, indent=2)
+    tmp_path = f"{HISTORY_FILE}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(content)
+    os.replace(tmp_path, HISTORY_FILE)
+
+async def save_history():
+    """先把缓冲的观测刷进库，再在线程池里导出历史视图 (原子替换)"""
     try:
-        # 预先生成 JSON 字符串，防止写入过程中出错导致文件半截
-        content = json.dumps(AGENT_STATE["history"], ensure_ascii=False, indent=2)
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            f.write(content)
+        await price_store.flush()
+        await asyncio.to_thread(_write_history_view)
     except Exception as e:
         logger.error(f"🚨 [黑匣子] 写入失败: {e}")
 
 def load_history():
-    """启动时从磁盘加载历史"""
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+    """启动时从价格库恢复历史视图；库是空的就先用旧版 JSON 做种子"""
+    try:
+        price_store.import_history(HISTORY_FILE)
+        return price_store.latest_view()
+    except Exception as e:
+        logger.error(f"🚨 [价格库] 历史恢复失败: {e}")
+        return []
 
-# 在 AGENT_STATE 初始化时调用
-AGENT_STATE["history"] = [] # load_history()
+# 启动钩子里调用 load_history 再填充 (避免导入模块时就读库)
+AGENT_STATE["history"] = []
 
 def build_post_card(game_name=""):
     return {
@@ -163,15 +211,9 @@ async def feishu_bot_handler(request: Request):
                     "toast": {"type": "error", "content": "❌ 请完整填写所有信息后再提交！"},
                     # 保持卡片不变，不进入“处理中”状态
                 }
-            # 启动后台任务
-            async def feedback_task():
-                async with global_commander.lock:
-                    print(f"🚀 [上架] 已抢占浏览器控制权，开始挂载: {game}")
-                    success = await global_commander.steampy.action_post_flow(f"{game}|{key}|{price}")
-                    status_icon = "✅" if success else "❌"
-                    await global_commander.notifier.send_text(f"{status_icon} 上架反馈：{game} " + ("成功" if success else "失败"))
-
-            asyncio.create_task(feedback_task())
+            # 进入上架队列 (同一个 CDKEY 重复点击不会重复上架)
+            job, _ = job_queue.submit("steampy_post", {"arg": f"{game}|{key}|{price}", "game": game, "source": "feishu"}, dedup_key=key)
+            print(f"📥 [任务队列] 上架任务 {job.id} 已排队")
             print("✅ 正在尝试向飞书返回 200 OK 响应体")
             # ⚠️ 必须返回特定的响应格式，否则飞书会报错
             return {
@@ -213,8 +255,10 @@ async def feishu_bot_handler(request: Request):
                 if "|" in target_content:
                     print(f"🚀 [飞书指令] 触发远程直接上架: {target_content}")
                     if global_commander:
-                        asyncio.create_task(global_commander.steampy.action_post_flow(target_content))
-                        await global_commander.notifier.send_text(f"📥 收到直接指令，执行中...")
+                        parts = [x.strip() for x in target_content.split("|")]
+                        job, _ = job_queue.submit("steampy_post", {"arg": target_content, "game": parts[0], "source": "feishu"},
+                                                  dedup_key=parts[1] if len(parts) > 1 else target_content)
+                        await global_commander.notifier.send_text(f"📥 收到直接指令，已排队 (任务 {job.id})...")
                     return {"code": 0} # 👈 必须 return，否则会去查名为“上架 xxx|xxx”的游戏
                 
                 # 模式 B：通用上架卡片（包含只有“上架”二字的情况）
@@ -236,24 +280,9 @@ async def feishu_bot_handler(request: Request):
             print(f"❌ 解析飞书消息体失败: {e}")
             return {"code": 0}
 
-        # 3. 触发查询任务
+        # 3. 触发查询任务 (同名查询在排队 / 执行中时直接合并)
         if query_game and global_commander:
-            async def task():
-                try:
-                    sk_results = await global_commander.sonkwo.get_search_results(query_game)
-                    if sk_results:
-                        # 💡 只有这一行！内部自动完成比价、去重、推送到 Web 界面
-                        await global_commander.process_arbitrage_item(sk_results[0], is_manual=True)
-                        # save_history() # 存档
-                    
-                    # 💡 注意：如果你还需要给飞书发文字回复，可以单独调用 analyze_arbitrage
-                    # 但为了不重复查价，建议以后把文字报告也收束到 process_arbitrage_item 里
-                    report = await global_commander.analyze_arbitrage(query_game)
-                    await global_commander.notifier.send_text(f"🎯 侦察回报：\n{report}")
-                except Exception as e:
-                    print(f"🚨 飞书专项查询失败: {e}")
-
-            asyncio.create_task(task())
+            job_queue.submit("feishu_query", {"query": query_game}, dedup_key=normalize_name(query_game))
         else:
             if not query_game:
                 print("⚠️ [拦截]: 识别出的游戏名为空，不执行查询。")
@@ -270,7 +299,7 @@ async def continuous_cruise():
         try:
             # 1. 引擎初始化
             if global_commander is None:
-                global_commander = ArbitrageCommander(agent_state=AGENT_STATE)
+                global_commander = ArbitrageCommander(agent_state=AGENT_STATE, price_store=price_store, board=opportunity_board)
             
             logger.info(f"🚀 [尝试 {retry_count + 1}] 正在启动侦察机引擎...")
             AGENT_STATE["current_mission"] = "侦察机初始化中..."
@@ -280,17 +309,35 @@ async def continuous_cruise():
             # AGENT_STATE["is_running"] = True
             
             # 2. 任务主循环
+            rounds_since_restart = 0
             while True:
+                restart = True
                 if AGENT_STATE["is_running"]:
-                    print("🧹 [清理] 正在回收旧浏览器实例，准备全新环境...")
-                    await global_commander.close_all()
-                    await asyncio.sleep(2) # 给系统一点缓冲时间
+                    rounds_since_restart += 1
+                    tab_cfg = config.TAB_MONITOR_CONFIG
+                    full_every = tab_cfg["FULL_RESTART_EVERY"]
+                    # 标签页体检会单独回收泄漏的页面；都健康时不再每轮整体重启
+                    if (tab_cfg["SKIP_ROUND_RESTART"] and global_commander.tab_monitor.healthy()
+                            and not (full_every and rounds_since_restart >= full_every)):
+                        restart = False
+                        print("🩺 [标签页体检] 各标签页状态健康，跳过本轮整体重启")
+                        await global_commander.runtime.refresh_all()
+                        # 不重启就不会走 init_all 里的登录检查，这里补一遍，快照失效照样提醒
+                        await global_commander._check_sessions()
+                        # 同理 rating_center.initialize() 也不会跑：库重新同步过就在这里重载
+                        global_commander.rating_center.refresh_database()
+                    else:
+                        print("🧹 [清理] 正在回收旧浏览器实例，准备全新环境...")
+                        await global_commander.close_all()
+                        await asyncio.sleep(2) # 给系统一点缓冲时间
                 
-                print("🚀 [重启] 正在启动全新的侦察机引擎...")
-                async with global_commander.lock:
-                    print("🚀 [重启] 正在启动全新引擎...")
-                    await global_commander.init_all() 
-                    AGENT_STATE["is_running"] = True
+                if restart:
+                    print("🚀 [重启] 正在启动全新的侦察机引擎...")
+                    async with global_commander.lock:
+                        print("🚀 [重启] 正在启动全新引擎...")
+                        await global_commander.init_all() 
+                        AGENT_STATE["is_running"] = True
+                    rounds_since_restart = 0
                 start_time = datetime.datetime.now()
                 match_count = 0  # 成功匹配数量
                 profit_count = 0 # 达到利润门槛数量
@@ -319,82 +366,78 @@ async def continuous_cruise():
                         "bandai"      # 厂商：万代南梦宫
                     ]
                 target_modes = ["lowest", "new_lowest"]
-                # 💡 设置扫描深度：每类扫 3 页（大约覆盖 1000+ 商品）
-                max_pages = 3 # 💡 每类探测 3 页，覆盖约 600-900 个动态目标
-                
-                for mode in target_modes: # 🚀 第一层：切换 史低/超史低
-                    for task_keyword in search_tasks:
-                        # 💡 新增：内层页码循环
-                        for p in range(1, max_pages + 1):
-                            # 💡 每一页开始前拿锁，扫完这一页自动放锁
-                            async with global_commander.lock:
-                                mode_tag = "超史低" if mode == "new_lowest" else "史低"
-                                # AGENT_STATE["current_mission"] = f"正在扫描: {task_keyword or '全场'} [第{p}页]"
-                                AGENT_STATE["current_mission"] = f"正在扫描: {task_keyword or '全场'} [{mode_tag}-P{p}]"
-                                logger.info(f"🔎 正在调取杉果数据: [{task_keyword}] P{p}")
-                                
+                # 💡 翻页预算不变 (每轮约 60 页)，但按历史产出分配：高产分类多翻几页，沉寂分类偶尔探一下
+                crawl_plan = crawl_planner.plan(target_modes, search_tasks)
+                exhausted = {}  # (mode, keyword) -> 已到底的页码，本轮更深的页直接跳过
+
+                for step, (mode, task_keyword, p) in enumerate(crawl_plan, 1):
+                    if p > exhausted.get((mode, task_keyword), p):
+                        continue
+                    # 💡 每一页开始前拿锁，扫完这一页自动放锁
+                    async with global_commander.lock:
+                        mode_tag = "超史低" if mode == "new_lowest" else "史低"
+                        AGENT_STATE["current_mission"] = f"正在扫描: {task_keyword or '全场'} [{mode_tag}-P{p}]"
+                        logger.info(f"🔎 正在调取杉果数据: [{task_keyword}] P{p}")
+
+                        try:
+                            # 💡 传入已验证的 page 参数
+                            sk_results = await global_commander.sonkwo.get_search_results(keyword=task_keyword, page=p, status=mode)
+                        except Exception as e:
+                            logger.error(f"⚠️ 杉果扫描异常 (词:{task_keyword} 页:{p}): {e}")
+                            continue
+
+                    # 💡 智能熔断：这一页没数据说明该分类已到底，记下页码，本轮不再翻更深的页
+                    if not sk_results:
+                        logger.info(f"📭 分类 [{task_keyword}] 已扫描完毕 (共 {p-1} 页)")
+                        exhausted[(mode, task_keyword)] = p
+                        crawl_planner.observe(mode, task_keyword, p, 0, 0, 0)
+                        continue
+
+                    # --- 处理当前页抓到的战利品 ---
+                    bus.publish("round", {"mode": mode_tag, "keyword": task_keyword or "全场", "page": p, "step": step, "budget": len(crawl_plan), "items": len(sk_results)})
+                    page_new, page_hits = 0, 0
+                    for item in sk_results:
+                        if crawl_planner.is_new(sku_of({"url": item.get("url"), "name": item.get("title")})):
+                            page_new += 1
+                        # 人工查询优先：没有专用标签页时，在商品边界让出浏览器
+                        await global_commander.yield_to_interactive()
+                        log_entry = await global_commander.process_arbitrage_item(item)
+                        total_scanned_this_round += 1  
+                        
+                        if log_entry:
+                            # 1. 成功对齐计数
+                            if log_entry.get("py_price") and "¥" in str(log_entry.get("py_price")):
+                                match_count += 1
+                            
+                            # 2. 盈利目标审计与利润累加
+                            if "成功" in log_entry.get("status", ""):
+                                profit_count += 1
+                                page_hits += 1
                                 try:
-                                    # 💡 传入已验证的 page 参数
-                                    sk_results = await global_commander.sonkwo.get_search_results(keyword=task_keyword, page=p, status=mode)
-                                    
-                                    # 💡 智能熔断：如果这一页没数据，说明该分类已到底，直接 break 跳到下一个分类
-                                    if not sk_results:
-                                        logger.info(f"📭 分类 [{task_keyword}] 已扫描完毕 (共 {p-1} 页)")
-                                        break
-                                        
-                                except Exception as e:
-                                    logger.error(f"⚠️ 杉果扫描异常 (词:{task_keyword} 页:{p}): {e}")
-                                    continue
-
-                            # --- 处理当前页抓到的战利品 ---
-                            for item in sk_results:
-                                log_entry = await global_commander.process_arbitrage_item(item)
-                                total_scanned_this_round += 1  
-                                
-                                if log_entry:
-                                    # 1. 成功对齐计数
-                                    if log_entry.get("py_price") and "¥" in str(log_entry.get("py_price")):
-                                        match_count += 1
-                                    
-                                    # 2. 盈利目标审计与利润累加
-                                    if "成功" in log_entry.get("status", ""):
-                                        profit_count += 1
-                                        try:
-                                            p_str = log_entry.get("profit", "0").replace("¥", "").strip()
-                                            total_profit += float(p_str)
-                                        except:
-                                            pass
-
-                # --- 🛰️ [核心排序逻辑]：当轮战利品大排队 ---
+                                    p_str = log_entry.get("profit", "0").replace("¥", "").strip()
+                                    total_profit += float(p_str)
+                                except:
+                                    pass
+
+                    crawl_planner.observe(mode, task_keyword, p, len(sk_results), page_new, page_hits)
+                    bus.publish("round", {
+                        "mode": mode_tag, "keyword": task_keyword or "全场", "page": p, "step": step, "budget": len(crawl_plan),
+                        "scanned": total_scanned_this_round, "matched": match_count,
+                        "profit_count": profit_count, "total_profit": round(total_profit, 2),
+                    })
+
+                # 排程统计落盘，重启后沿用
+                await asyncio.to_thread(crawl_planner.save)
+
+                # --- 🛰️ [榜单收尾]：排序与去重已在利润榜里实时完成，这里只做过期清理与落盘 ---
+                AGENT_STATE["history"] = opportunity_board.top()
                 if AGENT_STATE["history"]:
-                    def extract_profit_val(h_item):
-                        """辅助函数：提取利润数值用于排序"""
-                        try:
-                            # 提取利润字符串并清理符号，例如 '¥15.50' -> 15.5
-                            val = str(h_item.get('profit', '0')).replace('¥', '').strip()
-                            return float(val) if val != '---' else -999.0
-                        except:
-                            return -999.0
-
-                    # 1. 局部去重：防止同一个游戏在不同分类任务中重复出现
-                    unique_map = {}
-                    for h in AGENT_STATE["history"]:
-                        g_name = h.get('name')
-                        current_p = extract_profit_val(h)
-                        # 如果是新游戏，或者发现该游戏有更高的利润记录，则更新
-                        if g_name not in unique_map or current_p > extract_profit_val(unique_map[g_name]):
-                            unique_map[g_name] = h
-                    
-                    # 2. 执行排序：按利润从高到低排列 (reverse=True)
-                    sorted_list = list(unique_map.values())
-                    sorted_list.sort(key=extract_profit_val, reverse=True)
-                    
-                    # 3. 结果写回：同步到全局状态，只保留前 100 名最赚钱的目标
-                    AGENT_STATE["history"] = sorted_list[:100]
-                    
-                    # 💡 注意：虽然不跨重启，但这里调用 save_history() 可以方便你在运行期间随时查看 json
-                    save_history() 
-                    
+                    # 💡 历史视图顺手导出一份，方便运行期间随时查看 json
+                    await save_history()
+
+                    # 过期条目可能已下榜，让看板重新拉第一页对齐
+                    bus.publish("history_reset", {"version": AGENT_STATE.version})
+
                     print(f"✅ 排序完成！当前榜首: {AGENT_STATE['history'][0].get('name')} | 利润: {AGENT_STATE['history'][0].get('profit')}")
                 # --- [排序结束] ---
 
@@ -435,12 +478,12 @@ async def continuous_cruise():
                 AGENT_STATE["current_mission"] = "巡航完成，进入冷却"
                 AGENT_STATE["active_game"] = "无（待命）"
                 logger.info(f"😴 本轮扫描结束。进入 {cycle_time} 秒冷却...")
-                for i in range(cycle_time):
-                    # await asyncio.sleep(1)
-                    if i % 30 == 0:  # 每 30 秒更新一次 Dashboard 状态
-                        mins_left = (cycle_time - i) // 60
-                        AGENT_STATE["current_mission"] = f"💤 冷却中，预计 {mins_left} 分钟后再次起飞"
-                    await asyncio.sleep(1)
+                # 只下发一次起飞时间，倒计时交给前端按秒自己走，不再每 30 秒改一次状态
+                resume_at = time.time() + cycle_time
+                AGENT_STATE["cooldown_until"] = resume_at
+                AGENT_STATE["current_mission"] = f"💤 冷却中，预计 {datetime.datetime.fromtimestamp(resume_at).strftime('%H:%M')} 再次起飞"
+                await asyncio.sleep(cycle_time)
+                AGENT_STATE["cooldown_until"] = None
                 cycle_time -= jitter
         except Exception as e:
             # 4. 全局崩溃捕获（触发自愈重启）
@@ -466,57 +509,174 @@ async def continuous_cruise():
 
 # --- 5. 网页路由 ---
 
+# 单点查询合并：多人同时查同一款游戏只开一次浏览器，短时间内重复查询直接复用报告
+check_coalescer = RequestCoalescer("check")
+
+def _check_ttl(report):
+    cfg = config.CHECK_CACHE_CONFIG
+    return cfg["NEGATIVE_TTL"] if str(report).startswith("❌") else cfg["TTL"]
+
 @app.get("/check")
 async def check_game(name: str):
     """
     交互式查询接口：由前端 JS 通过 Fetch 调用
+    source: fresh (本次实际执行) / coalesced (搭上了别人正在跑的查询) / cached (复用近期结果)
     """
     if global_commander:
-        # 调用 Commander 内部封装的跨平台比对逻辑
-        report = await global_commander.analyze_arbitrage(name)
-        return {"report": report}
+        # 调用 Commander 内部封装的跨平台比对逻辑，按归一化名称合并
+        report, source = await check_coalescer.run(
+            normalize_name(name), lambda: global_commander.analyze_arbitrage(name), ttl_of=_check_ttl)
+        return {"report": report, "source": source}
     return {"report": "🚨 引擎尚未初始化，请稍后再试"}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """运行指标：评分中心的缓存 / 精确名快速通道命中率"""
+    if not global_commander:
+        return {"status": "error", "msg": "❌ 引擎尚未初始化"}
+    return {"status": "success", "rating": global_commander.rating_center.get_metrics(),
+            "crawl": crawl_planner.get_metrics(), "check": check_coalescer.get_metrics(),
+            "interactive": global_commander.get_interactive_metrics(),
+            "notifier": global_commander.notifier.get_metrics(),
+            "browser": global_commander.runtime.get_metrics(),
+            "tabs": global_commander.tab_monitor.get_metrics()}
+
+@app.get("/api/events")
+async def event_stream(request: Request):
+    """
+    📡 实时事件流 (SSE)
+    hello: 连接时的状态快照；state: 状态键变化；log_entry: 新的比价记录；
+    round: 本轮扫描进度；history_reset: 整表重排；metrics: 周期性指标快照
+    """
+    sub = bus.subscribe()
+    snapshot = {k: v for k, v in AGENT_STATE.items() if k != "history"}
+
+    async def events():
+        try:
+            # retry: 断线后浏览器 3 秒重连；hello 带一份状态快照（不含 history，表格走 /api/history）
+            yield "retry: 3000\n" + format_sse(0, "hello", {"state": snapshot, "version": AGENT_STATE.version})
+            async for chunk in stream(sub, request.is_disconnected):
+                yield chunk
+        finally:
+            bus.unsubscribe(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+async def metrics_pump():
+    """有看板在线时，定期推送一份运行指标"""
+    while True:
+        await asyncio.sleep(config.EVENT_BUS_CONFIG["METRICS_INTERVAL"])
+        if not bus.subscribers:
+            continue
+        try:
+            rating = global_commander.rating_center.get_metrics() if global_commander else {}
+            interactive = global_commander.get_interactive_metrics() if global_commander else {}
+            bus.publish("metrics", {"rating": rating, "interactive": interactive, "bus": bus.get_metrics()})
+        except Exception as e:
+            logger.error(f"⚠️ 指标推送失败: {e}")
+
+@app.get("/api/prices")
+async def price_trajectory(sku: str = None, name: str = None, since: float = None, limit: int = 500):
+    """
+    📈 单个商品的价格轨迹与历史最低 / 最高价
+    sku: 如 sonkwo:7930 (见历史记录的 url)；也可以只给 name，按归一化名称查
+    """
+    if not sku and not name:
+        return {"status": "error", "msg": "❌ 需要 sku 或 name 参数"}
+    key = sku or await asyncio.to_thread(price_store.resolve_sku, name)
+    trajectory = await asyncio.to_thread(price_store.trajectory, key, since, min(limit, 5000))
+    summary = await asyncio.to_thread(price_store.price_range, key)
+    return {"status": "success", "sku": key, "summary": summary, "trajectory": trajectory}
+
+@app.get("/api/prices/deltas")
+async def price_deltas(hours: float = 24, limit: int = 50):
+    """📉 最近 N 小时价格有变动的商品，按变动幅度排序"""
+    deltas = await asyncio.to_thread(price_store.recent_deltas, hours, min(limit, 500))
+    return {"status": "success", "hours": hours, "deltas": deltas}
+
+# 历史索引：history 列表被整体替换时才重建
+history_index = HistoryIndex()
+
+@app.get("/api/history")
+async def get_history(sort: str = "profit", order: str = "desc", cursor: str = None, limit: int = 20,
+                      status: str = None, min_profit: float = None, name_prefix: str = None, fields: str = None):
+    """
+    📜 巡航历史分页查询
+    sort: profit / roi / rating / time；order: desc / asc；cursor: 上一页返回的 next_cursor
+    status: 状态子串 (如 "匹配成功")；min_profit: 最低利润；name_prefix: 名称前缀；fields: 逗号分隔的字段投影
+    """
+    history_index.sync(AGENT_STATE["history"])
+    try:
+        result = history_index.query(
+            sort=sort, order=order, cursor=cursor, limit=limit, status=status, min_profit=min_profit,
+            name_prefix=name_prefix, fields=[f.strip() for f in fields.split(",")] if fields else None,
+        )
+    except Exception as e:
+        return {"status": "error", "msg": f"❌ 查询参数有误: {e}"}
+    return {"status": "success", "version": AGENT_STATE.version, **result}
+
+@app.get("/api/reconcile")
+async def reconcile_report():
+    """📒 采购 × 货架对账：增量刷新后返回汇总与明细 (对账引擎常驻一份，SQLite 游标与模糊匹配缓存跨请求复用)"""
+    try:
+        report = await asyncio.to_thread(shared_engine().report)
+        return {"status": "success", **report}
+    except Exception as e:
+        return {"status": "error", "msg": f"❌ 对账失败: {e}"}
+
+# 页面缓存：同一版本只渲染、压缩一次
+_page_cache = {"version": None}
+
+def _cached_page():
+    version = AGENT_STATE.version
+    if _page_cache["version"] != version:
+        html = render_dashboard().encode("utf-8")
+        _page_cache.update({
+            "version": version,
+            "etag": f'"{BOOT_ID}-{version}"',
+            "last_modified": formatdate(AGENT_STATE.modified_at, usegmt=True),
+            # 保留小数：Last-Modified 只精确到秒，同一秒内的更新要靠它判定为“已修改”
+            "modified_at": AGENT_STATE.modified_at,
+            "html": html,
+            "gzip": gzip.compress(html, 6),
+        })
+    return _page_cache
+
 @app.get("/", response_class=HTMLResponse)
-async def get_dashboard():
-    # --- 1. 历史数据渲染核心逻辑 ---
-    rows = ""
-    history_list = AGENT_STATE.get("history", [])
-    
-    if not history_list:
-        # 初始无数据时的占位行
-        rows = "<tr><td colspan='7' style='text-align:center; padding:50px; color:#8b949e;'>🛰️ 侦察机巡航中，暂未发现利润目标...</td></tr>"
-    else:
-        for h in history_list:
-            h_status = h.get('status', '未知状态')
-            # 判定盈利且审计通过的逻辑
-            is_profitable = "✅" in h_status
-            star_color = "#8b949e"
-            color = "#3fb950" if is_profitable else "#f85149"
-            raw_rating = h.get('rating', '---')
-            try:
-                # 提取数字进行颜色判定
-                r_val = float(str(raw_rating).replace('%', '')) if '%' in str(raw_rating) else 0
-                star_color = "#ffcc00" if r_val >= 90 else ("#3fb950" if r_val >= 80 else "#8b949e")
-            except:
-                star_color = "#8b949e"
-            rows += f"""
-            <tr>
-                <td>{h.get('time', '--:--:--')}</td>
-                <td>
-                    <div style="font-weight:bold; color:#f0f6fc;">{h.get('name', '未知商品')}</div>
-                    <div style="font-size:12px; color:{star_color}; margin-top:4px;">
-                        <span>⭐ Steam 好评: {raw_rating}</span>
-                    </div>
-                </td>
-                <td>{h.get('sk_price', '---')}</td>
-                <td style="color:#58a6ff; font-family:monospace; font-size:12px;">{h.get('py_price', '---')}</td>
-                <td style='color:{color}; font-weight:bold;'>{h.get('profit', '---')} <small>({h.get('roi','0%')})</small></td>
-                <td><span style="font-size:12px; opacity:0.8;">{h_status}</span><br><small style="color:#8b949e;">原因: {h.get('reason','无')}</small></td>
-                <td><a href="{h.get('url','#')}" target="_blank" style="color:#ffcc00; text-decoration:none;">🛒 进货</a></td>
-            </tr>
-            """
-    
+async def get_dashboard(request: Request):
+    """主页：状态没变时直接 304，变了才重新渲染 (同一版本所有人共用一份 gzip 结果)"""
+    page = _cached_page()
+    use_gzip = "gzip" in request.headers.get("accept-encoding", "")
+    # 压缩与未压缩是两个不同的表示，强 ETag 不能共用
+    etag = page["etag"][:-1] + '-gzip"' if use_gzip else page["etag"]
+    headers = {
+        "ETag": etag,
+        "Last-Modified": page["last_modified"],
+        "Cache-Control": "no-cache",
+        "Vary": "Accept-Encoding",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if etag in [t.strip() for t in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+            # 头里的时间截断到秒：修改发生在同一秒内也算已修改，只有严格早于这一秒才回 304
+            if page["modified_at"] < since:
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    if use_gzip:
+        return Response(content=page["gzip"], media_type="text/html; charset=utf-8",
+                        headers={**headers, "Content-Encoding": "gzip"})
+    return Response(content=page["html"], media_type="text/html; charset=utf-8", headers=headers)
+
+def render_dashboard():
+    # --- 1. 历史表格改由前端通过 /api/history 分页加载，这里只渲染外壳 ---
     # 获取运行状态点颜色
     dot_color = "#3fb950" if AGENT_STATE.get("is_running") else "#f85149"
     
@@ -586,15 +746,17 @@ async def get_dashboard():
     <body>
         <div class="panel">
             <div class="status-bar">
-                <div class="dot"></div>
+                <div class="dot" id="runDot"></div>
                 <h2 style="margin:0; color:var(--main-gold);">🛰️ SENTINEL V2.5 战略指挥中心</h2>
             </div>
             <div style="display:grid; grid-template-columns: 1fr 1fr; gap:20px;">
                 <button id="syncBtn" onclick="triggerSync()" style="background:#3fb950; color:white; padding: 8px 20px; border-radius: 4px; font-weight:bold; cursor:pointer; border:none;">
                     🔄 一键全平台资产同步
                 </button>
-                <div>📍 当前任务: <span style="color:#fff;">{AGENT_STATE.get('current_mission', '待命')}</span></div>
-                <div>📊 巡航统计: <span style="color:#fff;">第 {AGENT_STATE.get('scanned_count', 0)} 次扫描</span></div>
+                <div>📍 当前任务: <span id="stateMission" style="color:#fff;">{AGENT_STATE.get('current_mission', '待命')}</span></div>
+                <div>📊 巡航统计: <span id="stateScanned" style="color:#fff;">第 {AGENT_STATE.get('scanned_count', 0)} 次扫描</span></div>
+                <div>🧭 本轮进度: <span id="stateRound" style="color:#8b949e;">---</span></div>
+                <div>📈 运行指标: <span id="stateMetrics" style="color:#8b949e; font-size:12px;">---</span></div>
             </div>
         </div>
 
@@ -670,14 +832,64 @@ async def get_dashboard():
                 }});
                 const data = await res.json();
                 status.innerHTML = `<span style="color:${{data.status === 'success' ? '#3fb950' : '#f85149'}}">${{data.msg}}</span>`;
+                // 之后的进度由 SSE 的 job 事件推过来
+                if (data.job_id) window.__postJob = data.job_id;
             }} catch(e) {{
                 status.innerText = '🚨 无法连接至指挥部服务器';
             }}
         }}
         </script>
         
+        <div class="panel" style="border-color: #3fb950;">
+            <h3 style="color: #3fb950;">📒 资产对账 (杉果采购 × SteamPY 货架)</h3>
+            <button onclick="loadReconcile()" style="background:#3fb950; color:white;">刷新对账</button>
+            <span id="reconcileTotals" style="margin-left:15px; font-size:13px;"></span>
+            <table id="reconcileTable" style="display:none;">
+                <thead>
+                    <tr><th>游戏</th><th>匹配</th><th>进货</th><th>已售</th><th>在架</th><th>已实现利润</th><th>挂牌货值</th><th>上架天数</th></tr>
+                </thead>
+                <tbody></tbody>
+            </table>
+        </div>
+
+        <script>
+        async function loadReconcile() {{
+            const totals = document.getElementById('reconcileTotals');
+            const table = document.getElementById('reconcileTable');
+            totals.innerText = '⏳ 正在对账...';
+            try {{
+                const res = await fetch('/api/reconcile');
+                const data = await res.json();
+                if (data.status !== 'success') {{ totals.innerText = data.msg; return; }}
+                const t = data.totals;
+                totals.innerText = `${{t.items}} 个游戏 | 匹配 ${{t.matched}} (模糊 ${{t.fuzzy}}) | 已实现利润 ¥${{t.realized_profit}} | 在架 ${{t.unsold_stock}} 件 / 货值 ¥${{t.unsold_value}} | 耗时 ${{data.elapsed_ms}} ms`;
+                table.tBodies[0].innerHTML = data.items.map(r => `
+                    <tr>
+                        <td>${{r.name}}</td><td>${{r.match}}</td><td>${{r.bought}}</td><td>${{r.sold}}</td><td>${{r.stock}}</td>
+                        <td style="color:${{(r.realized_profit || 0) >= 0 ? '#3fb950' : '#f85149'}}">${{r.realized_profit ?? '---'}}</td>
+                        <td>${{r.listed_value}}</td><td>${{r.days_on_shelf ?? '---'}}</td>
+                    </tr>`).join('');
+                table.style.display = 'table';
+            }} catch(e) {{
+                totals.innerText = '🚨 无法连接至指挥部服务器';
+            }}
+        }}
+        </script>
+
         <div class="panel" style="padding:0; overflow:hidden;">
-            <table>
+            <div class="search-box" style="padding:15px 15px 0 15px; margin-top:0;">
+                <select id="histSort" onchange="reloadHistory()" style="background:#0d1117; color:#fff; border:1px solid var(--border); border-radius:4px;">
+                    <option value="profit">按利润</option>
+                    <option value="roi">按 ROI</option>
+                    <option value="rating">按好评率</option>
+                    <option value="time">按时间</option>
+                </select>
+                <input type="text" id="histStatus" placeholder="状态筛选 (如 匹配成功)" style="flex-grow:0; width:180px;">
+                <input type="text" id="histMinProfit" placeholder="最低利润" style="flex-grow:0; width:100px;">
+                <input type="text" id="histPrefix" placeholder="名称前缀">
+                <button onclick="reloadHistory()">筛选</button>
+            </div>
+            <table id="historyTable">
                 <thead>
                     <tr>
                         <th style="width:80px;">时间</th>
@@ -689,10 +901,183 @@ async def get_dashboard():
                         <th style="width:70px;">操作</th>
                     </tr>
                 </thead>
-                <tbody>{rows}</tbody>
+                <tbody></tbody>
             </table>
+            <div style="text-align:center; padding:15px;">
+                <button id="histMore" onclick="loadHistory()" style="display:none;">加载更多</button>
+                <span id="histInfo" style="font-size:12px; color:#8b949e; margin-left:10px;"></span>
+            </div>
         </div>
 
+        <script>
+        const HIST_FIELDS = 'time,ts,name,rating,sk_price,py_price,profit,roi,status,reason,url';
+        let histCursor = null;
+        let histLoaded = 0;
+
+        function esc(v) {{
+            return String(v ?? '').replace(/[&<>"']/g, c => ({{'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}}[c]));
+        }}
+
+        function historyRow(h) {{
+            const status = h.status || '未知状态';
+            const color = status.includes('✅') ? '#3fb950' : '#f85149';
+            const rating = h.rating ?? '---';
+            const r = String(rating).includes('%') ? parseFloat(rating) : 0;
+            const star = r >= 90 ? '#ffcc00' : (r >= 80 ? '#3fb950' : '#8b949e');
+            return `
+            <tr data-name="${{esc(h.name || '')}}" data-key="${{sortValue(h)}}">
+                <td>${{esc(h.time || '--:--:--')}}</td>
+                <td>
+                    <div style="font-weight:bold; color:#f0f6fc;">${{esc(h.name || '未知商品')}}</div>
+                    <div style="font-size:12px; color:${{star}}; margin-top:4px;"><span>⭐ Steam 好评: ${{esc(rating)}}</span></div>
+                </td>
+                <td>${{esc(h.sk_price || '---')}}</td>
+                <td style="color:#58a6ff; font-family:monospace; font-size:12px;">${{esc(h.py_price || '---')}}</td>
+                <td style="color:${{color}}; font-weight:bold;">${{esc(h.profit || '---')}} <small>(${{esc(h.roi || '0%')}})</small></td>
+                <td><span style="font-size:12px; opacity:0.8;">${{esc(status)}}</span><br><small style="color:#8b949e;">原因: ${{esc(h.reason || '无')}}</small></td>
+                <td><a href="${{esc(h.url || '#')}}" target="_blank" style="color:#ffcc00; text-decoration:none;">🛒 进货</a></td>
+            </tr>`;
+        }}
+
+        async function loadHistory() {{
+            const params = new URLSearchParams({{ sort: document.getElementById('histSort').value, limit: 20, fields: HIST_FIELDS }});
+            const status = document.getElementById('histStatus').value.trim();
+            const minProfit = document.getElementById('histMinProfit').value.trim();
+            const prefix = document.getElementById('histPrefix').value.trim();
+            if (status) params.set('status', status);
+            if (minProfit) params.set('min_profit', minProfit);
+            if (prefix) params.set('name_prefix', prefix);
+            if (histCursor) params.set('cursor', histCursor);
+
+            const tbody = document.querySelector('#historyTable tbody');
+            const more = document.getElementById('histMore');
+            try {{
+                const res = await fetch(`/api/history?${{params}}`);
+                const data = await res.json();
+                if (data.status !== 'success') {{ document.getElementById('histInfo').innerText = data.msg; return; }}
+                if (!histLoaded && !data.items.length) {{
+                    tbody.innerHTML = "<tr><td colspan='7' style='text-align:center; padding:50px; color:#8b949e;'>🛰️ 侦察机巡航中，暂未发现利润目标...</td></tr>";
+                }} else {{
+                    tbody.insertAdjacentHTML('beforeend', data.items.map(historyRow).join(''));
+                }}
+                histLoaded += data.items.length;
+                histCursor = data.next_cursor;
+                more.style.display = histCursor ? 'inline-block' : 'none';
+                document.getElementById('histInfo').innerText = `已加载 ${{histLoaded}} / ${{data.total}} 条`;
+            }} catch(e) {{
+                document.getElementById('histInfo').innerText = '🚨 无法连接至指挥部服务器';
+            }}
+        }}
+
+        // 与 history_index.py 的解析规则保持一致，用于实时插入时定位
+        function sortValueOf(v) {{
+            const m = String(v ?? '').match(/-?\\d+(?:\\.\\d+)?/);
+            return m ? parseFloat(m[0]) : -1e18;
+        }}
+
+        function sortValue(h) {{
+            const num = sortValueOf;
+            const sort = document.getElementById('histSort').value;
+            if (sort === 'profit') return num(h.profit);
+            if (sort === 'roi') return String(h.roi ?? '').includes('%') ? num(h.roi) : -1e18;
+            if (sort === 'rating') return String(h.rating ?? '').includes('%') ? num(h.rating) : -1e18;
+            return h.ts || 0;
+        }}
+
+        function matchesFilters(h) {{
+            const status = document.getElementById('histStatus').value.trim();
+            const minProfit = document.getElementById('histMinProfit').value.trim();
+            const prefix = document.getElementById('histPrefix').value.trim().toLowerCase();
+            if (status && !String(h.status || '').includes(status)) return false;
+            if (minProfit && sortValueOf(h.profit) < parseFloat(minProfit)) return false;
+            if (prefix && !String(h.name || '').replace('🛰️(点杀)', '').trim().toLowerCase().startsWith(prefix)) return false;
+            return true;
+        }}
+
+        // 实时插入一条记录：同名行原地替换，否则按当前排序插到对应位置；落在未加载区间的交给翻页
+        function patchRow(h) {{
+            if (!matchesFilters(h)) return;
+            const tbody = document.querySelector('#historyTable tbody');
+            const old = Array.from(tbody.rows).find(r => r.dataset.name === String(h.name || ''));
+            if (old) old.remove();
+            else if (!tbody.rows.length || !tbody.rows[0].dataset.name) tbody.innerHTML = '';
+            const key = sortValue(h);
+            const before = Array.from(tbody.rows).find(r => parseFloat(r.dataset.key) < key);
+            if (!before && histCursor) return;
+            const tmp = document.createElement('tbody');
+            tmp.innerHTML = historyRow(h);
+            const row = tmp.firstElementChild;
+            row.style.transition = 'background 2s';
+            row.style.background = '#2d333b';
+            tbody.insertBefore(row, before || null);
+            if (!old) histLoaded += 1;
+            setTimeout(() => row.style.background = '', 50);
+        }}
+
+        let cooldownUntil = null;
+        function applyState(key, value) {{
+            if (key === 'current_mission') document.getElementById('stateMission').innerText = value;
+            else if (key === 'scanned_count') document.getElementById('stateScanned').innerText = `第 ${{value}} 次扫描`;
+            else if (key === 'cooldown_until') cooldownUntil = value;
+            else if (key === 'is_running') {{
+                const color = value ? '#3fb950' : '#f85149';
+                const dot = document.getElementById('runDot');
+                dot.style.background = color;
+                dot.style.boxShadow = `0 0 8px ${{color}}`;
+            }}
+        }}
+
+        setInterval(() => {{
+            if (!cooldownUntil) return;
+            const left = Math.max(0, Math.round(cooldownUntil - Date.now() / 1000));
+            document.getElementById('stateRound').innerText = `💤 冷却倒计时 ${{Math.floor(left / 60)}}:${{String(left % 60).padStart(2, '0')}}`;
+        }}, 1000);
+
+        function connectEvents() {{
+            const es = new EventSource('/api/events');
+            es.addEventListener('hello', e => {{
+                const data = JSON.parse(e.data);
+                Object.entries(data.state).forEach(([k, v]) => applyState(k, v));
+                // 重连期间可能漏掉事件，整表重拉一次
+                if (window.__eventsConnected) reloadHistory();
+                window.__eventsConnected = true;
+            }});
+            es.addEventListener('state', e => {{ const d = JSON.parse(e.data); applyState(d.key, d.value); }});
+            es.addEventListener('log_entry', e => patchRow(JSON.parse(e.data)));
+            es.addEventListener('history_reset', () => reloadHistory());
+            es.addEventListener('job', e => {{
+                const j = JSON.parse(e.data);
+                if (j.id !== window.__postJob) return;
+                const color = j.status === 'FAILED' ? '#f85149' : (j.status === 'SUCCESS' ? '#3fb950' : '#8b949e');
+                document.getElementById('postStatus').innerHTML = `<span style="color:${{color}}">📋 任务 ${{esc(j.id)}} · ${{esc(j.status)}} · ${{esc(j.message)}} (${{j.progress}}%)${{j.error ? ' — ' + esc(j.error) : ''}}</span>`;
+            }});
+            es.addEventListener('round', e => {{
+                const r = JSON.parse(e.data);
+                let text = `${{r.mode}} · ${{r.keyword}} · P${{r.page}} (${{r.step}}/${{r.budget}})`;
+                if (r.scanned !== undefined) text += ` | 已扫 ${{r.scanned}} · 对齐 ${{r.matched}} · 盈利 ${{r.profit_count}} (¥${{r.total_profit}})`;
+                document.getElementById('stateRound').innerText = text;
+            }});
+            es.addEventListener('metrics', e => {{
+                const m = JSON.parse(e.data);
+                const r = m.rating || {{}};
+                const hit = r.fast_path_hit_ratio !== undefined ? `快速通道 ${{(r.fast_path_hit_ratio * 100).toFixed(0)}}%` : '';
+                const it = m.interactive || {{}};
+                const p95 = it.p95 != null ? `点杀 p95 ${{it.p95}}s / 目标 ${{it.p95_target}}s ${{it.meets_target ? '✅' : '⚠️'}}` : `点杀 p95 目标 ${{it.p95_target ?? '-'}}s`;
+                document.getElementById('stateMetrics').innerText = `${{hit}} | ${{p95}} | 在线看板 ${{m.bus.clients}}`;
+            }});
+        }}
+
+        function reloadHistory() {{
+            histCursor = null;
+            histLoaded = 0;
+            document.querySelector('#historyTable tbody').innerHTML = '';
+            loadHistory();
+        }}
+
+        reloadHistory();
+        connectEvents();
+        </script>
+
         <script>
         async function checkProfit() {{
             const btn = document.querySelector('button');
@@ -708,7 +1093,8 @@ async def get_dashboard():
             try {{
                 const res = await fetch(`/check?name=${{encodeURIComponent(name)}}`);
                 const data = await res.json();
-                resArea.innerText = data.report;
+                const note = {{ cached: '♻️ 近期查询结果 (缓存)', coalesced: '🔗 已合并到同名查询' }}[data.source];
+                resArea.innerText = note ? `${{data.report}}\\n\\n${{note}}` : data.report;
             }} catch(e) {{
                 resArea.innerText = '🚨 信号中断：无法连接至主服务器。';
             }} finally {{
@@ -720,12 +1106,26 @@ async def get_dashboard():
     </body>
     </html>
     """
-    return HTMLResponse(content=html)
+    return html
 
 @app.on_event("startup")
 async def startup():
     # 启动后台常驻任务
+    for entry in await asyncio.to_thread(load_history):
+        opportunity_board.update(entry)
+    AGENT_STATE["history"] = opportunity_board.top()
+    asyncio.create_task(price_store.run())
+    job_queue.start()
     asyncio.create_task(continuous_cruise())
+    asyncio.create_task(metrics_pump())
+
+@app.on_event("shutdown")
+async def shutdown():
+    # 冷却窗口里还没发出去的机会摘要在进程退出前发掉，顺手关掉飞书连接池
+    if global_commander:
+        await global_commander.notifier.aclose()
+    # 还没攒够一批的价格观测在退出前刷进库
+    await price_store.aclose()
 
 from fastapi.responses import FileResponse
 
@@ -744,23 +1144,12 @@ async def web_post_game(request: Request):
         if not game or not key or not price:
             return {"status": "error", "msg": "❌ 信息不完整"}
 
-        async def web_task():
-            try:
-                # 💡 核心：进入排队序列
-                async with global_commander.lock:
-                    print(f"🛰️ [Web 指令] 正在执行挂载: {game}")
-                    success = await global_commander.steampy.action_post_flow(f"{game}|{key}|{price}")
-                    status = "✅ 成功" if success else "❌ 失败"
-                    await global_commander.notifier.send_text(f"🖥️ Web端挂载反馈：{game} {status}")
-            except Exception as e:
-                logger.error(f"🚨 Web上架任务崩溃: {e}")
-                await global_commander.notifier.send_text(f"🚨 Web端任务异常: {game}\n原因: {str(e)[:100]}")
-
-        # 挂载后台任务
-        asyncio.create_task(web_task())
-        
+        # 💡 核心：进入上架队列，同一个 CDKEY 重复提交会合并到已有任务
+        job, created = job_queue.submit("steampy_post", {"arg": f"{game}|{key}|{price}", "game": game, "source": "web"}, dedup_key=key)
+
         # 立即告知用户指令已送达
-        return {"status": "success", "msg": f"✅ {game} 指令已排队，请留意飞书回执"}
+        msg = f"✅ {game} 指令已排队 (前方 {job_queue.position(job)} 个)，请留意飞书回执" if created else f"♻️ {game} 已在队列中，无需重复提交"
+        return {"status": "success", "msg": msg, "job_id": job.id}
 
     except Exception as e:
         return {"status": "error", "msg": f"🚨 系统错误: {str(e)}"}
@@ -770,6 +1159,7 @@ async def web_post_game(request: Request):
 
 # --- 在文件顶部导入区添加 ---
 from Finance_Center.sync_manager import SyncManager  # 确保路径正确
+from Finance_Center.reconciliation import shared_engine
 
 # --- 在 FastAPI 路由定义区添加同步接口 ---
 
@@ -777,22 +1167,101 @@ from Finance_Center.sync_manager import SyncManager  # 确保路径正确
 async def sync_all_platforms():
     """🚀 一键同步按钮的后端实现"""
     global global_commander
-    print("⏳ 同步指令已排队，等待当前巡航任务交出浏览器控制权...")
+    print("⏳ 同步指令已下达，两个平台将并发同步...")
     if not global_commander:
         return {"status": "error", "msg": "❌ 引擎尚未初始化，请刷新页面重试"}
 
-    async def background_sync():
-        # 使用 global_commander 的锁，防止同步时干扰正在进行的自动巡航
-        async with global_commander.lock:
-            manager = SyncManager(global_commander)
-            result = await manager.run_full_sync()
-            # 同步完成后，通过飞书知会一声
-            status_ico = "✅" if result["status"] == "success" else "❌"
-            await global_commander.notifier.send_text(f"{status_ico} 跨平台同步反馈：{result['msg']}")
-
-    # 挂载后台任务，立即给前端返回“已开始”
-    asyncio.create_task(background_sync())
-    return {"status": "success", "msg": "📡 指令已下达，正在后台静默同步..."}
+    # 同步任务全局只排一个，重复点击直接返回正在跑的那个
+    job, created = job_queue.submit("sync_all", {}, dedup_key="sync_all")
+    msg = "📡 指令已下达，正在后台静默同步..." if created else "⏳ 同步已在进行中，请稍候..."
+    return {"status": "success", "msg": msg, "job_id": job.id}
+
+@app.get("/api/sync_status")
+async def sync_status():
+    """分平台同步进度 (PENDING / RUNNING / SUCCESS / FAILED)"""
+    return {"status": "success", "progress": AGENT_STATE.get("sync_progress", {})}
+
+# --- 后台任务队列：上架 / 同步 / 飞书查询 ---
+job_queue = JobQueue(os.path.join(ROOT_DIR, config.JOB_CONFIG["PATH"]))
+
+async def _ready_commander(job):
+    """任务可能在引擎启动前就排上了 (比如重启后恢复的任务)，先等浏览器就绪"""
+    job.report(message="等待引擎就绪")
+    while global_commander is None:
+        await asyncio.sleep(1)
+    await global_commander.contexts_ready.wait()
+    return global_commander
+
+async def run_post_job(job):
+    """上架：占用 SteamPy 主页面，必须拿巡航锁"""
+    game, source = job.payload.get("game", ""), job.payload.get("source")
+    commander = await _ready_commander(job)
+    job.report(10, f"等待浏览器控制权: {game}")
+    try:
+        async with commander.lock:
+            print(f"🛰️ [上架任务 {job.id}] 正在执行挂载: {game}")
+            job.report(30, f"正在挂载: {game}")
+            success = await commander.steampy.action_post_flow(job.payload["arg"])
+    except Exception as e:
+        logger.error(f"🚨 上架任务崩溃: {e}")
+        label = "Web端" if source == "web" else "飞书"
+        await commander.notifier.send_text(f"🚨 {label}任务异常: {game}\n原因: {str(e)[:100]}")
+        raise
+    if source == "web":
+        await commander.notifier.send_text(f"🖥️ Web端挂载反馈：{game} {'✅ 成功' if success else '❌ 失败'}")
+    else:
+        await commander.notifier.send_text(f"{'✅' if success else '❌'} 上架反馈：{game} " + ("成功" if success else "失败"))
+    if not success:
+        raise RuntimeError("上架流程未完成")
+    return {"success": True}
+
+async def run_sync_job(job):
+    """全平台同步：两个平台在各自专用页面上并发进行，不占巡航锁"""
+    commander = await _ready_commander(job)
+    job.report(5, "同步中")
+    manager = SyncManager(commander)
+    result = await manager.run_full_sync()
+    # 同步完成后，通过飞书知会一声
+    status_ico = {"success": "✅", "partial": "⚠️"}.get(result["status"], "❌")
+    await commander.notifier.send_text(f"{status_ico} 跨平台同步反馈：{result['msg']}")
+    if result["status"] == "error":
+        raise RuntimeError(result["msg"])
+    return {"status": result["status"], "msg": result["msg"]}
+
+async def run_feishu_query_job(job):
+    """飞书点杀：与 /check 共用合并器，结果会顺带写进看板历史"""
+    query = job.payload["query"]
+    commander = await _ready_commander(job)
+    job.report(10, f"侦察中: {query}")
+    report, source = await check_coalescer.run(
+        normalize_name(query), lambda: commander.analyze_arbitrage(query), ttl_of=_check_ttl)
+    await commander.notifier.send_text(f"🎯 侦察回报：\n{report}")
+    return {"source": source}
+
+job_queue.register("steampy_post", run_post_job)
+job_queue.register("sync_all", run_sync_job)
+job_queue.register("feishu_query", run_feishu_query_job)
+
+@app.get("/api/jobs")
+async def list_jobs(status: str = None, type: str = None, limit: int = 50):
+    """📋 最近的后台任务 (可按状态 / 类型过滤)"""
+    return {"status": "success", "jobs": [j.to_dict() for j in job_queue.list(status, type, min(limit, 200))],
+            "metrics": job_queue.get_metrics()}
+
+@app.get("/api/jobs/{job_id}")
+async def get_job(job_id: str):
+    """📋 单个任务的状态与进度；排队中时附带前方任务数"""
+    job = job_queue.get(job_id)
+    if not job:
+        return {"status": "error", "msg": "❌ 任务不存在或已过期"}
+    return {"status": "success", "job": {**job.to_dict(), "queue_position": job_queue.position(job)}}
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """取消还在排队的任务 (已开始执行的无法中断)"""
+    if job_queue.cancel(job_id):
+        return {"status": "success", "msg": "🛑 已取消"}
+    return {"status": "error", "msg": "❌ 任务不存在或已开始执行"}
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file